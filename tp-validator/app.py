@@ -1,13 +1,50 @@
 import os
+import sys
 import json
+import hashlib
 import requests
 import re
+import time
+import bisect
+import random
+import logging
+import functools
+import tempfile
+import threading
+import contextvars
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime, date, timedelta
 from flask import Flask, render_template, request, jsonify
-from icalendar import Calendar
+from flask.json.provider import DefaultJSONProvider
+from icalendar import Event, Timezone
+from icalendar.timezone import tzp
 from dateutil import tz
+try:
+    import numpy as np
+except ImportError:  # Optional: WorkoutTable falls back to plain lists
+    np = None
+from storage import (open_store, ChangeLogArchive, FeedLock, detach_change_log, atomic_write_json,
+                     file_signature, DEFAULT_HOT_CHANGE_LOG_ENTRIES)
+from history import (COMPARED_FIELDS, modified_entry, inflate_history,
+                     inflate_change_log, workout_version)
+from records import WorkoutRecord, as_record, compact_workout_info
+from timeutil import UTC, DAY_MICROS, parse_datetime, time_key, workout_times
+import metrics
+
+
+class WorkoutJSONProvider(DefaultJSONProvider):
+    """JSON provider that also serializes WorkoutRecords (the API boundary)."""
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, WorkoutRecord):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
 
 app = Flask(__name__)
+app.json = WorkoutJSONProvider(app)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['SESSION_COOKIE_SECURE'] = False  # For localhost development
 app.config['SESSION_COOKIE_HTTPONLY'] = True
@@ -16,6 +53,32 @@ app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 # Configuration
 DATA_DIR = 'data'
 DEFAULT_ICAL_URL = 'https://www.trainingpeaks.com/ical/FQ52PNFB5MWLS.ics'
+STORAGE_BACKEND = os.environ.get('TP_STORAGE_BACKEND', 'json')  # 'json' or 'sqlite'
+ICAL_STREAM_MIN_BYTES = int(os.environ.get('TP_ICAL_STREAM_MIN_BYTES', 1024 * 1024))  # Stream-parse larger feeds
+STRAVA_LOOKBACK_DAYS = int(os.environ.get('TP_STRAVA_LOOKBACK_DAYS', 10))  # Window merged on each refresh
+STRAVA_SYNC_OVERLAP_SECONDS = int(os.environ.get('TP_STRAVA_SYNC_OVERLAP_SECONDS', 2 * 86400))  # Re-read late uploads
+STRAVA_BACKFILL_CONCURRENCY = int(os.environ.get('TP_STRAVA_BACKFILL_CONCURRENCY', 4))
+STRAVA_RATE_LIMITS = (200, 2000)  # (15-minute, daily) app limits until Strava reports its own
+STRAVA_BURST = int(os.environ.get('TP_STRAVA_BURST', 20))  # Requests allowed back-to-back before pacing
+STRAVA_MAX_WAIT_SECONDS = float(os.environ.get('TP_STRAVA_MAX_WAIT_SECONDS', 900))  # Longest queue for quota
+STRAVA_MAX_RETRIES = int(os.environ.get('TP_STRAVA_MAX_RETRIES', 4))  # For 5xx/connection errors
+REFRESH_DEADLINE_SECONDS = float(os.environ.get('TP_REFRESH_DEADLINE_SECONDS', 45))  # For all source fetches
+BATCH_REFRESH_CONCURRENCY = int(os.environ.get('TP_BATCH_REFRESH_CONCURRENCY', 8))  # Feeds refreshed at once
+SCHEDULER_ENABLED = os.environ.get('TP_SCHEDULER_ENABLED', '').lower() in ('1', 'true', 'yes')
+SCHEDULER_INTERVAL_SECONDS = float(os.environ.get('TP_SCHEDULER_INTERVAL_SECONDS', 15 * 60))
+SCHEDULER_JITTER = float(os.environ.get('TP_SCHEDULER_JITTER', 0.1))  # +/- fraction of the interval
+SCHEDULER_FEEDS = [url for url in os.environ.get('TP_SCHEDULER_FEEDS', '').split(',') if url.strip()]
+SCHEDULER_IDLE_SECONDS = float(os.environ.get('TP_SCHEDULER_IDLE_SECONDS', 7 * 86400))  # Unrequested feeds expire
+SCHEDULER_MAX_FAILURES = int(os.environ.get('TP_SCHEDULER_MAX_FAILURES', 5))  # Consecutive, then unscheduled
+CHANGE_LOG_HOT_ENTRIES = int(os.environ.get('TP_CHANGE_LOG_HOT_ENTRIES', DEFAULT_HOT_CHANGE_LOG_ENTRIES))
+CHANGE_LOG_ARCHIVE_BATCH = 50  # Archive once this many entries beyond the hot window pile up
+HISTORY_PAGE_SIZE = 50  # Default /api/history page size
+HISTORY_MAX_PAGE_SIZE = 500
+MANAGER_CACHE_MAX_BYTES = int(os.environ.get('TP_MANAGER_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+DESCRIPTION_CACHE_MAX_ENTRIES = int(os.environ.get('TP_DESCRIPTION_CACHE_MAX_ENTRIES', 20000))
+DESCRIPTION_CACHE_MAX_BYTES = int(os.environ.get('TP_DESCRIPTION_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+METRICS_WINDOW = int(os.environ.get('TP_METRICS_WINDOW', 500))  # Refreshes kept for /api/metrics percentiles
+TIMINGS_LOG = os.environ.get('TP_TIMINGS_LOG', '1').lower() in ('1', 'true', 'yes')  # JSON line per refresh
 
 # Strava OAuth Configuration
 STRAVA_CLIENT_ID = '180503'  # Your client ID
@@ -37,54 +100,261 @@ def get_workouts_file(ical_url):
     return os.path.join(DATA_DIR, 'workouts_default.json')
 
 
-def _find_matching_tp_workout(strava_workout, tp_workouts, matched_tp_uids):
-    """Find a matching TP workout for a Strava workout."""
-    workout_date = strava_workout['start_date']
-    workout_start_time = strava_workout.get('start_time')
-    workout_type = strava_workout.get('activity_type', '').lower()
-    workout_summary = strava_workout.get('summary', '').lower()
+def get_feed_state_file(workouts_file):
+    """Sidecar file holding fetch validators and input hashes for a feed."""
+    return os.path.splitext(workouts_file)[0] + '.feed.json'
+
+
+def load_feed_state(path):
+    """Load persisted feed state (empty dict if missing or unreadable)."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_feed_state(path, state):
+    """Persist feed state (atomically, so concurrent readers never see a partial file)."""
+    atomic_write_json(path, state, indent=2)
+
+
+def get_event_cache_file(workouts_file):
+    """Sidecar file holding the per-VEVENT extraction cache for a feed."""
+    return os.path.splitext(workouts_file)[0] + '.events.json'
+
+
+class EventCache:
+    """
+    Previously extracted workouts of one feed, keyed by VEVENT UID.
+    
+    An entry is reused while the event's SEQUENCE, LAST-MODIFIED and content
+    hash (see ICalParser.event_cache_key) are unchanged. Entries hold the
+    workout before apply_execution_override, since that depends on today,
+    and its fingerprint, so update_workouts does not hash reused workouts
+    again. Bump FORMAT when extraction changes so stale entries are dropped.
+    """
+    
+    FORMAT = 2
+    
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = None  # Loaded on first lookup; no-op refreshes never parse
+        self.seen = {}
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+    
+    def load(self):
+        self.entries = {}
+        if self.path:
+            try:
+                with open(self.path, 'r') as f:
+                    stored = json.load(f)
+                if stored.get('format') == self.FORMAT:
+                    self.entries = stored.get('events', {})
+            except (OSError, json.JSONDecodeError, AttributeError):
+                pass
+    
+    def lookup(self, uid, key):
+        """Copy of the cached workout for an unchanged event, else None."""
+        if self.entries is None:
+            self.load()
+        entry = self.entries.get(uid)
+        if entry is None or entry['key'] != key:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.seconds_saved += entry.get('seconds', 0.0)
+        self.seen[uid] = entry
+        workout = WorkoutRecord(entry['workout'])
+        workout._fingerprint = entry['fingerprint']
+        return workout
+    
+    def store(self, uid, key, workout, seconds):
+        """Remember a fresh extraction and how long it took."""
+        self.seen[uid] = {'key': key, 'workout': workout.to_dict(), 'seconds': round(seconds, 6),
+                          'fingerprint': WorkoutManager.fingerprint(workout)}
+    
+    def save(self):
+        """Persist the events seen in this parse; events gone from the feed are dropped."""
+        if not self.path:
+            return
+        atomic_write_json(self.path, {'format': self.FORMAT, 'events': self.seen}, fsync=False)
+        self.entries = self.seen
+        self.seen = {}
+    
+    def stats(self):
+        events = self.hits + self.misses
+        return {
+            'events': events,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / events, 3) if events else None,
+            'seconds_saved': round(self.seconds_saved, 3)
+        }
+
+
+def _json_signature(signature):
+    """Store signature in the form it takes after a JSON round trip."""
+    return list(signature) if signature else None
+
+
+MATCH_WINDOW_SECONDS = 3600  # Future workouts must start within 1 hour of each other
+
+
+def _tp_sport_categories(tp_summary):
+    """Normalized sport categories implied by a (lowercased) TP summary."""
+    categories = set()
+    if 'run' in tp_summary:
+        categories.add('run')
+    if 'bike' in tp_summary or 'ride' in tp_summary:
+        categories.add('ride')
+    if 'swim' in tp_summary:
+        categories.add('swim')
+    return categories
+
+
+def _strava_sport_categories(strava_type, strava_summary):
+    """
+    TP categories a Strava activity can match under `_activities_match`.
+    
+    Returns None when the type names no known sport, in which case only the
+    generic substring rule (`strava_type in tp_summary`) can decide.
+    """
+    categories = set()
+    if 'run' in strava_type:
+        categories.add('run')
+    if any(x in strava_type for x in ['ride', 'bike', 'virtualride']):
+        categories.add('ride')
+    if 'swim' in strava_type:
+        categories.add('swim')
+    if not categories:
+        return None
+    if 'zwift' in strava_summary:
+        categories.add('ride')
+    return categories
+
+
+class _TPMatchBucket:
+    """TP candidates sharing a (date, category) key."""
+    
+    __slots__ = ('entries', 'by_time', 'times', 'next_unmatched')
+    
+    def __init__(self):
+        self.entries = []  # (order, uid) in tp_workouts order
+        self.by_time = {True: [], False: []}  # awareness -> [(micros, order, uid)]
+        self.times = None
+        self.next_unmatched = 0
+    
+    def finalize(self):
+        for key in self.by_time:
+            self.by_time[key].sort()
+        self.times = {key: [t for t, _, _ in items] for key, items in self.by_time.items()}
+    
+    def first_unmatched(self, matched_tp_uids):
+        """First candidate in feed order that hasn't been matched yet."""
+        # Matches are never undone, so skipped entries can be dropped for good
+        while self.next_unmatched < len(self.entries):
+            order, uid = self.entries[self.next_unmatched]
+            if uid not in matched_tp_uids:
+                return order, uid
+            self.next_unmatched += 1
+        return None
+    
+    def first_near(self, time_key, matched_tp_uids):
+        """First candidate in feed order starting within the match window."""
+        aware, micros = time_key
+        window = MATCH_WINDOW_SECONDS * 1000000
+        times = self.times[aware]
+        items = self.by_time[aware]
+        best = None
+        lo = bisect.bisect_left(times, micros - window)
+        hi = bisect.bisect_right(times, micros + window)
+        for _, order, uid in items[lo:hi]:
+            if uid not in matched_tp_uids and (best is None or order < best[0]):
+                best = (order, uid)
+        return best
+
+
+class TPMatchIndex:
+    """
+    Prebuilt lookup of TP workouts for matching Strava activities.
     
-    for tp_uid, tp_workout in tp_workouts.items():
-        if tp_uid in matched_tp_uids:
-            continue  # Already matched
+    TP workouts are bucketed by (local date, sport category) and, inside
+    each bucket, sorted by start time. Lookups return exactly what a linear
+    scan over `tp_workouts` in feed order would: the first unmatched TP
+    workout on the same date and sport, and for today/future activities the
+    first one starting within MATCH_WINDOW_SECONDS.
+    """
+    
+    def __init__(self, tp_workouts, table=None, today=None):
+        self.today = today or datetime.now().date()
+        self.buckets = {}  # (date, category) -> _TPMatchBucket
+        self.by_date = {}  # date -> [(order, uid, summary, time_key)]
+        table = table or WorkoutTable(tp_workouts)  # Start times and sports, parsed once
         
-        tp_date = tp_workout.get('start_date') or tp_workout.get('start_time', '').split('T')[0]
-        tp_start_time = tp_workout.get('start_time')
-        tp_summary = tp_workout.get('summary', '').lower()
+        for order, (tp_uid, tp_workout) in enumerate(tp_workouts.items()):
+            tp_date = tp_workout.get('start_date') or (tp_workout.get('start_time') or '').split('T')[0]
+            tp_summary = (tp_workout.get('summary') or '').lower()
+            time_key = table.time_keys[order]
+            
+            self.by_date.setdefault(tp_date, []).append((order, tp_uid, tp_summary, time_key))
+            for category in table.categories[order]:
+                bucket = self.buckets.get((tp_date, category))
+                if bucket is None:
+                    bucket = self.buckets[(tp_date, category)] = _TPMatchBucket()
+                bucket.entries.append((order, tp_uid))
+                if time_key:
+                    bucket.by_time[time_key[0]].append((time_key[1], order, tp_uid))
         
-        # Check if dates match
-        if tp_date != workout_date:
-            continue
+        for bucket in self.buckets.values():
+            bucket.finalize()
+    
+    def find_match(self, strava_workout, matched_tp_uids):
+        """Find a matching TP workout for a Strava workout."""
+        workout_date = strava_workout['start_date']
+        workout_type = (strava_workout.get('activity_type') or '').lower()
+        workout_summary = (strava_workout.get('summary') or '').lower()
+        times = workout_times(strava_workout)
+        is_past = 0 <= times.day < self.today.toordinal()
+        time_key = None if is_past else times.start
+        if not is_past and time_key is None:
+            return None  # Future workouts can only match on time proximity
         
-        # Check if activity types match
-        if not _activities_match(workout_type, workout_summary, tp_summary):
-            continue
+        categories = _strava_sport_categories(workout_type, workout_summary)
+        if categories is None:
+            return self._find_generic(workout_date, workout_type, workout_summary,
+                                      is_past, time_key, matched_tp_uids)
         
-        # Check if workout is in the past
-        try:
-            workout_datetime = datetime.fromisoformat(workout_date)
-            today = datetime.now().date()
-            is_past = workout_datetime.date() < today
-        except:
-            is_past = False
-        
-        # For past workouts: same date + same sport type = automatic match
-        if is_past:
-            return tp_uid
-        
-        # For future workouts: check time proximity
-        if workout_start_time and tp_start_time:
-            try:
-                strava_dt = datetime.fromisoformat(workout_start_time.replace('Z', '+00:00'))
-                tp_dt = datetime.fromisoformat(tp_start_time.replace('Z', '+00:00'))
-                time_diff = abs((strava_dt - tp_dt).total_seconds())
-                
-                if time_diff <= 3600:  # Within 1 hour
-                    return tp_uid
-            except:
-                pass
+        best = None
+        for category in categories:
+            bucket = self.buckets.get((workout_date, category))
+            if bucket is None:
+                continue
+            if is_past:
+                candidate = bucket.first_unmatched(matched_tp_uids)
+            else:
+                candidate = bucket.first_near(time_key, matched_tp_uids)
+            if candidate and (best is None or candidate[0] < best[0]):
+                best = candidate
+        return best[1] if best else None
     
-    return None
+    def _find_generic(self, workout_date, workout_type, workout_summary,
+                      is_past, time_key, matched_tp_uids):
+        """Fallback for sports without a category: scan that date's workouts."""
+        window = MATCH_WINDOW_SECONDS * 1000000
+        for _, tp_uid, tp_summary, tp_time_key in self.by_date.get(workout_date, ()):
+            if tp_uid in matched_tp_uids:
+                continue
+            if not _activities_match(workout_type, workout_summary, tp_summary):
+                continue
+            if is_past:
+                return tp_uid
+            if (tp_time_key and tp_time_key[0] == time_key[0]
+                    and abs(tp_time_key[1] - time_key[1]) <= window):
+                return tp_uid
+        return None
 
 
 def _activities_match(strava_type, strava_summary, tp_summary):
@@ -111,15 +381,12 @@ def _activities_match(strava_type, strava_summary, tp_summary):
 def _is_past_planned_workout(workout):
     """Check if a workout is a past planned workout that should be removed."""
     try:
-        workout_date_str = workout.get('start_date') or workout.get('start_time', '').split('T')[0]
-        if not workout_date_str:
+        workout_day = workout_times(workout).day
+        if workout_day < 0:
             return False
-            
-        workout_date = datetime.fromisoformat(workout_date_str).date()
-        today = datetime.now().date()
         
         # Must be in the past
-        if workout_date >= today:
+        if workout_day >= datetime.now().date().toordinal():
             return False
         
         # Must be planned (not completed)
@@ -136,6 +403,142 @@ def _is_past_planned_workout(workout):
         return False
 
 
+class WorkoutTable:
+    """
+    Columnar view of a batch of workouts (e.g. one refresh), for batch checks.
+    
+    Columns are built on first use from each workout's normalized times
+    (timeutil.workout_times, so every timestamp is parsed at most once):
+    
+        date             date ordinal of start_date (or start_time's date), -1 if none
+        reference        microseconds of start_date or start_time, as classify_deletion reads them
+        reference_valid  that timestamp parsed
+        source           SOURCE_CODES code
+        status           STATUS_* bits
+    
+    They are NumPy arrays when NumPy is installed and lists otherwise; the
+    batch operations return lists and give the same results either way.
+    `time_keys` and `categories` (start times and sport sets, for
+    TPMatchIndex) are always lists.
+    """
+    
+    SOURCE_CODES = {None: 0, 'training_peaks': 1, 'strava': 2}  # Anything else: 3
+    STATUS_EXECUTED = 1  # parsed_execution_status == 'completed'
+    STATUS_COMPLETED = 2  # status == 'COMPLETED'
+    STATUS_TIMED = 4  # has a time of day (not an all-day event)
+    DELETION_TYPES = ('deleted', 'deleted_future', 'deleted_recent', 'not_executed_aged_out',
+                      'aged_out_completed', 'aged_out_not_executed')
+    DAY_MICROS = DAY_MICROS
+    
+    def __init__(self, workouts):
+        self.uids = list(workouts)
+        self.workouts = list(workouts.values())
+    
+    def __len__(self):
+        return len(self.uids)
+    
+    @functools.cached_property
+    def times(self):
+        return [workout_times(workout) for workout in self.workouts]
+    
+    @staticmethod
+    def _column(values, dtype):
+        return list(values) if np is None else np.array(list(values), dtype=dtype)
+    
+    @functools.cached_property
+    def time_keys(self):
+        """timeutil.time_key of each start_time."""
+        return [times.start for times in self.times]
+    
+    @functools.cached_property
+    def categories(self):
+        """Sport categories of each workout (Strava ones for Strava workouts)."""
+        return [
+            _strava_sport_categories((workout.get('activity_type') or '').lower(),
+                                     (workout.get('summary') or '').lower()) or set()
+            if workout.get('source') == 'strava' else
+            _tp_sport_categories((workout.get('summary') or '').lower())
+            for workout in self.workouts
+        ]
+    
+    @functools.cached_property
+    def date(self):
+        return self._column((times.day for times in self.times), 'int32')
+    
+    @functools.cached_property
+    def reference(self):
+        return self._column((times.reference or 0 for times in self.times), 'int64')
+    
+    @functools.cached_property
+    def reference_valid(self):
+        return self._column((times.reference is not None for times in self.times), 'bool')
+    
+    @functools.cached_property
+    def source(self):
+        codes = self.SOURCE_CODES
+        return self._column((
+            codes.get(source, 3) if source is None or isinstance(source, str) else 3
+            for source in (workout.get('source') for workout in self.workouts)
+        ), 'uint8')
+    
+    @functools.cached_property
+    def status(self):
+        return self._column((
+            (self.STATUS_EXECUTED if workout.get('parsed_execution_status') == 'completed' else 0) |
+            (self.STATUS_COMPLETED if workout.get('status') == 'COMPLETED' else 0) |
+            (self.STATUS_TIMED if workout.get('has_time') and not workout.get('is_all_day') else 0)
+            for workout in self.workouts
+        ), 'uint8')
+    
+    def completed(self):
+        """Rows that were executed: completed status or a time of day."""
+        if np is None:
+            return [status != 0 for status in self.status]
+        return (self.status != 0).tolist()
+    
+    def past_planned(self, today):
+        """Rows that are past planned TP workouts (see _is_past_planned_workout)."""
+        today = today.toordinal()
+        tp_sources = (self.SOURCE_CODES[None], self.SOURCE_CODES['training_peaks'])
+        if np is None:
+            return [0 <= day < today and not status & self.STATUS_EXECUTED and source in tp_sources
+                    for day, status, source in zip(self.date, self.status, self.source)]
+        return ((self.date >= 0) & (self.date < today) &
+                ((self.status & self.STATUS_EXECUTED) == 0) &
+                np.isin(self.source, tp_sources)).tolist()
+    
+    def deletion_types(self, current_timestamp):
+        """
+        WorkoutManager.classify_deletion for every row, given an aware ISO
+        `current_timestamp`.
+        """
+        now = time_key(current_timestamp)[1]
+        if np is None:
+            return [self._deletion_type(valid, (now - reference) // self.DAY_MICROS, status != 0)
+                    for valid, reference, status in zip(self.reference_valid, self.reference, self.status)]
+        days = (now - self.reference) // self.DAY_MICROS
+        completed = self.status != 0
+        codes = np.select(
+            [~self.reference_valid, days < 0, (days <= 2) & (completed | (days == 0)),
+             (days <= 5) & ~completed, completed],
+            [0, 1, 2, 3, 4],
+            default=5
+        )
+        return [self.DELETION_TYPES[code] for code in codes.tolist()]
+    
+    @classmethod
+    def _deletion_type(cls, valid, days, completed):
+        if not valid:
+            return cls.DELETION_TYPES[0]
+        if days < 0:
+            return cls.DELETION_TYPES[1]
+        if days <= 2 and (completed or days == 0):
+            return cls.DELETION_TYPES[2]
+        if days <= 5 and not completed:
+            return cls.DELETION_TYPES[3]
+        return cls.DELETION_TYPES[4] if completed else cls.DELETION_TYPES[5]
+
+
 def merge_workouts_by_source(tp_workouts, strava_workouts, enabled_sources):
     """
     Merge workouts from TP and Strava based on enabled sources.
@@ -148,6 +551,10 @@ def merge_workouts_by_source(tp_workouts, strava_workouts, enabled_sources):
     """
     merged = {}
     matched_tp_uids = set()
+    match_index = None
+    today = datetime.now().date()
+    # Dates, times and sports of the whole TP batch, parsed once
+    tp_table = WorkoutTable(tp_workouts) if 'tp' in enabled_sources else None
     
     # Add Training Peaks workouts if enabled
     # TP workouts will be added later (only unmatched ones)
@@ -159,7 +566,9 @@ def merge_workouts_by_source(tp_workouts, strava_workouts, enabled_sources):
             
             # Try to match with TP workout if both sources enabled
             if 'tp' in enabled_sources:
-                matched_tp_uid = _find_matching_tp_workout(workout, tp_workouts, matched_tp_uids)
+                if match_index is None:
+                    match_index = TPMatchIndex(tp_workouts, table=tp_table, today=today)
+                matched_tp_uid = match_index.find_match(workout, matched_tp_uids)
                 if matched_tp_uid:
                     matched_tp_uids.add(matched_tp_uid)
             
@@ -173,10 +582,11 @@ def merge_workouts_by_source(tp_workouts, strava_workouts, enabled_sources):
     
     # Add unmatched TP workouts (filter out past planned workouts)
     if 'tp' in enabled_sources:
-        for tp_uid, tp_workout in tp_workouts.items():
+        past_planned = tp_table.past_planned(today)
+        for row, (tp_uid, tp_workout) in enumerate(tp_workouts.items()):
             if tp_uid not in matched_tp_uids:
                 # Skip past planned TP workouts (they should be removed)
-                if _is_past_planned_workout(tp_workout):
+                if past_planned[row]:
                     continue
                     
                 tp_workout['source'] = 'training_peaks'
@@ -185,22 +595,96 @@ def merge_workouts_by_source(tp_workouts, strava_workouts, enabled_sources):
     return merged
 
 
+# What one WorkoutManager.commit did, captured before any later update
+UpdateResult = namedtuple('UpdateResult', ('changes', 'view', 'signature', 'stats'))
+
+
 class WorkoutManager:
     """Manages workout data storage, retrieval, and change tracking."""
     
-    def __init__(self, filepath):
+    # Fields compared by detect_changes (and covered by the fingerprint)
+    COMPARED_FIELDS = COMPARED_FIELDS
+    RECENT_CHANGES = 10  # Change-log entries kept (inflated) in the current view
+    
+    def __init__(self, filepath, backend=None):
         self.filepath = filepath
-        self.data = self.load_data()
+        self.store = open_store(filepath, backend or STORAGE_BACKEND)
+        self.archive = ChangeLogArchive(filepath)  # Older change-log entries
+        # seq → entry rolled out of the hot change log, until save_data archives it
+        self.archive_pending = {}
+        # Guards the in-memory document and indexes. Writers hold it only while
+        # applying an update in memory, never across disk I/O or the FeedLock
+        self.lock = threading.RLock()
+        # Serializes writers of this feed across processes; readers never take it
+        self.store_lock = FeedLock.for_store(filepath)
+        self.version = 0  # Bumped on every save made through this instance
+        self.signature = None  # Store signature matching self.data
+        self._dirty_uids = set()  # Workouts touched since the last save
+        self.last_update_stats = None  # Counters from the last update_workouts call
+        self._history_index = None  # ChangeLogIndex, built on first history query
+        self._version_log = None  # Sorted (version, uid) pairs, built on first delta query
+        self._query_index = None  # WorkoutQueryIndex, built on first filtered query
+        self._data = None  # Full document, loaded on first use
+        # Current workouts + metadata; reads that only need these never load history
+        self.signature = self.store.signature()
+        self.view = self.store.load_current(self.signature)
+        if self.view is not None:
+            self.view['workouts'] = {uid: as_record(w) for uid, w in self.view['workouts'].items()}
+        else:
+            self._data = self.load_data()  # Builds the view
+            if self.signature is not None:
+                self.store.save_current(self.view, self.signature)
+    
+    @property
+    def data(self):
+        """The full document (all workouts with history, change log)."""
+        if self._data is None:
+            self._data = self.load_data()
+        return self._data
     
     def load_data(self):
-        """Load workout data from JSON file."""
-        if os.path.exists(self.filepath):
-            try:
-                with open(self.filepath, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                return self.initialize_data()
-        return self.initialize_data()
+        """Load workout data from the storage backend."""
+        data, signature = self._read_store()
+        self.view = self._view_of(data, signature)
+        self.signature = signature
+        return data
+    
+    def _read_store(self):
+        """(document, signature) as stored; reads only, touches no shared state."""
+        signature = self.store.signature()
+        data = self.store.load()
+        if data is None:
+            data = self.initialize_data()
+        for workout_info in data['workouts'].values():
+            compact_workout_info(workout_info)
+        return data, signature
+    
+    def _view_of(self, data, signature):
+        """Current view for a freshly read document."""
+        if self.view is None or signature != self.signature:
+            # No view yet, or the store was written by someone else since
+            return self.build_view(data)
+        # Share the loaded records rather than keeping a second copy
+        return {**self.view, 'workouts': self.current_workouts_of(data)}
+    
+    @staticmethod
+    def current_workouts_of(data):
+        """Current (non-deleted) workouts of a full document."""
+        return {
+            uid: workout_info['current']
+            for uid, workout_info in data['workouts'].items()
+            if workout_info.get('current')
+        }
+    
+    @classmethod
+    def build_view(cls, data):
+        """Materialize the current view from a full document."""
+        return {
+            'last_updated': data.get('last_updated'),
+            'version': data.get('version', 0),
+            'workouts': cls.current_workouts_of(data),
+            'recent_changes': inflate_change_log(data['change_log'][-cls.RECENT_CHANGES:], data['workouts'])
+        }
     
     def initialize_data(self):
         """Initialize empty data structure."""
@@ -210,23 +694,162 @@ class WorkoutManager:
             'change_log': []
         }
     
-    def save_data(self):
-        """Save workout data to JSON file."""
-        with open(self.filepath, 'w') as f:
-            json.dump(self.data, f, indent=2)
+    def save_data(self, full=False):
+        """
+        Save workout data (only rows touched since the last save, unless full).
+        
+        Change-log entries rolled out by the update are appended to the
+        archive first, so a failed store save only leaves duplicates there.
+        """
+        with metrics.span('save_data'):
+            if self.archive_pending:
+                pending = sorted(self.archive_pending.items())
+                self.archive.append([entry for _, entry in pending], pending[0][0])
+                with self.lock:
+                    for seq, _ in pending:
+                        del self.archive_pending[seq]
+            self.store.save(self.data, dirty_uids=None if full else self._dirty_uids)
+        self._dirty_uids = set()
+        self.version += 1
+        self.signature = self.store.signature()
+        self.store.save_current(self.view, self.signature)
+    
+    def is_stale(self):
+        """Check whether the store was written by someone else since we loaded it."""
+        return self.store.signature() != self.signature
+    
+    def reload(self):
+        """
+        Load the store again (after someone else wrote it) and swap it in.
+        
+        The store is read without self.lock, so readers keep using the old
+        state until the swap.
+        """
+        data, signature = self._read_store()
+        view = self._view_of(data, signature)
+        with self.lock:
+            self._dirty_uids = set()
+            self.archive_pending = {}  # Still in the reloaded document's hot log
+            self._history_index = None
+            self._version_log = None
+            self._query_index = None
+            self._data = data
+            self.view = view
+            self.signature = signature
+    
+    def history_index(self):
+        """Secondary indexes over the change log (built lazily)."""
+        if self._history_index is None:
+            self._history_index = ChangeLogIndex(self)
+        return self._history_index
+    
+    def query_index(self):
+        """Date/sport/source/status index over current workouts (built lazily)."""
+        if self._query_index is None:
+            self._query_index = WorkoutQueryIndex(self.get_current_workouts())
+        return self._query_index
+    
+    def changes_since(self, since):
+        """
+        Workouts changed after version `since`.
+        
+        Returns (current workouts added/modified since then, uids removed
+        since then). Costs O(log n + changes) via a sorted version log.
+        """
+        if self._version_log is None:
+            self._version_log = sorted(
+                (workout_info.get('version', 0), uid)
+                for uid, workout_info in self.data['workouts'].items()
+            )
+        start = bisect.bisect_right(self._version_log, (since, chr(0x10FFFF)))
+        changed, removed = {}, []
+        for version, uid in self._version_log[start:]:
+            workout_info = self.data['workouts'][uid]
+            if workout_info.get('version', 0) != version:
+                continue  # Superseded by a later entry for the same uid
+            if workout_info.get('current'):
+                changed[uid] = workout_info['current']
+            else:
+                removed.append(uid)
+        return changed, removed
     
     def get_current_workouts(self):
         """Get all current workouts (non-deleted ones)."""
-        current = {}
-        for uid, workout_info in self.data['workouts'].items():
-            if workout_info.get('current'):
-                current[uid] = workout_info['current']
-        return current
+        return dict(self.view['workouts'])
+    
+    @classmethod
+    def fingerprint(cls, workout):
+        """
+        Stable hash of the compared fields.
+        
+        Equal fingerprints mean detect_changes would find nothing; repr keeps
+        None/'None' and 1/True apart, so it is exact for these scalar fields.
+        WorkoutRecords cache it (EventCache hits arrive with it set).
+        """
+        if isinstance(workout, WorkoutRecord):
+            fingerprint = workout._fingerprint
+            if fingerprint is None:
+                fingerprint = workout._fingerprint = cls._hash_fields(workout)
+            return fingerprint
+        return cls._hash_fields(workout)
+    
+    @classmethod
+    def _hash_fields(cls, workout):
+        values = repr(tuple(map(workout.get, cls.COMPARED_FIELDS)))
+        return hashlib.blake2b(values.encode(), digest_size=16).hexdigest()
+    
+    @staticmethod
+    def _cached_fingerprint(workout):
+        """Fingerprint a WorkoutRecord already carries, else None; never hashes."""
+        return getattr(workout, '_fingerprint', None)
+    
+    def _stored_fingerprint(self, uid):
+        """Fingerprint of the stored current workout (computed once for old data)."""
+        workout_info = self.data['workouts'][uid]
+        fingerprint = workout_info.get('fingerprint')
+        if fingerprint is None:
+            fingerprint = workout_info['fingerprint'] = self.fingerprint(workout_info['current'])
+        return fingerprint
+    
+    def _set_fingerprint(self, workout_info, workout):
+        """Store the new current workout's fingerprint if it carries one."""
+        fingerprint = self._cached_fingerprint(workout)
+        if fingerprint is None:
+            workout_info.pop('fingerprint', None)  # Hashed on demand if ever compared
+        else:
+            workout_info['fingerprint'] = fingerprint
     
     def update_workouts(self, new_workouts):
-        """Update workouts and track changes."""
+        """Update workouts and track changes. Returns the changes."""
+        return self.commit(new_workouts).changes
+    
+    def commit(self, new_workouts):
+        """
+        Update workouts, save, and return the UpdateResult.
+        
+        Fetching and merging happen without any lock; this is the commit
+        step. Under the feed's store_lock it checks that the store is still
+        the version this manager loaded (optimistic check) and, if another
+        worker saved in the meantime, reloads and diffs against that instead.
+        Readers wait (on self.lock) only for the in-memory update: the
+        FeedLock wait, the reload and the save all happen outside it.
+        """
+        with self.store_lock:
+            if self._data is None or self.is_stale():
+                self.reload()
+            with self.lock:
+                changes = self._apply_update(new_workouts)
+                view, stats = self.view, self.last_update_stats
+            # Readers never modify the document, so it can be written while they read it
+            self.save_data()
+            return UpdateResult(changes, view, self.signature, stats)
+    
+    def _apply_update(self, new_workouts):
         timestamp = datetime.now(tz.UTC).isoformat()
-        current_workouts = self.get_current_workouts()
+        # Readers may hold the current view without the lock: update a copy and swap it in
+        view = {**self.view, 'workouts': dict(self.view['workouts'])}
+        current_workouts = self.view['workouts']  # No longer mutated, so no copy needed
+        stats = {'incoming': len(new_workouts), 'unchanged': 0, 'diffed': 0}
         
         changes = {
             'timestamp': timestamp,
@@ -235,6 +858,8 @@ class WorkoutManager:
             'deletions': [],
             'movements': []
         }
+        # What goes into change_log: references to history entries, not copies
+        logged = {**changes, 'additions': [], 'modifications': [], 'deletions': []}
         
         # Track workouts that are being replaced
         replaced_uids = set()
@@ -249,14 +874,17 @@ class WorkoutManager:
                 # Mark the replaced workout as deleted
                 if replaced_uid in current_workouts:
                     old_workout = current_workouts[replaced_uid]
-                    changes['deletions'].append({
+                    deletion = {
                         'uid': replaced_uid,
                         'summary': old_workout['summary'],
                         'reason': f'replaced_by_{new_workout["source"]}'
-                    })
+                    }
+                    changes['deletions'].append(deletion)
+                    logged['deletions'].append(deletion)
                     
                     # Mark as deleted in history
                     if replaced_uid in self.data['workouts']:
+                        self._dirty_uids.add(replaced_uid)
                         self.data['workouts'][replaced_uid]['history'].append({
                             'timestamp': timestamp,
                             'action': 'deleted',
@@ -266,21 +894,32 @@ class WorkoutManager:
                         # Remove from current workouts
                         if 'current' in self.data['workouts'][replaced_uid]:
                             del self.data['workouts'][replaced_uid]['current']
+                        self.data['workouts'][replaced_uid].pop('fingerprint', None)
             
             if uid not in current_workouts:
-                # New workout
+                # New workout (or a deleted one coming back - keep its history)
                 changes['additions'].append(new_workout)
-                self.data['workouts'][uid] = {
-                    'current': new_workout,
-                    'history': [{
-                        'timestamp': timestamp,
-                        'action': 'added',
-                        'data': new_workout
-                    }]
-                }
+                self._dirty_uids.add(uid)
+                workout_info = self.data['workouts'].setdefault(uid, {'current': None, 'history': []})
+                workout_info['current'] = new_workout
+                self._set_fingerprint(workout_info, new_workout)
+                workout_info['history'].append({
+                    'timestamp': timestamp,
+                    'action': 'added',
+                    'data': new_workout
+                })
+                logged['additions'].append({'uid': uid, 'h': len(workout_info['history']) - 1})
             else:
-                # Existing workout - check for changes
+                # Existing workout - equal fingerprints mean nothing to diff.
+                # Only parse-cache hits and fresh TP extractions carry one;
+                # hashing anything else would cost more than the diff it saves
+                new_fingerprint = self._cached_fingerprint(new_workout)
+                if new_fingerprint is not None and new_fingerprint == self._stored_fingerprint(uid):
+                    stats['unchanged'] += 1
+                    continue
+                
                 old_workout = current_workouts[uid]
+                stats['diffed'] += 1
                 change_details = self.detect_changes(old_workout, new_workout)
                 
                 if change_details:
@@ -300,53 +939,84 @@ class WorkoutManager:
                             'new_start': new_workout['start_time']
                         })
                     
-                    # Update workout
-                    self.data['workouts'][uid]['current'] = new_workout
-                    self.data['workouts'][uid]['history'].append({
-                        'timestamp': timestamp,
-                        'action': 'modified',
-                        'data': new_workout,
-                        'changes': change_details
-                    })
+                    # Update workout (history stores a delta; changes are derived on read)
+                    self._dirty_uids.add(uid)
+                    workout_info = self.data['workouts'][uid]
+                    workout_info['current'] = new_workout
+                    self._set_fingerprint(workout_info, new_workout)
+                    workout_info['history'].append(
+                        modified_entry(timestamp, workout_info['history'], old_workout, new_workout)
+                    )
+                    logged['modifications'].append({'uid': uid, 'h': len(workout_info['history']) - 1})
         
-        # Detect deletions (or aged out from rolling window)
-        for uid, old_workout in current_workouts.items():
-            if uid not in new_workouts and uid not in replaced_uids:
-                # IMPORTANT: Never delete completed workouts - they're permanent historical records
-                was_completed = (
-                    old_workout.get('parsed_execution_status') == 'completed' or
-                    old_workout.get('status') == 'COMPLETED' or
-                    (old_workout.get('has_time') and not old_workout.get('is_all_day'))
-                )
-                
-                if was_completed:
-                    # Completed workout disappeared from feed (normal - rolling window)
-                    # Keep it in current state - it's a permanent record
-                    # Don't add to deletions or changes - this is expected behavior
-                    continue
-                
-                # For non-completed workouts, determine if deletion or aged out
-                deletion_type = self.classify_deletion(old_workout, timestamp)
-                
-                changes['deletions'].append({
-                    **old_workout,
-                    'deletion_type': deletion_type
-                })
-                self.data['workouts'][uid]['current'] = None
-                self.data['workouts'][uid]['history'].append({
-                    'timestamp': timestamp,
-                    'action': 'deleted',
-                    'deletion_type': deletion_type,
-                    'data': old_workout
-                })
+        # Detect deletions (or aged out from rolling window), classified as one batch
+        missing = {uid: old_workout for uid, old_workout in current_workouts.items()
+                   if uid not in new_workouts and uid not in replaced_uids}
+        missing_table = WorkoutTable(missing)
+        for (uid, old_workout), was_completed, deletion_type in zip(
+                missing.items(), missing_table.completed(), missing_table.deletion_types(timestamp)):
+            # IMPORTANT: Never delete completed workouts - they're permanent historical records
+            # (completed status, or a time of day - see WorkoutTable.completed)
+            if was_completed:
+                # Completed workout disappeared from feed (normal - rolling window)
+                # Keep it in current state - it's a permanent record
+                # Don't add to deletions or changes - this is expected behavior
+                continue
+            
+            # For non-completed workouts, deletion_type says whether deleted or aged out
+            changes['deletions'].append({
+                **old_workout,
+                'deletion_type': deletion_type
+            })
+            self._dirty_uids.add(uid)
+            workout_info = self.data['workouts'][uid]
+            workout_info['current'] = None
+            workout_info.pop('fingerprint', None)
+            # The deleted version is the previous history entry's data
+            workout_info['history'].append({
+                'timestamp': timestamp,
+                'action': 'deleted',
+                'deletion_type': deletion_type
+            })
+            logged['deletions'].append({'uid': uid, 'h': len(workout_info['history']) - 1})
         
         # Update metadata and save
         self.data['last_updated'] = timestamp
+        view['last_updated'] = timestamp
         if any([changes['additions'], changes['modifications'], 
                 changes['deletions'], changes['movements']]):
-            self.data['change_log'].append(changes)
+            self.data['change_log'].append(logged)
+            # `changes` is exactly what the logged references inflate to
+            view['recent_changes'] = (view['recent_changes'] + [changes])[-self.RECENT_CHANGES:]
+            if self._history_index is not None:
+                seq = self.data.get('change_log_offset', 0) + len(self.data['change_log'])
+                self._history_index.add(seq, logged)
+            if len(self.data['change_log']) > CHANGE_LOG_HOT_ENTRIES + CHANGE_LOG_ARCHIVE_BATCH:
+                # Only decided here; save_data writes the segment outside self.lock
+                first_seq, entries = detach_change_log(self.data, CHANGE_LOG_HOT_ENTRIES)
+                self.archive_pending.update(enumerate(entries, start=first_seq))
+        
+        # One version per update that touched anything; workouts remember theirs
+        if self._dirty_uids:
+            version = self.data.get('version', 0) + 1
+            self.data['version'] = version
+            view['version'] = version
+            for uid in self._dirty_uids:
+                workout_info = self.data['workouts'][uid]
+                workout_info['version'] = version
+                if workout_info.get('current'):
+                    view['workouts'][uid] = workout_info['current']
+                else:
+                    view['workouts'].pop(uid, None)
+            if self._version_log is not None:
+                self._version_log.extend((version, uid) for uid in sorted(self._dirty_uids))
+            if self._query_index is not None:
+                for uid in self._dirty_uids:
+                    self._query_index.update(uid, self.data['workouts'][uid].get('current'))
         
-        self.save_data()
+        stats['modified'] = len(changes['modifications'])
+        self.last_update_stats = stats
+        self.view = view
         return changes
     
     def classify_deletion(self, workout, current_timestamp):
@@ -363,79 +1033,30 @@ class WorkoutManager:
         - 5+ days past: Definitely aged out
         - Future: Always a deliberate deletion if removed
         """
-        try:
-            # Parse workout date
-            workout_date_str = workout.get('start_date') or workout.get('start_time')
-            if not workout_date_str:
-                return 'deleted'  # Can't determine, assume deleted
-            
-            # Parse dates, handling both with and without timezone
-            workout_date_str_clean = workout_date_str.replace('Z', '+00:00')
-            current_timestamp_clean = current_timestamp.replace('Z', '+00:00')
-            
-            workout_date = datetime.fromisoformat(workout_date_str_clean)
-            current_time = datetime.fromisoformat(current_timestamp_clean)
-            
-            # If either is naive, make both naive for comparison
-            if workout_date.tzinfo is None or current_time.tzinfo is None:
-                workout_date = workout_date.replace(tzinfo=None)
-                current_time = current_time.replace(tzinfo=None)
-            
-            # Calculate days since workout
-            days_since = (current_time - workout_date).days
-            
-            # Check execution status
-            was_completed = (
-                workout.get('parsed_execution_status') == 'completed' or
-                workout.get('status') == 'COMPLETED' or
-                (workout.get('has_time') and not workout.get('is_all_day'))  # Executed workouts have times
-            )
-            
-            # Classification logic based on shorter feed windows
-            if days_since < 0:
-                # Future workout deleted - coach removed it
-                return 'deleted_future'
-            elif days_since <= 2:
-                # Very recent past - if disappeared, likely deliberate deletion
-                # But if not completed and 1-2 days old, could be aging out
-                if was_completed:
-                    return 'deleted_recent'  # Odd to delete completed workout
-                else:
-                    # Not completed within 1-2 days could be either deleted or aged out
-                    # Be conservative - assume aged out after 2 days
-                    if days_since == 0:
-                        return 'deleted_recent'  # Today's workout deleted
-                    else:
-                        return 'not_executed_aged_out'  # Yesterday+ not executed
-            elif days_since <= 5:
-                # 3-5 days old - beyond typical feed window
-                if was_completed:
-                    return 'aged_out_completed'  # Normal aging
-                else:
-                    return 'not_executed_aged_out'  # Normal - fell off window
-            else:
-                # 5+ days old - definitely aged out
-                if was_completed:
-                    return 'aged_out_completed'  # Normal - old completed workout
-                else:
-                    return 'aged_out_not_executed'  # Normal - old missed workout
+        # Days since the workout (start_date, else start_time); naive dates are
+        # compared with the UTC wall clock of current_timestamp
+        reference = workout_times(workout).reference
+        now = time_key(current_timestamp)
+        if reference is None or now is None:
+            return 'deleted'  # Can't determine, assume deleted
+        days_since = (now[1] - reference) // DAY_MICROS
         
-        except Exception as e:
-            print(f"Error classifying deletion: {e}")
-            return 'deleted'  # Default to deleted
+        # Check execution status
+        was_completed = bool(
+            workout.get('parsed_execution_status') == 'completed' or
+            workout.get('status') == 'COMPLETED' or
+            (workout.get('has_time') and not workout.get('is_all_day'))  # Executed workouts have times
+        )
+        
+        # 0-2 days: deleted_recent if completed or today, else not_executed_aged_out;
+        # 3-5 days: aged_out_completed / not_executed_aged_out; older: aged_out_*
+        return WorkoutTable._deletion_type(True, days_since, was_completed)
     
     def detect_changes(self, old, new):
         """Detect specific changes between old and new workout data."""
         changes = {}
         
-        # Fields to compare
-        fields = ['summary', 'description', 'start_time', 'end_time', 
-                  'start_date', 'location', 'status', 'sequence', 'is_all_day',
-                  'duration', 'parsed_duration', 'parsed_planned_duration', 
-                  'parsed_distance', 'duration_type', 'source', 'activity_type',
-                  'strava_average_heartrate', 'strava_average_watts', 'strava_calories']
-        
-        for field in fields:
+        for field in self.COMPARED_FIELDS:
             old_val = old.get(field)
             new_val = new.get(field)
             if old_val != new_val:
@@ -444,6 +1065,490 @@ class WorkoutManager:
         return changes if changes else None
 
 
+class WorkoutQueryIndex:
+    """
+    Indexes current workouts for window queries.
+    
+    Keeps (start_date, uid) pairs sorted for bisect, and uid sets per sport
+    category, source and execution status. A date-window query costs
+    O(log n + k); update() keeps it in step with update_workouts.
+    """
+    
+    FILTERS = ('sport', 'source', 'status')
+    
+    def __init__(self, current_workouts):
+        self.workouts = {}
+        self.dates = {}  # uid → indexed start date
+        self.by_date = []  # Sorted (start_date, uid)
+        self.sets = {name: {} for name in self.FILTERS}  # filter → value → uids
+        self.keys = {}  # uid → {filter: values}
+        for uid, workout in current_workouts.items():
+            self._add(uid, workout)
+        self.by_date.sort()
+    
+    @staticmethod
+    def workout_keys(workout):
+        """Filter values of a workout (a workout can be in several sports)."""
+        summary = (workout.get('summary') or '').lower()
+        if workout.get('source') == 'strava':
+            sports = _strava_sport_categories((workout.get('activity_type') or '').lower(), summary)
+        else:
+            sports = _tp_sport_categories(summary)
+        return {
+            'sport': sports or {'other'},
+            'source': {workout.get('source') or 'tp'},
+            'status': {workout.get('parsed_execution_status') or 'planned'},
+        }
+    
+    @staticmethod
+    def workout_date(workout):
+        return workout.get('start_date') or (workout.get('start_time') or '')[:10]
+    
+    def _add(self, uid, workout, sorted_insert=False):
+        self.workouts[uid] = workout
+        start_date = self.dates[uid] = self.workout_date(workout)
+        if sorted_insert:
+            bisect.insort(self.by_date, (start_date, uid))
+        else:
+            self.by_date.append((start_date, uid))
+        keys = self.keys[uid] = self.workout_keys(workout)
+        for name, values in keys.items():
+            for value in values:
+                self.sets[name].setdefault(value, set()).add(uid)
+    
+    def _remove(self, uid):
+        del self.workouts[uid]
+        position = bisect.bisect_left(self.by_date, (self.dates.pop(uid), uid))
+        del self.by_date[position]
+        for name, values in self.keys.pop(uid).items():
+            for value in values:
+                self.sets[name][value].discard(uid)
+    
+    def update(self, uid, workout):
+        """Re-index one workout (None removes it)."""
+        if uid in self.workouts:
+            self._remove(uid)
+        if workout:
+            self._add(uid, workout, sorted_insert=True)
+    
+    def matches(self, uid, filters):
+        """Whether a current workout passes every sport/source/status filter."""
+        keys = self.keys.get(uid)
+        return keys is not None and all(
+            value in keys[name] for name, value in filters.items() if value
+        )
+    
+    def query(self, from_date=None, to_date=None, **filters):
+        """Current workouts in [from_date, to_date] passing the filters, by start date."""
+        start = bisect.bisect_left(self.by_date, (from_date,)) if from_date else 0
+        # '\uffff' sorts after any uid, so the whole to_date day is included
+        end = bisect.bisect_right(self.by_date, (to_date, '\uffff')) if to_date else len(self.by_date)
+        filters = {name: value for name, value in filters.items() if value}
+        if not filters:
+            return {uid: self.workouts[uid] for _, uid in self.by_date[start:end]}
+        
+        # Walk the smaller of the date window and the narrowest filter set
+        smallest = min((self.sets[name].get(value, set()) for name, value in filters.items()), key=len)
+        if len(smallest) < end - start:
+            lower = from_date or ''
+            upper = to_date or '\uffff'
+            uids = sorted(
+                (self.dates[uid], uid) for uid in smallest
+                if lower <= self.dates[uid] <= upper and self.matches(uid, filters)
+            )
+            return {uid: self.workouts[uid] for _, uid in uids}
+        return {
+            uid: self.workouts[uid] for _, uid in self.by_date[start:end]
+            if self.matches(uid, filters)
+        }
+
+
+class ChangeLogIndex:
+    """
+    Secondary indexes over change-log entries, by sequence number.
+    
+    Keeps ascending seq lists overall, per change type and per uid, plus the
+    date of each entry, so a page of history costs a bisect plus a walk over
+    about `limit` entries. Only metadata is indexed; entries are read from
+    the hot change log or, for archived seqs, from the month's archive
+    segment. Archived entries are only indexed once a query reaches them.
+    """
+    
+    TYPES = ('additions', 'modifications', 'deletions', 'movements')
+    SEGMENT_CACHE_SIZE = 4
+    
+    def __init__(self, manager):
+        self.manager = manager
+        self.seqs = []
+        self.dates = []  # YYYY-MM-DD of each entry in self.seqs
+        self.by_type = {change_type: [] for change_type in self.TYPES}
+        self.by_uid = {}
+        self.type_masks = {}  # seq → bitmask of TYPES present
+        self._segments = OrderedDict()  # month → {seq: entry}
+        offset = manager.data.get('change_log_offset', 0)
+        self.indexed_from = offset + 1  # Lowest indexed seq
+        for seq, entry in enumerate(manager.data['change_log'], start=offset + 1):
+            self.add(seq, entry)
+    
+    @staticmethod
+    def _entry_uids(entry):
+        uids = set()
+        for change_type in ChangeLogIndex.TYPES:
+            for item in entry.get(change_type, []):
+                if item.get('uid') is not None:
+                    uids.add(item['uid'])
+        return uids
+    
+    def _index(self, seq, entry):
+        """Metadata for one entry: (date, types, uids)."""
+        types = [change_type for change_type in self.TYPES if entry.get(change_type)]
+        self.type_masks[seq] = sum(1 << self.TYPES.index(change_type) for change_type in types)
+        return (entry.get('timestamp') or '')[:10], types, self._entry_uids(entry)
+    
+    def add(self, seq, entry):
+        """Index an entry newer than every indexed entry."""
+        date_str, types, uids = self._index(seq, entry)
+        self.seqs.append(seq)
+        self.dates.append(date_str)
+        for change_type in types:
+            self.by_type[change_type].append(seq)
+        for uid in uids:
+            self.by_uid.setdefault(uid, []).append(seq)
+    
+    def _load_archive(self):
+        """Index archived entries older than the indexed range."""
+        if self.indexed_from <= 1:
+            return
+        seqs, dates = [], []
+        by_type = {change_type: [] for change_type in self.TYPES}
+        by_uid = {}
+        archived = dict(self.manager.archive.read())
+        archived.update(self.manager.archive_pending)
+        for seq, entry in sorted(archived.items()):
+            if seq >= self.indexed_from:
+                continue
+            date_str, types, uids = self._index(seq, entry)
+            seqs.append(seq)
+            dates.append(date_str)
+            for change_type in types:
+                by_type[change_type].append(seq)
+            for uid in uids:
+                by_uid.setdefault(uid, []).append(seq)
+        self.seqs = seqs + self.seqs
+        self.dates = dates + self.dates
+        for change_type in self.TYPES:
+            self.by_type[change_type] = by_type[change_type] + self.by_type[change_type]
+        for uid, uid_seqs in by_uid.items():
+            self.by_uid[uid] = uid_seqs + self.by_uid.get(uid, [])
+        self.indexed_from = 1
+    
+    def entry(self, seq):
+        """The stored (compact) entry with this seq."""
+        data = self.manager.data
+        offset = data.get('change_log_offset', 0)
+        if seq > offset:
+            return data['change_log'][seq - offset - 1]
+        if seq in self.manager.archive_pending:
+            return self.manager.archive_pending[seq]
+        # Archived: read (and cache) the month's segment, again if it has grown since
+        month = self.dates[bisect.bisect_left(self.seqs, seq)][:7] or None
+        if seq not in self._segments.get(month, ()):
+            self._segments[month] = dict(self.manager.archive.read(from_month=month, to_month=month))
+            if len(self._segments) > self.SEGMENT_CACHE_SIZE:
+                self._segments.popitem(last=False)
+        self._segments.move_to_end(month)
+        return self._segments[month][seq]
+    
+    def query(self, before=None, limit=None, types=None, uid=None, from_date=None, to_date=None):
+        """
+        Newest-first (seq, entry) pairs matching every filter.
+        
+        `before` is an exclusive seq cursor. Returns (pairs, next_cursor)
+        where next_cursor is None when there is nothing older.
+        """
+        while True:
+            pairs, next_cursor, exhausted = self._query(before, limit, types, uid, from_date, to_date)
+            if not exhausted or self.indexed_from <= 1:
+                return pairs, next_cursor
+            # Ran out of indexed entries - bring in the archive and retry
+            self._load_archive()
+    
+    def _query(self, before, limit, types, uid, from_date, to_date):
+        types = set(types or ())
+        if uid is not None:
+            candidates = self.by_uid.get(uid, [])
+        elif len(types) == 1:
+            candidates = self.by_type[next(iter(types))]
+        else:
+            candidates = self.seqs
+        
+        # Translate the date range into a seq range (seq order is time order)
+        upper = before if before is not None else float('inf')
+        if to_date:
+            position = bisect.bisect_right(self.dates, to_date)
+            upper = min(upper, self.seqs[position] if position < len(self.seqs) else float('inf'))
+        lower = 0
+        if from_date:
+            position = bisect.bisect_left(self.dates, from_date)
+            # Position 0 means the range may continue into the archive
+            if position > 0:
+                lower = self.seqs[position] if position < len(self.seqs) else float('inf')
+        
+        mask = 0
+        if types and (uid is not None or len(types) > 1):
+            mask = sum(1 << self.TYPES.index(change_type) for change_type in types)
+        
+        pairs = []
+        i = bisect.bisect_left(candidates, upper) - 1
+        while i >= 0 and candidates[i] >= lower:
+            seq = candidates[i]
+            i -= 1
+            if mask and not self.type_masks[seq] & mask:
+                continue
+            if limit is not None and len(pairs) == limit:
+                return pairs, pairs[-1][0], False
+            pairs.append((seq, self.entry(seq)))
+        
+        # Older matches may still be in the (not yet indexed) archive
+        return pairs, None, lower < self.indexed_from
+
+
+class WorkoutManagerRegistry:
+    """
+    Process-wide cache of loaded WorkoutManager instances.
+    
+    Managers are keyed by their workouts file and revalidated against the
+    store signature (mtime/size) on every lookup, so writes from other
+    processes are picked up. Writes made through a cached manager bump its
+    version and refresh its signature, so they never trigger a reload.
+    Least recently used managers are evicted once the combined footprint of
+    the cached stores exceeds `max_bytes`.
+    """
+    
+    def __init__(self, max_bytes=MANAGER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # filepath -> [manager, footprint, version]
+        self._load_locks = {}  # filepath -> lock, so each file is loaded once
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, filepath):
+        """Return a current WorkoutManager for `filepath`, loading it if needed."""
+        with self._lock:
+            entry = self._entries.get(filepath)
+            load_lock = self._load_locks.setdefault(filepath, threading.Lock())
+        
+        if entry and not entry[0].is_stale():
+            self._touch(filepath, entry[0])
+            return entry[0]
+        
+        with load_lock:
+            # Another thread may have reloaded while we waited
+            with self._lock:
+                entry = self._entries.get(filepath)
+            if entry and not entry[0].is_stale():
+                self._touch(filepath, entry[0])
+                return entry[0]
+            
+            manager = WorkoutManager(filepath)
+            with self._lock:
+                self.misses += 1
+                self._entries[filepath] = [manager, manager.store.footprint(), manager.version]
+                self._entries.move_to_end(filepath)
+                self._evict()
+            return manager
+    
+    def _touch(self, filepath, manager):
+        """Mark an entry as recently used and re-measure it if it was written."""
+        with self._lock:
+            self.hits += 1
+            entry = self._entries.get(filepath)
+            if entry is None or entry[0] is not manager:
+                return
+            if entry[2] != manager.version:
+                entry[1] = manager.store.footprint()
+                entry[2] = manager.version
+            self._entries.move_to_end(filepath)
+            self._evict()
+    
+    def _evict(self):
+        """Drop least recently used managers until under budget (caller holds lock)."""
+        total = sum(entry[1] for entry in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, (manager, footprint, _) = self._entries.popitem(last=False)
+            total -= footprint
+            self.evictions += 1
+    
+    def invalidate(self, filepath):
+        """Forget the cached manager for `filepath` (e.g. after a failed update)."""
+        with self._lock:
+            self._entries.pop(filepath, None)
+    
+    def stats(self):
+        """Cache counters for diagnostics."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(entry[1] for entry in self._entries.values()),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+workout_managers = WorkoutManagerRegistry()
+
+
+# Description fields in scan priority order: (name, possible first characters,
+# pattern). Each field's value is what its own re.search would return.
+_DESCRIPTION_FIELDS = [
+    ('moving_time', 'm', r'moving\s+time[:\s]*(\d+:\d+(?::\d+)?)'),
+    ('elapsed_time', 'e', r'elapsed\s+time[:\s]*(\d+:\d+(?::\d+)?)'),
+    ('labeled_duration', 'dpe', r'(?:duration|planned duration|est\.? time|estimated time)[:\s]+(\d+:[\d:]+)'),
+    ('planned_duration', 'ptg', r'(?:planned|target|goal)\s+(?:time|duration)[:\s]*(\d+:\d+(?::\d+)?)'),
+    ('pace_hint', 'ps/', r'(?:pace|per|/|split)'),  # Standalone times are paces/splits
+    ('distance', '0123456789', r'(\d+\.?\d*)\s*(km|mi|miles?|meters?|m)\b'),
+    ('tss', 't', r'tss[:\s]*(\d+)'),
+    ('pace', '0123456789', r'(\d+:\d+)\s*/\s*(mile|km|mi)'),
+    ('power', '0123456789', r'(\d+)\s*w\b|(\d+)%?\s*ftp'),
+    ('heart_rate', '0123456789h', r'(\d+)\s*bpm|hr[:\s]*(\d+)'),
+    # Indicators that the workout was completed vs planned
+    ('completed', 'cfdame', r'\bcompleted\b|\bfinished\b|\bdone\b|\bactual\b|moving time|elapsed time'),
+    ('planned', 'psegt', r'\bplanned\b|\bscheduled\b|\bestimated\b|\best\.|\bgoal\b|\btarget\b'),
+]
+_DESCRIPTION_PATTERNS = {name: re.compile(pattern, re.IGNORECASE) for name, _, pattern in _DESCRIPTION_FIELDS}
+_DESCRIPTION_FIELD_BITS = {name: 1 << i for i, (name, _, _) in enumerate(_DESCRIPTION_FIELDS)}
+_ALL_DESCRIPTION_FIELDS = (1 << len(_DESCRIPTION_FIELDS)) - 1
+_STANDALONE_TIME_RE = re.compile(r'\b(\d{1,2}:\d{2}(?::\d{2})?)\b')
+# Property name and parameters of a content line: up to the first unquoted colon
+_PROPERTY_HEAD_RE = re.compile(r'(?:[^:"]|"[^"]*")*')
+_TZID_PARAM_RE = re.compile(r';TZID=("[^"]*"|[^;:]*)', re.IGNORECASE)
+_TZID_PROPERTY_RE = re.compile(r'^TZID(?:;[^:\r\n]*)?:([^\r\n]*)', re.IGNORECASE | re.MULTILINE)
+# TZIDs icalendar only knows from some feed's VTIMEZONE (not from its provider)
+_FEED_DEFINED_TZIDS = set()
+
+
+@functools.lru_cache(maxsize=None)
+def _description_scanner(fields_mask):
+    """
+    Combined scanner for the fields in `fields_mask`.
+    
+    It consumes one character from the fields' first-character set (which
+    lets the regex engine skip ahead quickly) and then, through a one-char
+    lookbehind wrapping a lookahead, asserts that some field matches from
+    that character. The named group tells which field won the alternation.
+    """
+    fields = [field for field in _DESCRIPTION_FIELDS if fields_mask & _DESCRIPTION_FIELD_BITS[field[0]]]
+    first_chars = ''.join(sorted(set(''.join(chars for _, chars, _ in fields))))
+    alternatives = '|'.join(f'(?P<{name}>(?<=(?={pattern})[\\s\\S]))' for name, _, pattern in fields)
+    return re.compile(f'[{re.escape(first_chars)}](?:{alternatives})', re.IGNORECASE)
+
+
+def _scan_description(description):
+    """
+    Find the first match of every description field in one pass.
+    
+    The scanner reports the leftmost position where any remaining field
+    matches, and the alternation picks the first such field in priority
+    order. That field is recorded and the scan resumes from the same
+    position without it, so other fields starting there are still found.
+    Returns {field: match}, equivalent to a separate re.search per field.
+    """
+    found = {}
+    remaining = _ALL_DESCRIPTION_FIELDS
+    pos = 0
+    while remaining:
+        hit = _description_scanner(remaining).search(description, pos)
+        if hit is None:
+            break
+        name = hit.lastgroup
+        pos = hit.start()
+        found[name] = _DESCRIPTION_PATTERNS[name].match(description, pos)
+        remaining &= ~_DESCRIPTION_FIELD_BITS[name]
+    return found
+
+
+class DescriptionCache:
+    """
+    Process-wide LRU of parsed descriptions, shared by all feeds.
+    
+    Coaches reuse workout templates, so the same DESCRIPTION shows up across
+    weeks and athletes. Entries are keyed by a BLAKE2b digest of the text
+    (the text itself is not kept) and evicted least recently used first
+    once either `max_entries` or `max_bytes` (estimated size of the cached
+    details) is exceeded. Parsing happens outside the lock, so concurrent
+    refreshes only serialize on the dictionary update.
+    """
+    
+    def __init__(self, max_entries=DESCRIPTION_CACHE_MAX_ENTRIES, max_bytes=DESCRIPTION_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest -> (details, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def _size(digest, details):
+        return (sys.getsizeof(digest) + sys.getsizeof(details) +
+                sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in details.items()))
+    
+    def get(self, description, parse):
+        """Details of `description`, from the cache or `parse(description)`. Always a fresh dict."""
+        digest = hashlib.blake2b(description.encode(), digest_size=16).digest()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(digest)
+                return dict(entry[0])
+            self.misses += 1
+        
+        details = parse(description)
+        size = self._size(digest, details)
+        with self._lock:
+            if digest not in self._entries and size <= self.max_bytes:
+                self._entries[digest] = (dict(details), size)
+                self.bytes += size
+                self._evict()
+        return details
+    
+    def _evict(self):
+        """Drop least recently used entries until under both limits (caller holds lock)."""
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+    
+    def stats(self):
+        """Cache counters for diagnostics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+description_cache = DescriptionCache()
+
+
 class ICalParser:
     """Parses iCal files and extracts workout data."""
     
@@ -458,22 +1563,260 @@ class ICalParser:
         return response.content
     
     @staticmethod
-    def parse_ical(ical_content):
-        """Parse iCal content and extract workout data."""
-        cal = Calendar.from_ical(ical_content)
+    def request_ical(url, etag=None, last_modified=None):
+        """
+        Open a streamed request for the iCal feed, conditional on validators.
+        
+        Returns (response, validators). response is None when the server
+        answered 304 Not Modified; otherwise the body has not been read yet.
+        """
+        if url.startswith('webcal://'):
+            url = 'https://' + url[9:]
+        
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        
+        response = requests.get(url, headers=headers, timeout=30, stream=True)
+        if response.status_code == 304:
+            response.close()
+            return None, {'etag': etag, 'last_modified': last_modified}
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        return response, {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified')
+        }
+    
+    @staticmethod
+    def should_stream(response):
+        """Stream-parse feeds without a Content-Length or larger than the threshold."""
+        content_length = response.headers.get('Content-Length')
+        if not content_length or not content_length.isdigit():
+            return True
+        return int(content_length) >= ICAL_STREAM_MIN_BYTES
+    
+    @staticmethod
+    def parse_ical_stream(chunks, cache=None):
+        """
+        Parse iCal content from an iterable of byte chunks.
+        
+        Returns (workouts, sha256 of the raw body).
+        """
+        digest = hashlib.sha256()
         workouts = {}
+        with metrics.span('ical_parse'):
+            for workout in ICalParser.iter_workouts(chunks, digest, cache):
+                workouts[workout['uid']] = workout
+        return workouts, digest.hexdigest()
+    
+    @staticmethod
+    def iter_workouts(chunks, digest=None, cache=None):
+        """
+        Yield workouts one VEVENT at a time from streamed iCal content.
         
-        for component in cal.walk():
-            if component.name == "VEVENT":
-                workout = ICalParser.extract_workout_data(component)
-                if workout and workout['uid']:
-                    workouts[workout['uid']] = workout
+        Only the event being parsed is held in memory. VTIMEZONE blocks are
+        handed to icalendar as they stream past, which registers their TZIDs
+        the way Calendar.from_ical does; events referring to a TZID the feed
+        has not defined yet wait until the end of the stream. With an
+        EventCache, unchanged events reuse their previous extraction.
+        """
+        timezones = {}  # TZID -> hash of the VTIMEZONE this feed defines it with
+        known_tzids = set()
         
-        return workouts
+        def resolvable(tzid):
+            # Custom TZIDs wait for this feed's own definition, even when an
+            # earlier feed already registered them
+            if (tzid not in known_tzids and tzid not in _FEED_DEFINED_TZIDS
+                    and tzp.timezone(tzid) is not None):
+                known_tzids.add(tzid)
+            return tzid in known_tzids or tzid in timezones
+        
+        deferred = []
+        for name, text in ICalParser.iter_components(ICalParser.iter_unfolded_lines(chunks, digest)):
+            if name == 'VTIMEZONE':
+                tzid = ICalParser.register_timezone(text)
+                if tzid is not None:
+                    timezones.setdefault(tzid, hashlib.blake2b(text.encode(), digest_size=16).hexdigest())
+                continue
+            if not all(resolvable(tzid) for tzid in ICalParser.event_tzids(text)):
+                deferred.append(text)  # Its VTIMEZONE may come later in the feed
+                continue
+            workout = ICalParser._event_workout(text, cache, timezones)
+            if workout is not None:
+                yield workout
+        
+        unknown = set()
+        for text in deferred:
+            unknown.update(tzid for tzid in ICalParser.event_tzids(text)
+                           if tzid not in timezones and tzp.timezone(tzid) is None)
+            workout = ICalParser._event_workout(text, cache, timezones)
+            if workout is not None:
+                yield workout
+        if unknown:
+            print(f"Unknown TZID(s) {', '.join(sorted(unknown))}: their times are read as UTC")
+    
+    @staticmethod
+    def _event_workout(event_text, cache=None, timezones=None):
+        """Extract one VEVENT (or reuse its cached extraction); None if unusable."""
+        if cache is not None:
+            uid, key = ICalParser.event_cache_key(event_text, timezones)
+            workout = cache.lookup(uid, key)
+            if workout is not None:
+                return ICalParser.apply_execution_override(workout)
+            start = time.perf_counter()
+        try:
+            component = Event.from_ical(event_text)
+        except ValueError as e:
+            print(f"Error parsing event: {e}")
+            return None
+        workout = ICalParser.extract_event_data(component)
+        if not workout or not workout['uid']:
+            return None
+        if cache is not None:
+            cache.store(uid, key, workout, time.perf_counter() - start)
+        return ICalParser.apply_execution_override(workout)
+    
+    @staticmethod
+    def register_timezone(timezone_text):
+        """
+        Parse a VTIMEZONE so icalendar caches its TZID (first definition wins,
+        as with Calendar.from_ical). Returns the TZID, or None if unusable.
+        """
+        match = _TZID_PROPERTY_RE.search(timezone_text)
+        tzid = match.group(1).strip() if match else None
+        if not tzid:
+            return None
+        custom = tzid in _FEED_DEFINED_TZIDS or tzp.timezone(tzid) is None
+        try:
+            Timezone.from_ical(timezone_text)
+        except ValueError as e:
+            print(f"Error parsing timezone: {e}")
+            return None
+        if custom:
+            _FEED_DEFINED_TZIDS.add(tzid)
+        return tzid
+    
+    @staticmethod
+    def event_tzids(event_text):
+        """TZID parameters referenced by a VEVENT's properties, in order."""
+        tzids = []
+        for line in event_text.split('\r\n'):
+            if ';' not in line:
+                continue
+            for match in _TZID_PARAM_RE.finditer(_PROPERTY_HEAD_RE.match(line).group(0)):
+                tzid = match.group(1).strip('"')
+                if tzid not in tzids:
+                    tzids.append(tzid)
+        return tzids
+    
+    @staticmethod
+    def event_cache_key(event_text, timezones=None):
+        """
+        (UID, [SEQUENCE, LAST-MODIFIED, content hash]) of a VEVENT's text.
+        
+        The hash covers every line but DTSTAMP (which changes on every pull),
+        so edits that do not bump SEQUENCE or LAST-MODIFIED still count, plus
+        the hashes in `timezones` (TZID -> VTIMEZONE hash) of the feed-defined
+        TZIDs the event uses, so redefining a timezone re-extracts its events.
+        """
+        uid = sequence = last_modified = None
+        digest = hashlib.blake2b(digest_size=16)
+        for line in event_text.split('\r\n'):
+            name, _, value = line.partition(':')
+            name = name.split(';', 1)[0].upper()
+            if name == 'DTSTAMP':
+                continue
+            digest.update(line.encode())
+            digest.update(b'\n')
+            if name == 'UID':
+                uid = value
+            elif name == 'SEQUENCE':
+                sequence = value
+            elif name == 'LAST-MODIFIED':
+                last_modified = value
+        if timezones:
+            for tzid in ICalParser.event_tzids(event_text):
+                if tzid in timezones:
+                    digest.update(f'TZ:{tzid}:{timezones[tzid]}\n'.encode())
+        return uid, [sequence, last_modified, digest.hexdigest()]
+    
+    @staticmethod
+    def iter_unfolded_lines(chunks, digest=None):
+        """Split byte chunks into content lines, joining folded lines (RFC 5545 3.1)."""
+        current = None
+        for line in ICalParser._iter_physical_lines(chunks, digest):
+            if line[:1] in (b' ', b'\t'):
+                if current is not None:
+                    current.append(line[1:])
+                continue
+            if current:
+                yield b''.join(current).decode('utf-8', errors='replace')
+            current = [line] if line else None
+        if current:
+            yield b''.join(current).decode('utf-8', errors='replace')
     
     @staticmethod
-    def extract_workout_data(component):
-        """Extract relevant data from an iCal event component."""
+    def _iter_physical_lines(chunks, digest=None):
+        """Split byte chunks on newlines, hashing the raw bytes on the way."""
+        pending = b''
+        for chunk in chunks:
+            if digest is not None:
+                digest.update(chunk)
+            pending += chunk
+            *lines, pending = pending.split(b'\n')
+            for line in lines:
+                yield line.rstrip(b'\r')
+        if pending:
+            yield pending.rstrip(b'\r')
+    
+    @staticmethod
+    def iter_components(lines, names=('VEVENT', 'VTIMEZONE')):
+        """
+        Yield (name, text) for each top-level component in `names`, including
+        nested components like VALARM or STANDARD/DAYLIGHT.
+        """
+        component_lines = None
+        name = None
+        depth = 0
+        for line in lines:
+            upper = line.upper()
+            if component_lines is None:
+                if upper.startswith('BEGIN:') and upper[6:] in names:
+                    component_lines = [line]
+                    name = upper[6:]
+                    depth = 1
+                continue
+            
+            component_lines.append(line)
+            if upper.startswith('BEGIN:'):
+                depth += 1
+            elif upper.startswith('END:'):
+                depth -= 1
+                if depth == 0:
+                    yield name, '\r\n'.join(component_lines) + '\r\n'
+                    component_lines = None
+    
+    @staticmethod
+    def apply_execution_override(workout):
+        """Validate execution status - future workouts cannot be completed (depends on today)."""
+        if workout.get('parsed_execution_status') == 'completed':
+            workout_date = parse_datetime(workout.get('start_time'))  # None: keep original status
+            if workout_date is not None and workout_date.date() > datetime.now().date():
+                workout['parsed_execution_status'] = 'planned'  # Force future workouts to be planned
+        return workout
+    
+    @staticmethod
+    def extract_event_data(component):
+        """
+        Extract workout data from an iCal event component as the event states
+        it (apply_execution_override still has to run on the result).
+        """
         try:
             # Get start and end time info
             dtstart = component.get('DTSTART')
@@ -496,24 +1839,7 @@ class ICalParser:
             description = str(component.get('DESCRIPTION', ''))
             parsed_details = ICalParser.parse_description(description)
             
-            # Validate execution status - future workouts cannot be completed
-            execution_status = parsed_details.get('execution_status')
-            if execution_status == 'completed':
-                try:
-                    workout_date_str = start_time_info['iso'] if start_time_info else None
-                    if workout_date_str:
-                        if 'T' in workout_date_str:
-                            workout_date = datetime.fromisoformat(workout_date_str.replace('Z', '+00:00')).date()
-                        else:
-                            workout_date = datetime.fromisoformat(workout_date_str).date()
-                        
-                        current_date = datetime.now().date()
-                        if workout_date > current_date:
-                            execution_status = 'planned'  # Force future workouts to be planned
-                except:
-                    pass  # If date parsing fails, keep original status
-            
-            workout = {
+            workout = WorkoutRecord({
                 'uid': str(component.get('UID', '')),
                 'summary': str(component.get('SUMMARY', '')),
                 'description': description,
@@ -539,9 +1865,10 @@ class ICalParser:
                 'parsed_pace': parsed_details.get('pace'),
                 'parsed_power': parsed_details.get('power'),
                 'parsed_heart_rate': parsed_details.get('heart_rate'),
-                'parsed_execution_status': execution_status,
+                'parsed_execution_status': parsed_details.get('execution_status'),
                 'duration_type': parsed_details.get('duration_type'),
-            }
+                'source': 'training_peaks',  # As merge_workouts_by_source sets it, so fingerprints hold
+            })
             return workout
         except Exception as e:
             print(f"Error extracting workout data: {e}")
@@ -563,7 +1890,7 @@ class ICalParser:
                 # Ensure timezone awareness
                 # Training Peaks iCal naive datetimes are in UTC
                 if dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=tz.UTC)
+                    dt = dt.replace(tzinfo=UTC)
                 return {
                     'iso': dt.isoformat(),
                     'date': dt.date().isoformat(),
@@ -647,6 +1974,18 @@ class ICalParser:
     
     @staticmethod
     def parse_description(description):
+        """Parse workout description to extract structured details (memoized in description_cache)."""
+        if not description:
+            return {}
+        if metrics.current() is None:
+            return description_cache.get(description, ICalParser.parse_description_uncached)
+        start = time.perf_counter()
+        details = description_cache.get(description, ICalParser.parse_description_uncached)
+        metrics.add('parse_description', time.perf_counter() - start)
+        return details
+    
+    @staticmethod
+    def parse_description_uncached(description):
         """Parse workout description to extract structured details."""
         if not description:
             return {}
@@ -654,119 +1993,74 @@ class ICalParser:
         details = {}
         
         try:
+            found = _scan_description(description)
+            
             # Parse duration - PRIORITY ORDER:
             # 1. Moving Time (most accurate - actual workout time)
             # 2. Elapsed Time  
             # 3. Labeled durations (Duration:, Est. Time:, etc.)
             # 4. Planned durations for planned workouts
             # 5. Standalone time patterns
-            
-            # Priority 1: Moving Time
-            moving_time_match = re.search(r'moving\s+time[:\s]*(\d+:\d+(?::\d+)?)', description, re.IGNORECASE)
-            if moving_time_match:
-                duration_str = moving_time_match.group(1)
+            if 'moving_time' in found:
+                duration_str = found['moving_time'].group(1)
                 details['duration'] = duration_str
                 details['duration_formatted'] = ICalParser.format_duration_string(duration_str)
                 details['duration_type'] = 'moving_time'
-            # Priority 2: Elapsed Time
-            elif re.search(r'elapsed\s+time[:\s]*(\d+:\d+(?::\d+)?)', description, re.IGNORECASE):
-                elapsed_match = re.search(r'elapsed\s+time[:\s]*(\d+:\d+(?::\d+)?)', description, re.IGNORECASE)
-                duration_str = elapsed_match.group(1)
+            elif 'elapsed_time' in found:
+                duration_str = found['elapsed_time'].group(1)
                 details['duration'] = duration_str
                 details['duration_formatted'] = ICalParser.format_duration_string(duration_str)
                 details['duration_type'] = 'elapsed_time'
-            # Priority 3: Labeled durations
-            elif re.search(r'(?:duration|planned duration|est\.? time|estimated time)[:\s]+(\d+:[\d:]+)', description, re.IGNORECASE):
-                duration_labeled = re.search(r'(?:duration|planned duration|est\.? time|estimated time)[:\s]+(\d+:[\d:]+)', description, re.IGNORECASE)
-                duration_str = duration_labeled.group(1).strip()
+            elif 'labeled_duration' in found:
+                duration_str = found['labeled_duration'].group(1).strip()
                 details['duration'] = duration_str
                 details['duration_formatted'] = ICalParser.format_duration_string(duration_str)
-            # Priority 4: Planned durations for planned workouts (when no actual duration exists)
-            else:
-                # Look for planned duration patterns
-                planned_duration_match = re.search(r'(?:planned|target|goal)\s+(?:time|duration)[:\s]*(\d+:\d+(?::\d+)?)', description, re.IGNORECASE)
-                if planned_duration_match:
-                    duration_str = planned_duration_match.group(1)
-                    details['planned_duration'] = duration_str
-                    details['planned_duration_formatted'] = ICalParser.format_duration_string(duration_str)
-                    details['duration_type'] = 'planned'
-                else:
-                    # Look for simple time patterns that might be planned durations
-                    # Only if it looks like a reasonable workout duration (not pace)
-                    time_patterns = re.findall(r'\b(\d{1,2}:\d{2}(?::\d{2})?)\b', description)
-                    for time_pattern in time_patterns:
-                        # Check if it's likely a duration (not pace, splits, etc.)
-                        if not re.search(r'(?:pace|per|/|split)', description, re.IGNORECASE):
-                            # Only use if it's in a reasonable range (5 minutes to 8 hours)
-                            parts = time_pattern.split(':')
-                            if len(parts) == 2:  # MM:SS or HH:MM
-                                minutes = int(parts[0])
-                                if 5 <= minutes <= 480:  # 5 minutes to 8 hours
-                                    details['planned_duration'] = time_pattern
-                                    details['planned_duration_formatted'] = ICalParser.format_duration_string(time_pattern)
-                                    details['duration_type'] = 'planned'
-                                    break
-                            elif len(parts) == 3:  # HH:MM:SS
-                                hours = int(parts[0])
-                                if hours <= 8:  # Up to 8 hours
-                                    details['planned_duration'] = time_pattern
-                                    details['planned_duration_formatted'] = ICalParser.format_duration_string(time_pattern)
-                                    details['duration_type'] = 'planned'
-                                    break
+            elif 'planned_duration' in found:
+                duration_str = found['planned_duration'].group(1)
+                details['planned_duration'] = duration_str
+                details['planned_duration_formatted'] = ICalParser.format_duration_string(duration_str)
+                details['duration_type'] = 'planned'
+            elif 'pace_hint' not in found:
+                # Look for simple time patterns that might be planned durations
+                # Only if it looks like a reasonable workout duration (not pace)
+                for time_pattern in _STANDALONE_TIME_RE.findall(description):
+                    parts = time_pattern.split(':')
+                    if len(parts) == 2:  # MM:SS or HH:MM
+                        is_duration = 5 <= int(parts[0]) <= 480  # 5 minutes to 8 hours
+                    else:  # HH:MM:SS
+                        is_duration = int(parts[0]) <= 8  # Up to 8 hours
+                    if is_duration:
+                        details['planned_duration'] = time_pattern
+                        details['planned_duration_formatted'] = ICalParser.format_duration_string(time_pattern)
+                        details['duration_type'] = 'planned'
+                        break
             
             # Parse distance (e.g., "10 km", "5.2 miles", "3000m")
-            distance_match = re.search(r'(\d+\.?\d*)\s*(km|mi|miles?|meters?|m)\b', description, re.IGNORECASE)
-            if distance_match:
+            if 'distance' in found:
+                distance_match = found['distance']
                 details['distance'] = f"{distance_match.group(1)} {distance_match.group(2)}"
             
-            # Removed intensity/zone parsing - too unreliable
-            
             # Parse TSS (Training Stress Score)
-            tss_match = re.search(r'tss[:\s]*(\d+)', description, re.IGNORECASE)
-            if tss_match:
-                details['tss'] = tss_match.group(1)
+            if 'tss' in found:
+                details['tss'] = found['tss'].group(1)
             
             # Parse pace (e.g., "8:30/mile", "5:00/km")
-            pace_match = re.search(r'(\d+:\d+)\s*/\s*(mile|km|mi)', description, re.IGNORECASE)
-            if pace_match:
+            if 'pace' in found:
+                pace_match = found['pace']
                 details['pace'] = f"{pace_match.group(1)}/{pace_match.group(2)}"
             
             # Parse power (e.g., "200W", "FTP", "95% FTP")
-            power_match = re.search(r'(\d+)\s*w\b|(\d+)%?\s*ftp', description, re.IGNORECASE)
-            if power_match:
-                details['power'] = power_match.group(0)
+            if 'power' in found:
+                details['power'] = found['power'].group(0)
             
             # Parse heart rate (e.g., "145 bpm", "HR 150")
-            hr_match = re.search(r'(\d+)\s*bpm|hr[:\s]*(\d+)', description, re.IGNORECASE)
-            if hr_match:
-                details['heart_rate'] = hr_match.group(0)
-        
-            # Parse execution status
-            # Look for indicators that workout was completed vs planned
-            completed_indicators = [
-                r'\bcompleted\b',
-                r'\bfinished\b',
-                r'\bdone\b',
-                r'\bactual\b',
-                r'moving time',
-                r'elapsed time'
-            ]
+            if 'heart_rate' in found:
+                details['heart_rate'] = found['heart_rate'].group(0)
             
-            planned_indicators = [
-                r'\bplanned\b',
-                r'\bscheduled\b',
-                r'\bestimated\b',
-                r'\best\.',
-                r'\bgoal\b',
-                r'\btarget\b'
-            ]
-            
-            is_completed = any(re.search(pattern, description, re.IGNORECASE) for pattern in completed_indicators)
-            is_planned = any(re.search(pattern, description, re.IGNORECASE) for pattern in planned_indicators)
-            
-            if is_completed:
+            # Parse execution status
+            if 'completed' in found:
                 details['execution_status'] = 'completed'
-            elif is_planned:
+            elif 'planned' in found:
                 details['execution_status'] = 'planned'
         
         except Exception as e:
@@ -807,13 +2101,132 @@ class ICalParser:
             return duration_str
 
 
+class StravaRateLimiter:
+    """
+    Process-wide request budget for the Strava app credential.
+    
+    Strava counts requests in fixed windows (15 minutes, reset on the quarter
+    hour, and daily, reset at midnight UTC) and reports the totals in
+    X-RateLimit-Limit/X-RateLimit-Usage. Every request first takes a token from
+    a bucket that refills at the 15-minute rate (so bursts are smoothed out
+    across the window) and then a slot in both windows. Callers queue until
+    quota is available instead of failing.
+    """
+    
+    def __init__(self, limits=STRAVA_RATE_LIMITS, burst=STRAVA_BURST):
+        self.condition = threading.Condition()
+        self.limits = list(limits)
+        self.usage = [0, 0]
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.window_ends = self._window_ends(time.time())
+        self.waits = 0
+        self.waited_seconds = 0.0
+    
+    @staticmethod
+    def _window_ends(now):
+        """Epoch times at which the current 15-minute and daily windows reset."""
+        return [(now // 900 + 1) * 900, (now // 86400 + 1) * 86400]
+    
+    def _roll_windows(self, now):
+        for i, end in enumerate(self.window_ends):
+            if now >= end:
+                self.usage[i] = 0
+        self.window_ends = self._window_ends(now)
+    
+    def _refill(self):
+        now = time.monotonic()
+        rate = self.limits[0] / 900.0
+        self.tokens = min(float(self.burst), self.tokens + (now - self.refilled_at) * rate)
+        self.refilled_at = now
+    
+    def _delay(self, now):
+        """Seconds until a request may be sent (0 if it can go now)."""
+        for i in (1, 0):
+            if self.usage[i] >= self.limits[i]:
+                return self.window_ends[i] - now
+        if self.tokens < 1:
+            return (1 - self.tokens) / (self.limits[0] / 900.0)
+        return 0
+    
+    def acquire(self, cancel=None, max_wait=None):
+        """
+        Block until a request may be sent, then count it.
+        
+        Raises ValueError if the quota will not free up within `max_wait`
+        seconds, and RefreshCancelled if `cancel` is set while waiting.
+        """
+        max_wait = STRAVA_MAX_WAIT_SECONDS if max_wait is None else max_wait
+        started = time.monotonic()
+        waited = False
+        with self.condition:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    raise RefreshCancelled('cancelled')
+                now = time.time()
+                self._roll_windows(now)
+                self._refill()
+                delay = self._delay(now)
+                if delay <= 0:
+                    self.tokens -= 1
+                    self.usage[0] += 1
+                    self.usage[1] += 1
+                    if waited:
+                        self.waits += 1
+                        self.waited_seconds += time.monotonic() - started
+                    return
+                if time.monotonic() - started + delay > max_wait:
+                    raise ValueError(
+                        f'Strava API rate limit exceeded. Quota frees up in {int(delay)}s.'
+                    )
+                waited = True
+                # Wake up periodically to notice cancellation
+                self.condition.wait(min(delay, 1.0))
+    
+    def update(self, headers):
+        """Adopt the limits and usage reported by Strava."""
+        rate_limit = StravaAPI.parse_rate_limit(headers)
+        if rate_limit is None:
+            return
+        with self.condition:
+            self._roll_windows(time.time())
+            self.limits = rate_limit['limit']
+            # Local counts include requests still in flight
+            self.usage = [max(local, reported) for local, reported in zip(self.usage, rate_limit['usage'])]
+            self.condition.notify_all()
+    
+    def exhausted(self):
+        """A 429 was returned: treat the 15-minute window as used up."""
+        with self.condition:
+            self.usage[0] = max(self.usage[0], self.limits[0])
+    
+    def remaining(self):
+        """Requests left in the tighter of the two windows."""
+        with self.condition:
+            self._roll_windows(time.time())
+            return max(0, min(limit - used for limit, used in zip(self.limits, self.usage)))
+    
+    def stats(self):
+        with self.condition:
+            return {
+                'limits': list(self.limits),
+                'usage': list(self.usage),
+                'waits': self.waits,
+                'waited_seconds': round(self.waited_seconds, 3)
+            }
+
+
+strava_rate_limiter = StravaRateLimiter()
+
+
 class StravaAPI:
     """Fetches workout data from Strava API."""
     
     BASE_URL = 'https://www.strava.com/api/v3'
     
     @staticmethod
-    def fetch_activities(access_token, after_timestamp=None, before_timestamp=None, per_page=200):
+    def fetch_activities(access_token, after_timestamp=None, before_timestamp=None, per_page=200, page=1):
         """
         Fetch athlete activities using List Athlete Activities endpoint.
         Reference: https://developers.strava.com/docs/reference/#api-Activities-getLoggedInAthleteActivities
@@ -823,41 +2236,96 @@ class StravaAPI:
             after_timestamp: Unix timestamp - only activities after this date
             before_timestamp: Unix timestamp - only activities before this date
             per_page: Number of activities per page (max 200)
+            page: Page number (1-based)
         """
-        try:
-            headers = {'Authorization': f'Bearer {access_token}'}
-            params = {'per_page': min(per_page, 200)}  # Respect API limit
-            
-            # Set date range to avoid hitting API limits
-            if not after_timestamp:
-                # Default to last 10 days to avoid hitting rate limits
-                from datetime import datetime, timedelta
-                ten_days_ago = datetime.now() - timedelta(days=10)
-                after_timestamp = int(ten_days_ago.timestamp())
-            
-            if after_timestamp:
-                params['after'] = after_timestamp
-            if before_timestamp:
-                params['before'] = before_timestamp
-            
-            response = requests.get(
-                f'{StravaAPI.BASE_URL}/activities',
-                headers=headers,
-                params=params,
-                timeout=30
-            )
-            
-            # Handle specific error codes
-            if response.status_code == 401:
-                raise ValueError('Invalid Strava access token. Please check your token and try again.')
-            elif response.status_code == 429:
-                raise ValueError('Strava API rate limit exceeded. Please try again in 15 minutes.')
+        activities, _ = StravaAPI.fetch_activities_page(
+            access_token, after_timestamp, before_timestamp, per_page, page
+        )
+        return activities
+    
+    @staticmethod
+    def fetch_activities_page(access_token, after_timestamp=None, before_timestamp=None, per_page=200, page=1,
+                              cancel=None):
+        """Fetch one page of activities. Returns (activities, rate_limit)."""
+        headers = {'Authorization': f'Bearer {access_token}'}
+        params = {'per_page': min(per_page, 200), 'page': page}  # Respect API limit
+        
+        # Set date range to avoid hitting API limits
+        if not after_timestamp:
+            # Default to the last STRAVA_LOOKBACK_DAYS to avoid hitting rate limits
+            after_timestamp = int((datetime.now() - timedelta(days=STRAVA_LOOKBACK_DAYS)).timestamp())
+        
+        if after_timestamp:
+            params['after'] = after_timestamp
+        if before_timestamp:
+            params['before'] = before_timestamp
+        
+        response = StravaAPI.request(f'{StravaAPI.BASE_URL}/activities', headers, params, cancel)
+        return response.json(), StravaAPI.parse_rate_limit(response.headers)
+    
+    @staticmethod
+    def request(url, headers, params, cancel=None):
+        """
+        GET a Strava API endpoint through the shared rate limiter.
+        
+        429s wait for the quota window to reset; 5xx responses and connection
+        errors are retried with jittered exponential backoff.
+        """
+        attempt = 0
+        while True:
+            strava_rate_limiter.acquire(cancel)
+            try:
+                response = requests.get(url, headers=headers, params=params, timeout=30)
+            except requests.RequestException as e:
+                response = None
+                error = e
             
-            response.raise_for_status()
-            return response.json()
+            if response is not None:
+                strava_rate_limiter.update(response.headers)
+                
+                # Handle specific error codes
+                if response.status_code == 401:
+                    raise ValueError('Invalid Strava access token. Please check your token and try again.')
+                elif response.status_code == 429:
+                    strava_rate_limiter.exhausted()
+                    continue
+                elif response.status_code < 500:
+                    try:
+                        response.raise_for_status()
+                    except requests.RequestException as e:
+                        raise ValueError(f'Failed to fetch from Strava: {str(e)}')
+                    return response
+                error = f'{response.status_code} Server Error'
             
-        except requests.RequestException as e:
-            raise ValueError(f'Failed to fetch from Strava: {str(e)}')
+            attempt += 1
+            if attempt > STRAVA_MAX_RETRIES:
+                raise ValueError(f'Failed to fetch from Strava: {str(error)}')
+            # Full jitter: sleep somewhere in [0, 2^attempt) seconds, capped
+            backoff = random.uniform(0, min(30, 2 ** attempt))
+            if cancel is not None:
+                if cancel.wait(backoff):
+                    raise RefreshCancelled('cancelled')
+            else:
+                time.sleep(backoff)
+    
+    @staticmethod
+    def parse_rate_limit(headers):
+        """
+        Parse X-RateLimit-Limit/Usage ("15min,daily") into remaining requests.
+        
+        Returns {'limit': [15min, daily], 'usage': [...], 'remaining': n}
+        or None if the headers are missing.
+        """
+        try:
+            limit = [int(x) for x in headers['X-RateLimit-Limit'].split(',')]
+            usage = [int(x) for x in headers['X-RateLimit-Usage'].split(',')]
+        except (KeyError, ValueError):
+            return None
+        return {
+            'limit': limit,
+            'usage': usage,
+            'remaining': max(0, min(l - u for l, u in zip(limit, usage)))
+        }
     
     @staticmethod
     def parse_strava_activities(activities):
@@ -866,7 +2334,7 @@ class StravaAPI:
         
         for activity in activities:
             # Only include completed activities (Strava only has completed)
-            workout = {
+            workout = WorkoutRecord({
                 'uid': f"strava_{activity['id']}",
                 'summary': activity.get('name', ''),
                 'description': activity.get('description', '') or '',
@@ -904,11 +2372,11 @@ class StravaAPI:
                 'strava_average_watts': activity.get('average_watts'),
                 'strava_kilojoules': activity.get('kilojoules'),
                 'strava_calories': activity.get('calories'),
-            }
+            })
             
             # Calculate end time
-            if workout['start_time'] and activity.get('elapsed_time'):
-                start_dt = datetime.fromisoformat(workout['start_time'].replace('Z', '+00:00'))
+            start_dt = parse_datetime(workout['start_time'])
+            if start_dt is not None and activity.get('elapsed_time'):
                 end_dt = start_dt + timedelta(seconds=activity.get('elapsed_time'))
                 workout['end_time'] = end_dt.isoformat()
                 workout['end_date'] = end_dt.date().isoformat()
@@ -953,6 +2421,770 @@ class StravaAPI:
             return f"{minutes}:{secs:02d}"
 
 
+class StravaActivityStore:
+    """
+    Locally cached raw Strava activities for one athlete.
+    
+    Stored as data/strava_<athlete>.json:
+    {'high_water_mark': EPOCH | None, 'activities': {id: ACTIVITY}}
+    """
+    
+    def __init__(self, athlete_key):
+        self.filepath = os.path.join(DATA_DIR, f'strava_{athlete_key}.json')
+        self.data = load_feed_state(self.filepath) or {'high_water_mark': None, 'activities': {}}
+    
+    def merge(self, activities, after=None, before=None):
+        """
+        Insert/replace activities and advance the high-water mark.
+        
+        With `after` (and optionally `before`), `activities` is Strava's full
+        answer for that range: cached activities starting inside it that are
+        missing from the answer were deleted on Strava and are dropped.
+        """
+        if after is not None:
+            fetched_ids = {str(activity['id']) for activity in activities}
+            for activity_id, activity in list(self.data['activities'].items()):
+                start = _strava_start_epoch(activity)
+                if (activity_id not in fetched_ids and start is not None and start > after
+                        and (before is None or start < before)):
+                    del self.data['activities'][activity_id]
+        for activity in activities:
+            self.data['activities'][str(activity['id'])] = activity
+            start = _strava_start_epoch(activity)
+            if start is not None and (self.data['high_water_mark'] or 0) < start:
+                self.data['high_water_mark'] = start
+    
+    def save(self):
+        save_feed_state(self.filepath, self.data)
+    
+    def activities_since(self, after_timestamp):
+        """Cached activities starting after `after_timestamp`, oldest first."""
+        selected = [
+            (start, activity) for activity in self.data['activities'].values()
+            for start in [_strava_start_epoch(activity)]
+            if start is not None and start > after_timestamp
+        ]
+        selected.sort(key=lambda item: item[0])
+        return [activity for _, activity in selected]
+
+
+def _strava_start_epoch(activity):
+    """Activity start (UTC) as a Unix timestamp."""
+    start = parse_datetime(activity.get('start_date'))
+    return int(start.timestamp()) if start is not None else None
+
+
+_strava_sync_locks = {}
+_strava_sync_locks_guard = threading.Lock()
+
+
+class StravaSync:
+    """
+    Incremental Strava sync into a StravaActivityStore.
+    
+    `sync()` asks for activities after the persisted high-water mark (minus
+    STRAVA_SYNC_OVERLAP_SECONDS, since uploads can arrive late), or at least
+    the last STRAVA_LOOKBACK_DAYS, and pages until Strava runs out.
+    `backfill()` fetches a date range with pages requested in parallel,
+    bounded by the remaining rate-limit budget. Either way the fetched range
+    replaces the cache's copy of it, so edits and deletions are picked up.
+    """
+    
+    PER_PAGE = 200
+    
+    def __init__(self, access_token, athlete_key):
+        self.access_token = access_token
+        self.athlete_key = athlete_key
+        with _strava_sync_locks_guard:
+            self.lock = _strava_sync_locks.setdefault(athlete_key, threading.Lock())
+    
+    def sync(self, cancel=None):
+        """Fetch everything newer than the high-water mark. Returns the store."""
+        high_water_mark = StravaActivityStore(self.athlete_key).data.get('high_water_mark')
+        # Re-read the whole window that refreshes merge, not just the overlap
+        after = int((datetime.now() - timedelta(days=STRAVA_LOOKBACK_DAYS)).timestamp())
+        if high_water_mark:
+            after = min(after, high_water_mark - STRAVA_SYNC_OVERLAP_SECONDS)
+        
+        fetched = []
+        page = 1
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise RefreshCancelled('cancelled')
+            activities, _ = StravaAPI.fetch_activities_page(
+                self.access_token, after_timestamp=after, per_page=self.PER_PAGE, page=page, cancel=cancel
+            )
+            fetched.extend(activities)
+            if len(activities) < self.PER_PAGE:
+                break
+            page += 1
+        
+        return self._commit(fetched, after)
+    
+    def backfill(self, after_timestamp, before_timestamp=None, concurrency=None):
+        """
+        Fetch all activities in [after, before) with parallel page requests.
+        
+        Pages are requested in waves of up to `concurrency`, no more than the
+        remaining rate-limit budget (requests beyond it queue in the shared
+        limiter). Returns the number of activities fetched.
+        """
+        concurrency = concurrency or STRAVA_BACKFILL_CONCURRENCY
+        fetch = functools.partial(
+            StravaAPI.fetch_activities_page, self.access_token,
+            after_timestamp, before_timestamp, self.PER_PAGE
+        )
+        
+        fetched, _ = fetch(1)
+        exhausted = len(fetched) < self.PER_PAGE
+        next_page = 2
+        
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='strava-backfill') as executor:
+            while not exhausted:
+                budget = max(1, min(concurrency, strava_rate_limiter.remaining()))
+                pages = list(range(next_page, next_page + budget))
+                next_page += budget
+                # Results come back in page order, so the first short page ends the range
+                for activities, _ in executor.map(fetch, pages):
+                    fetched.extend(activities)
+                    if len(activities) < self.PER_PAGE:
+                        exhausted = True
+        
+        self._commit(fetched, after_timestamp, before_timestamp)
+        return len(fetched)
+    
+    def _commit(self, activities, after, before=None):
+        """
+        Replace the cache's (after, before) range with the fetched activities
+        and save it.
+        
+        Only this step takes the athlete's lock, never the network requests
+        or rate-limit waits: it reloads the cache so that syncs and backfills
+        that finished meanwhile are kept (merging is idempotent).
+        """
+        with self.lock:
+            store = StravaActivityStore(self.athlete_key)
+            store.merge(activities, after, before)
+            store.save()
+            return store
+
+
+def strava_athlete_key(access_token, athlete_id=None):
+    """Key for an athlete's activity cache (token hash if the id is unknown)."""
+    if athlete_id:
+        return str(athlete_id)
+    return 'token_' + hashlib.sha256(access_token.encode()).hexdigest()[:16]
+
+
+class RefreshCancelled(Exception):
+    """Raised inside a source fetch once its refresh has given up on it."""
+
+
+# Shared by all refreshes so concurrent requests don't each spawn threads
+SOURCE_FETCH_WORKERS = 16
+_source_executor = ThreadPoolExecutor(max_workers=SOURCE_FETCH_WORKERS, thread_name_prefix='tp-source')
+
+
+def _cancellable(chunks, cancel):
+    """Stop a streamed download as soon as the refresh is cancelled."""
+    for chunk in chunks:
+        if cancel.is_set():
+            raise RefreshCancelled('cancelled')
+        yield chunk
+
+
+def _read_chunks(body, size=64 * 1024):
+    """Iterate a spooled feed body in fixed-size chunks."""
+    return iter(functools.partial(body.read, size), b'')
+
+
+def _fetch_tp_source(tp_url, validators, previous_sha256, event_cache, cancel):
+    """
+    Fetch the TP feed (conditional on validators).
+    
+    Large feeds are spooled and hashed before anything is parsed: a body
+    identical to the last refresh is returned unparsed as `body`, any other
+    one is parsed from the spool (reusing unchanged events from event_cache).
+    Small ones are returned as raw content so parsing can be skipped when
+    nothing changed.
+    """
+    with metrics.span('tp_fetch'):
+        result = {'workouts': None, 'content': None, 'body': None, 'sha256': None}
+        response, result['validators'] = ICalParser.request_ical(tp_url, **validators)
+        if response is None:
+            # 304 Not Modified means the body is the one we hashed last time
+            result['sha256'] = previous_sha256
+        elif ICalParser.should_stream(response):
+            # Held in memory up to ICAL_STREAM_MIN_BYTES, on disk past that
+            body = tempfile.SpooledTemporaryFile(max_size=ICAL_STREAM_MIN_BYTES)
+            digest = hashlib.sha256()
+            try:
+                with response:
+                    for chunk in _cancellable(response.iter_content(64 * 1024), cancel):
+                        digest.update(chunk)
+                        body.write(chunk)
+            except BaseException:
+                body.close()
+                raise
+            body.seek(0)
+            result['sha256'] = digest.hexdigest()
+            if result['sha256'] == previous_sha256:
+                # Same body as last time: only parsed if another input changed
+                result['body'] = body
+            else:
+                with body:
+                    chunks = _cancellable(_read_chunks(body), cancel)
+                    result['workouts'], _ = ICalParser.parse_ical_stream(chunks, event_cache)
+                event_cache.save()
+        else:
+            with response:
+                result['content'] = response.content
+            result['sha256'] = hashlib.sha256(result['content']).hexdigest()
+        return result
+
+
+def _fetch_strava_source(strava_token, athlete_key, cancel):
+    """Sync new Strava activities and convert the refresh window from the cache."""
+    with metrics.span('strava_fetch'):
+        store = StravaSync(strava_token, athlete_key).sync(cancel)
+        after = int((datetime.now() - timedelta(days=STRAVA_LOOKBACK_DAYS)).timestamp())
+        strava_activities = store.activities_since(after)
+        return {
+            'workouts': StravaAPI.parse_strava_activities(strava_activities),
+            'sha256': hashlib.sha256(json.dumps(strava_activities, sort_keys=True).encode()).hexdigest()
+        }
+
+
+def _timed_source_call(fetch, cancel):
+    """Run one source fetch, capturing its result or error and duration."""
+    start = time.perf_counter()
+    try:
+        return {'result': fetch(cancel), 'error': None, 'seconds': time.perf_counter() - start}
+    except Exception as e:
+        return {'result': None, 'error': e, 'seconds': time.perf_counter() - start}
+
+
+def run_source_fetches(fetchers, deadline=None):
+    """
+    Run source fetches concurrently under one deadline.
+    
+    `fetchers` maps a source name to fetch(cancel). Returns
+    {name: {'result', 'error', 'seconds', 'status'}}. Sources still running
+    at the deadline are cancelled (they stop at their next cancellation
+    check) and reported with status 'timeout'.
+    """
+    deadline = REFRESH_DEADLINE_SECONDS if deadline is None else deadline
+    cancel = threading.Event()
+    start = time.perf_counter()
+    # Each fetch runs in a copy of this context, so its spans reach the caller's Timings
+    futures = {
+        name: _source_executor.submit(contextvars.copy_context().run, _timed_source_call, fetch, cancel)
+        for name, fetch in fetchers.items()
+    }
+    wait(futures.values(), timeout=deadline)
+    cancel.set()
+    
+    outcomes = {}
+    for name, future in futures.items():
+        if future.done():
+            outcome = future.result()
+            outcome['status'] = 'error' if outcome['error'] else 'ok'
+        else:
+            future.cancel()
+            outcome = {
+                'result': None,
+                'error': RefreshCancelled(f'timed out after {deadline:g}s'),
+                'seconds': time.perf_counter() - start,
+                'status': 'timeout'
+            }
+        outcomes[name] = outcome
+    return outcomes
+
+
+def _empty_changes():
+    return {'timestamp': None, 'additions': [], 'modifications': [], 'deletions': [], 'movements': []}
+
+
+refresh_metrics = metrics.StageMetrics(METRICS_WINDOW)
+timings_log = logging.getLogger('tp-validator.timings')
+if TIMINGS_LOG and not timings_log.handlers:
+    _timings_handler = logging.StreamHandler()
+    _timings_handler.setFormatter(logging.Formatter('%(message)s'))
+    timings_log.addHandler(_timings_handler)
+    timings_log.setLevel(logging.INFO)
+    timings_log.propagate = False
+
+
+def log_refresh_timings(tp_url, enabled_sources, payload, status, timings):
+    """One JSON line per refresh with its stage breakdown."""
+    if not TIMINGS_LOG:
+        return
+    feed = os.path.splitext(os.path.basename(get_workouts_file(tp_url if tp_url else 'strava_default')))[0]
+    timings_log.info(json.dumps({
+        'event': 'refresh',
+        'time': datetime.now(UTC).isoformat(),
+        'feed': feed,
+        'sources': sorted(enabled_sources),
+        'status': status,
+        'success': bool(payload and payload.get('success')),
+        'noop': bool(payload and payload.get('noop')),
+        'stages': timings.as_dict()
+    }))
+
+
+def refresh_feed(tp_url, enabled_sources, strava_token=None, deadline=None, strava_athlete_id=None):
+    """
+    Run the fetch → parse → merge → update pipeline for one feed.
+    
+    TP and Strava are fetched concurrently. Returns (payload, http_status)
+    where payload is the /api/refresh response body. Stage timings (see
+    metrics.py) are logged, added to refresh_metrics and returned under
+    'timings'.
+    """
+    timings = metrics.Timings()
+    start = time.perf_counter()
+    payload, status = None, 500
+    try:
+        with timings.active():
+            payload, status = _refresh_feed(tp_url, enabled_sources, strava_token, deadline, strava_athlete_id)
+    finally:
+        timings.add('total', time.perf_counter() - start)
+        refresh_metrics.observe(timings)
+        log_refresh_timings(tp_url, enabled_sources, payload, status, timings)
+    payload['timings'] = timings.as_dict()
+    return payload, status
+
+
+def _refresh_feed(tp_url, enabled_sources, strava_token, deadline, strava_athlete_id):
+    tp_workouts = {}
+    strava_workouts = {}
+    error_messages = []
+    
+    workouts_file = get_workouts_file(tp_url if tp_url else 'strava_default')
+    feed_state_file = get_feed_state_file(workouts_file)
+    feed_state = load_feed_state(feed_state_file)
+    validators = {k: feed_state.get(k) for k in ('etag', 'last_modified')}
+    
+    event_cache = EventCache(get_event_cache_file(workouts_file))
+    
+    fetchers = {}
+    if 'tp' in enabled_sources and tp_url:
+        fetchers['tp'] = functools.partial(_fetch_tp_source, tp_url, validators, feed_state.get('sha256'), event_cache)
+    if 'strava' in enabled_sources:
+        if not strava_token:
+            error_messages.append('Strava: Access token required')
+        else:
+            athlete_key = strava_athlete_key(strava_token, strava_athlete_id)
+            fetchers['strava'] = functools.partial(_fetch_strava_source, strava_token, athlete_key)
+    
+    outcomes = run_source_fetches(fetchers, deadline)
+    source_timings = {
+        name: {'seconds': round(outcome['seconds'], 3), 'status': outcome['status']}
+        for name, outcome in outcomes.items()
+    }
+    
+    tp_result = None
+    tp_sha256 = None
+    if 'tp' in outcomes:
+        if outcomes['tp']['error']:
+            error_messages.insert(0, f"Training Peaks: {str(outcomes['tp']['error'])}")
+        else:
+            tp_result = outcomes['tp']['result']
+            validators = tp_result['validators']
+            tp_sha256 = tp_result['sha256']
+            tp_workouts = tp_result['workouts'] or {}
+    
+    strava_sha256 = None
+    if 'strava' in outcomes:
+        error = outcomes['strava']['error']
+        if isinstance(error, ValueError):
+            error_messages.append(str(error))
+        elif error:
+            error_messages.append(f'Strava: {str(error)}')
+        else:
+            strava_workouts = outcomes['strava']['result']['workouts']
+            strava_sha256 = outcomes['strava']['result']['sha256']
+    
+    # Skip parse/merge/diff/save when every input matches the last refresh.
+    # The date is part of the inputs because merging drops past planned workouts.
+    refresh_inputs = {
+        'sources': sorted(enabled_sources),
+        'date': datetime.now().date().isoformat(),
+        'tp_sha256': tp_sha256,
+        'strava_sha256': strava_sha256,
+    }
+    workout_manager = workout_managers.get(workouts_file)
+    if (not error_messages and (tp_sha256 or strava_sha256)
+            and refresh_inputs == feed_state.get('inputs')
+            and _json_signature(workout_manager.signature) == feed_state.get('store_signature')):
+        if tp_result is not None and tp_result['body'] is not None:
+            tp_result['body'].close()
+        if validators != {k: feed_state.get(k) for k in ('etag', 'last_modified')}:
+            save_feed_state(feed_state_file, {**feed_state, **validators})
+        view = workout_manager.view  # Swapped, never mutated: no lock needed
+        current_workouts = dict(view['workouts'])
+        last_updated = view['last_updated']
+        version = view['version']
+        return {
+            'success': True,
+            'noop': True,
+            'message': 'No changes: feed identical to the last refresh',
+            'changes': _empty_changes(),
+            # The whole diff was skipped; every current workout is unchanged
+            'update_stats': {'incoming': 0, 'unchanged': 0, 'diffed': 0, 'modified': 0,
+                             'skipped': len(current_workouts)},
+            'workouts': current_workouts,
+            'version': version,
+            'last_updated': last_updated,
+            'source_timings': source_timings,
+            'parse_cache': event_cache.stats()
+        }, 200
+    
+    if tp_result is not None and tp_result['workouts'] is None:
+        try:
+            if tp_result['body'] is not None:
+                # Streamed body whose hash matched, but another input changed
+                with tp_result['body'] as body:
+                    tp_workouts, _ = ICalParser.parse_ical_stream(_read_chunks(body), event_cache)
+            else:
+                ical_content = tp_result['content']
+                if ical_content is None:
+                    # 304, but other inputs changed - we still need the feed body
+                    with metrics.span('tp_fetch'):
+                        ical_content = ICalParser.fetch_ical(tp_url)
+                    tp_sha256 = hashlib.sha256(ical_content).hexdigest()
+                    refresh_inputs['tp_sha256'] = tp_sha256
+                tp_workouts, _ = ICalParser.parse_ical_stream([ical_content], event_cache)
+            event_cache.save()
+        except Exception as e:
+            error_messages.insert(0, f'Training Peaks: {str(e)}')
+    
+    # If all sources failed, return error
+    if error_messages and not tp_workouts and not strava_workouts:
+        return {
+            'success': False,
+            'error': ' | '.join(error_messages),
+            'source_timings': source_timings
+        }, 400
+    
+    # Merge workouts based on priority
+    with metrics.span('merge'):
+        merged_workouts = merge_workouts_by_source(tp_workouts, strava_workouts, enabled_sources)
+    
+    # Update workout manager (takes the feed's locks itself, only around the commit)
+    try:
+        with metrics.span('update_workouts'):
+            result = workout_manager.commit(merged_workouts)
+    except Exception:
+        # In-memory state may be half-updated; reload from disk next time
+        workout_managers.invalidate(workouts_file)
+        raise
+    changes = result.changes
+    current_workouts = dict(result.view['workouts'])
+    last_updated = result.view['last_updated']
+    version = result.view['version']
+    store_signature = _json_signature(result.signature)
+    update_stats = {**result.stats, 'skipped': 0}
+    
+    if not error_messages:
+        save_feed_state(feed_state_file, {
+            **validators,
+            'sha256': tp_sha256,
+            'inputs': refresh_inputs,
+            'store_signature': store_signature
+        })
+    
+    success_msg = f'Fetched {len(tp_workouts)} TP + {len(strava_workouts)} Strava workouts'
+    if error_messages:
+        success_msg += f' (Warnings: {", ".join(error_messages)})'
+    
+    return {
+        'success': True,
+        'noop': False,
+        'message': success_msg,
+        'changes': changes,
+        'update_stats': update_stats,
+        'workouts': current_workouts,
+        'version': version,
+        'last_updated': last_updated,
+        'source_timings': source_timings,
+        'parse_cache': event_cache.stats()
+    }, 200
+
+
+
+def _summarize_refresh(tp_url, payload, status, seconds):
+    """Per-feed batch result: counts instead of full workout lists."""
+    summary = {
+        'url': tp_url,
+        'success': payload.get('success', False),
+        'status': status,
+        'seconds': round(seconds, 3),
+        'source_timings': payload.get('source_timings', {})
+    }
+    if 'parse_cache' in payload:
+        summary['parse_cache'] = payload['parse_cache']
+    if summary['success']:
+        changes = payload['changes']
+        summary.update({
+            'noop': payload['noop'],
+            'message': payload['message'],
+            'workouts': len(payload['workouts']),
+            'additions': len(changes['additions']),
+            'modifications': len(changes['modifications']),
+            'deletions': len(changes['deletions']),
+            'movements': len(changes['movements']),
+            'unchanged': payload['update_stats']['unchanged'] + payload['update_stats']['skipped']
+        })
+    else:
+        summary['error'] = payload.get('error')
+    return summary
+
+
+def refresh_feeds(tp_urls, enabled_sources=('tp',), concurrency=None):
+    """
+    Refresh many feeds with at most `concurrency` running at once.
+    
+    Each feed goes through refresh_feed with its own WorkoutManager and
+    deadline; one failing feed does not affect the others. Returns
+    {'feeds': [SUMMARY, ...], 'seconds': ..., 'concurrency': ...} with
+    summaries in input order (duplicate URLs are refreshed once).
+    """
+    tp_urls = list(dict.fromkeys(url.strip() for url in tp_urls if url and url.strip()))
+    concurrency = max(1, min(concurrency or BATCH_REFRESH_CONCURRENCY, SOURCE_FETCH_WORKERS, len(tp_urls) or 1))
+    
+    def refresh_one(tp_url):
+        start = time.perf_counter()
+        try:
+            payload, status = feed_scheduler.refresh(tp_url, list(enabled_sources))
+        except Exception as e:
+            payload, status = {'success': False, 'error': f'Unexpected error: {str(e)}'}, 500
+        return _summarize_refresh(tp_url, payload, status, time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    # A dedicated pool: refresh_feed itself waits on _source_executor
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='tp-batch') as executor:
+        feeds = list(executor.map(refresh_one, tp_urls))
+    
+    return {
+        'feeds': feeds,
+        'seconds': round(time.perf_counter() - start, 3),
+        'concurrency': concurrency
+    }
+
+
+class FeedScheduler:
+    """
+    Keeps feeds fresh in the background and coalesces concurrent refreshes.
+    
+    Every refresh (manual, batch or scheduled) goes through `refresh()`,
+    which runs at most one refresh_feed per (feed, sources, token) at a time;
+    callers arriving while one is in flight wait for it and share its result.
+    Feeds refreshed with TP only are re-run every SCHEDULER_INTERVAL_SECONDS
+    (+/- SCHEDULER_JITTER) by the scheduler loop, which runs in one process
+    only (`python scheduler.py`, or `python app.py` with TP_SCHEDULER_ENABLED).
+    Feeds that include Strava need the user's session token and are only
+    refreshed on request. A feed leaves the schedule once nobody has
+    requested it for SCHEDULER_IDLE_SECONDS (unless seeded with `feeds`) or
+    after SCHEDULER_MAX_FAILURES failed runs in a row; the next request puts
+    it back.
+    
+    Last-run state is shared by all processes in data/scheduler_state.json:
+    {'feeds': {url: {'sources', 'last_run', 'last_success', 'last_error',
+                     'last_requested', 'failures', 'seconds', 'next_run'}}}
+    Each write reloads the file and merges into it under a file lock.
+    """
+    
+    def __init__(self, state_file, interval=SCHEDULER_INTERVAL_SECONDS, jitter=SCHEDULER_JITTER,
+                 idle_seconds=SCHEDULER_IDLE_SECONDS, max_failures=SCHEDULER_MAX_FAILURES):
+        self.state_file = state_file
+        self.interval = interval
+        self.jitter = jitter
+        self.idle_seconds = idle_seconds
+        self.max_failures = max_failures
+        self.lock = threading.Lock()  # In-memory state only, never held across disk I/O
+        self.file_lock = FeedLock(os.path.splitext(state_file)[0] + '.lock')
+        self.state = {'feeds': {}}
+        self._signature = None
+        self.pinned = set()  # Seeded feeds, exempt from idle expiry
+        self._inflight = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.coalesced = 0
+        self._sync()
+    
+    def refresh(self, tp_url, enabled_sources, strava_token=None, strava_athlete_id=None, scheduled=False):
+        """refresh_feed with single-flight coalescing. Returns (payload, status)."""
+        key = (tp_url, tuple(sorted(enabled_sources)), strava_token)
+        with self.lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        
+        started = time.time()
+        try:
+            result = refresh_feed(tp_url, enabled_sources, strava_token, strava_athlete_id=strava_athlete_id)
+        except BaseException as e:
+            # Answer the coalesced callers before any bookkeeping that could fail
+            future.set_exception(e)
+            self._record_safely(tp_url, enabled_sources, started, False, str(e), scheduled)
+            raise
+        finally:
+            with self.lock:
+                del self._inflight[key]
+        
+        future.set_result(result)
+        payload, _ = result
+        self._record_safely(tp_url, enabled_sources, started, bool(payload.get('success')),
+                            payload.get('error'), scheduled)
+        return result
+    
+    def _record_safely(self, *args):
+        """_record, logging failures: the refresh itself already succeeded or failed."""
+        try:
+            self._record(*args)
+        except Exception as e:
+            print(f"Could not record scheduler state for {args[0]}: {e}")
+    
+    def _next_run(self, now):
+        return now + self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+    
+    def _load(self):
+        """(state, signature) of the state file."""
+        signature = file_signature(self.state_file)
+        state = load_feed_state(self.state_file) or {}
+        state.setdefault('feeds', {})
+        return state, signature
+    
+    def _adopt(self, state, signature):
+        """Replace the in-memory state, keeping next runs this process already pushed out."""
+        with self.lock:
+            for tp_url, feed in state['feeds'].items():
+                next_run = self.state['feeds'].get(tp_url, {}).get('next_run')
+                if next_run is not None and next_run > (feed.get('next_run') or 0):
+                    feed['next_run'] = next_run
+            for tp_url in self.pinned:
+                state['feeds'].setdefault(tp_url, self.state['feeds'].get(tp_url, {'sources': ['tp']}))
+            self.state = state
+            self._signature = signature
+    
+    def _sync(self):
+        """Pick up state written by other processes (a stat unless the file changed)."""
+        signature = file_signature(self.state_file)
+        if signature is not None and signature != self._signature:
+            self._adopt(*self._load())
+    
+    def _expired(self, tp_url, feed, now):
+        if feed.get('failures', 0) >= self.max_failures:
+            return True
+        if tp_url in self.pinned:
+            return False
+        last_requested = feed.get('last_requested') or feed.get('last_run')
+        return last_requested is not None and now - last_requested > self.idle_seconds
+    
+    def _record(self, tp_url, enabled_sources, started, success, error, scheduled):
+        now = time.time()
+        # Merge into the file as other processes left it; self.lock is not held meanwhile
+        with self.file_lock:
+            state, _ = self._load()
+            feed = state['feeds'].setdefault(tp_url, {})
+            if (feed.get('last_run') or 0) <= started:
+                feed.update({
+                    'sources': sorted(enabled_sources),
+                    'last_run': started,
+                    'seconds': round(now - started, 3),
+                    'last_error': error,
+                    # A request (not a scheduled run) starts the count over
+                    'failures': 0 if success else (feed.get('failures', 0) if scheduled else 0) + 1,
+                    'next_run': self._next_run(now)
+                })
+            if success:
+                feed['last_success'] = max(feed.get('last_success') or 0, now)
+            if not scheduled:
+                feed['last_requested'] = max(feed.get('last_requested') or 0, started)
+            # Forget feeds nobody has asked for (or that only fail) for a long time
+            state['feeds'] = {
+                url: entry for url, entry in state['feeds'].items()
+                if url in self.pinned or now - (entry.get('last_requested') or entry.get('last_run') or now)
+                <= self.idle_seconds * 2
+            }
+            save_feed_state(self.state_file, state)
+            signature = file_signature(self.state_file)
+        self._adopt(state, signature)
+    
+    def stale_seconds(self, tp_url):
+        """Seconds since the feed last refreshed successfully in any process (None if never)."""
+        self._sync()
+        with self.lock:
+            last_success = self.state['feeds'].get(tp_url, {}).get('last_success')
+        if last_success is None:
+            return None
+        return round(time.time() - last_success, 1)
+    
+    def due_feeds(self, now):
+        """Scheduled TP-only feeds whose next run has passed; their next run is pushed out."""
+        due = []
+        with self.lock:
+            for tp_url, feed in self.state['feeds'].items():
+                if feed.get('sources', ['tp']) != ['tp'] or self._expired(tp_url, feed, now):
+                    continue
+                if feed.get('next_run') is None:
+                    # Spread feeds that have never run over the first interval
+                    feed['next_run'] = now + random.uniform(0, self.interval * self.jitter)
+                if feed['next_run'] <= now:
+                    feed['next_run'] = self._next_run(now)
+                    due.append(tp_url)
+        return due
+    
+    def seed(self, feeds):
+        """Schedule `feeds` (TP only) and keep them while idle."""
+        with self.lock:
+            for tp_url in feeds:
+                tp_url = tp_url.strip()
+                self.pinned.add(tp_url)
+                self.state['feeds'].setdefault(tp_url, {'sources': ['tp']})
+    
+    def start(self, feeds=()):
+        """Run the scheduler loop in a background thread (idempotent)."""
+        self.seed(feeds)
+        with self.lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.run, name='tp-scheduler', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def run(self, feeds=()):
+        """Run the scheduler loop in this thread until stop()."""
+        self.seed(feeds)
+        with ThreadPoolExecutor(max_workers=BATCH_REFRESH_CONCURRENCY, thread_name_prefix='tp-scheduled') as executor:
+            while not self._stop.is_set():
+                self._sync()  # Feeds refreshed by web workers join the schedule
+                now = time.time()
+                for tp_url in self.due_feeds(now):
+                    executor.submit(self._scheduled_refresh, tp_url)
+                with self.lock:
+                    upcoming = [feed['next_run'] for tp_url, feed in self.state['feeds'].items()
+                                if feed.get('next_run') and not self._expired(tp_url, feed, now)]
+                delay = min(upcoming) - time.time() if upcoming else self.interval
+                self._stop.wait(min(max(delay, 1.0), 60.0))
+    
+    def _scheduled_refresh(self, tp_url):
+        try:
+            self.refresh(tp_url, ['tp'], scheduled=True)
+        except Exception as e:
+            print(f"Scheduled refresh failed for {tp_url}: {e}")
+
+
+feed_scheduler = FeedScheduler(os.path.join(DATA_DIR, 'scheduler_state.json'))
+
 @app.route('/')
 def index():
     """Render the main page."""
@@ -1026,6 +3258,7 @@ def strava_callback():
         # Store tokens in session (in production, use secure storage)
         session['strava_access_token'] = access_token
         session['strava_refresh_token'] = refresh_token
+        session['strava_athlete_id'] = (token_response.get('athlete') or {}).get('id')
         
         # Debug: Print session info
         print(f"OAuth Success - Token stored: {access_token[:10]}...")
@@ -1045,6 +3278,7 @@ def strava_logout():
     # Clear Strava tokens from session
     session.pop('strava_access_token', None)
     session.pop('strava_refresh_token', None)
+    session.pop('strava_athlete_id', None)
     
     return redirect(url_for('index') + '?strava_disconnected=true')
 
@@ -1061,22 +3295,102 @@ def strava_status():
     
     return jsonify({
         'connected': 'strava_access_token' in session,
-        'token': session.get('strava_access_token', '') if 'strava_access_token' in session else None
+        'token': session.get('strava_access_token', '') if 'strava_access_token' in session else None,
+        'rate_limit': strava_rate_limiter.stats()
+    })
+
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Rolling per-stage refresh timings (seconds) and cache counters."""
+    return jsonify({
+        'refresh': {
+            'window': refresh_metrics.window,
+            'requests': refresh_metrics.requests,
+            'stages': refresh_metrics.summary()
+        },
+        'caches': {
+            'descriptions': description_cache.stats(),
+            'workout_managers': workout_managers.stats()
+        },
+        'coalesced_refreshes': feed_scheduler.coalesced
+    })
+
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    """Counters of the process-wide caches."""
+    return jsonify({
+        'descriptions': description_cache.stats(),
+        'workout_managers': workout_managers.stats()
     })
 
 
 @app.route('/api/workouts', methods=['GET'])
 def get_workouts():
-    """Get all current workouts and metadata."""
+    """
+    Get all current workouts and metadata.
+    
+    With ?since=VERSION (the `version` of an earlier response), returns only
+    workouts added/modified since then plus the uids removed, or 304 if
+    nothing changed. A `since` newer than the store (reset or restored from
+    a backup) gets the full listing, so the client starts over.
+    ?from=&to= (YYYY-MM-DD, inclusive), ?sport= (run, ride, swim, other),
+    ?source= (tp, strava) and ?status= (planned, completed) restrict the
+    workouts returned.
+    """
     url = request.args.get('url', DEFAULT_ICAL_URL)
+    since = request.args.get('since', type=int)
+    from_date = request.args.get('from')
+    to_date = request.args.get('to')
+    filters = {name: request.args.get(name, '').lower() for name in WorkoutQueryIndex.FILTERS}
+    filtered = bool(from_date or to_date or any(filters.values()))
     workouts_file = get_workouts_file(url)
-    workout_manager = WorkoutManager(workouts_file)
+    workout_manager = workout_managers.get(workouts_file)
     
-    return jsonify({
-        'workouts': workout_manager.get_current_workouts(),
-        'last_updated': workout_manager.data['last_updated'],
-        'change_log': workout_manager.data['change_log'][-10:]  # Last 10 changes
-    })
+    # Updates swap in a new view instead of mutating this one, so the plain
+    # listing reads a consistent snapshot without waiting for a refresh
+    view = workout_manager.view
+    version = view['version']
+    if since == version:
+        return '', 304
+    if since is not None and since > version:
+        since = None  # Store was reset or restored: the client has to start over
+    if since:
+        with workout_manager.lock:
+            changed, removed = workout_manager.changes_since(since)
+            if filtered:
+                index = workout_manager.query_index()
+                changed = {
+                    uid: workout for uid, workout in changed.items()
+                    if index.matches(uid, filters) and
+                    (not from_date or index.dates[uid] >= from_date) and
+                    (not to_date or index.dates[uid] <= to_date)
+                }
+            view = workout_manager.view
+            version = view['version']
+        payload = {
+            'workouts': changed,
+            'removed': removed,
+            'delta': True,
+            'last_updated': view['last_updated']
+        }
+    else:
+        if filtered:
+            with workout_manager.lock:
+                workouts = workout_manager.query_index().query(from_date, to_date, **filters)
+                view = workout_manager.view
+                version = view['version']
+        else:
+            workouts = dict(view['workouts'])
+        payload = {
+            'workouts': workouts,
+            'last_updated': view['last_updated'],
+            'change_log': view['recent_changes']  # Last 10 changes
+        }
+    payload['version'] = version
+    payload['stale_seconds'] = feed_scheduler.stale_seconds(url)
+    return jsonify(payload)
 
 
 @app.route('/api/refresh', methods=['POST'])
@@ -1096,57 +3410,26 @@ def refresh_workouts():
         if not strava_token and 'strava' in enabled_sources:
             enabled_sources = [s for s in enabled_sources if s != 'strava']
         
-        tp_workouts = {}
-        strava_workouts = {}
-        error_messages = []
-        
-        # Fetch from Training Peaks if enabled
-        if 'tp' in enabled_sources and tp_url:
-            try:
-                ical_content = ICalParser.fetch_ical(tp_url)
-                tp_workouts = ICalParser.parse_ical(ical_content)
-            except Exception as e:
-                error_messages.append(f'Training Peaks: {str(e)}')
-        
-        # Fetch from Strava if enabled
-        if 'strava' in enabled_sources:
-            if not strava_token:
-                error_messages.append('Strava: Access token required')
-            else:
-                try:
-                    strava_activities = StravaAPI.fetch_activities(strava_token)
-                    strava_workouts = StravaAPI.parse_strava_activities(strava_activities)
-                except ValueError as e:
-                    error_messages.append(str(e))
-                except Exception as e:
-                    error_messages.append(f'Strava: {str(e)}')
-        
-        # If all sources failed, return error
-        if error_messages and not tp_workouts and not strava_workouts:
-            return jsonify({
-                'success': False,
-                'error': ' | '.join(error_messages)
-            }), 400
-        
-        # Merge workouts based on priority
-        merged_workouts = merge_workouts_by_source(tp_workouts, strava_workouts, enabled_sources)
-        
-        # Update workout manager
-        workouts_file = get_workouts_file(tp_url if tp_url else 'strava_default')
-        workout_manager = WorkoutManager(workouts_file)
-        changes = workout_manager.update_workouts(merged_workouts)
+        payload, status = feed_scheduler.refresh(tp_url, enabled_sources, strava_token,
+                                                 strava_athlete_id=session.get('strava_athlete_id'))
         
-        success_msg = f'Fetched {len(tp_workouts)} TP + {len(strava_workouts)} Strava workouts'
-        if error_messages:
-            success_msg += f' (Warnings: {", ".join(error_messages)})'
+        # Clients that pass their last version only get what changed since
+        since = data.get('since')
+        if payload.get('success') and isinstance(since, int) and since > 0:
+            workout_manager = workout_managers.get(get_workouts_file(tp_url if tp_url else 'strava_default'))
+            with workout_manager.lock:
+                version = workout_manager.view['version']
+                # A version from before a reset or restore: send the full listing
+                delta = workout_manager.changes_since(since) if since <= version else None
+            if delta is not None:
+                changed, removed = delta
+                # The payload may be shared with coalesced callers - copy it
+                payload = {**payload, 'workouts': changed, 'removed': removed, 'delta': True, 'version': version}
         
-        return jsonify({
-            'success': True,
-            'message': success_msg,
-            'changes': changes,
-            'workouts': workout_manager.get_current_workouts(),
-            'last_updated': workout_manager.data['last_updated']
-        })
+        # Stage timings only on request ({"timings": true} or ?timings=1)
+        if not (data.get('timings') or request.args.get('timings')):
+            payload = {key: value for key, value in payload.items() if key != 'timings'}
+        return jsonify(payload), status
     
     except Exception as e:
         return jsonify({
@@ -1155,31 +3438,128 @@ def refresh_workouts():
         }), 500
 
 
+@app.route('/api/refresh/batch', methods=['POST'])
+def refresh_workouts_batch():
+    """Refresh several Training Peaks feeds (e.g. a coach's athletes) at once."""
+    data = request.get_json() or {}
+    tp_urls = data.get('urls')
+    if not isinstance(tp_urls, list) or not tp_urls:
+        return jsonify({'success': False, 'error': "Expected 'urls' as a non-empty list"}), 400
+    
+    # Batch refreshes have no per-athlete Strava session, so TP only
+    result = refresh_feeds(tp_urls, concurrency=data.get('concurrency'))
+    return jsonify({'success': True, **result})
+
+
+@app.route('/api/strava/backfill', methods=['POST'])
+def strava_backfill():
+    """Backfill the Strava activity cache for a date range (YYYY-MM-DD)."""
+    from flask import session
+    
+    strava_token = session.get('strava_access_token')
+    if not strava_token:
+        return jsonify({'success': False, 'error': 'Strava is not connected'}), 401
+    
+    data = request.get_json() or {}
+    try:
+        after = int(datetime.strptime(data['from'], '%Y-%m-%d').timestamp())
+        before = int(datetime.strptime(data['to'], '%Y-%m-%d').timestamp()) if data.get('to') else None
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': "Expected 'from' (and optional 'to') as YYYY-MM-DD"}), 400
+    
+    athlete_key = strava_athlete_key(strava_token, session.get('strava_athlete_id'))
+    try:
+        started = time.perf_counter()
+        fetched = StravaSync(strava_token, athlete_key).backfill(after, before, data.get('concurrency'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    return jsonify({
+        'success': True,
+        'fetched': fetched,
+        'seconds': round(time.perf_counter() - started, 3)
+    })
+
+
 @app.route('/api/history', methods=['GET'])
 def get_full_history():
-    """Get complete change history."""
+    """
+    Get change history.
+    
+    Without parameters, returns the hot change log (oldest first). With
+    ?from=YYYY-MM-DD / ?to=YYYY-MM-DD, returns that date range including
+    archived entries. Any of ?limit, ?cursor, ?type (comma separated:
+    additions, modifications, deletions, movements) or ?uid switches to
+    newest-first pages: pass the returned next_cursor as ?cursor for the
+    next (older) page.
+    """
     url = request.args.get('url', DEFAULT_ICAL_URL)
+    from_date = request.args.get('from')
+    to_date = request.args.get('to')
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor', type=int)
+    types = [t for t in request.args.get('type', '').split(',') if t]
+    uid = request.args.get('uid')
+    paginated = limit is not None or cursor is not None or types or uid is not None
+    if any(t not in ChangeLogIndex.TYPES for t in types):
+        return jsonify({'error': f'type must be one of {", ".join(ChangeLogIndex.TYPES)}'}), 400
+    
     workouts_file = get_workouts_file(url)
-    workout_manager = WorkoutManager(workouts_file)
+    workout_manager = workout_managers.get(workouts_file)
     
-    return jsonify({
-        'change_log': workout_manager.data['change_log']
-    })
+    next_cursor = None
+    with workout_manager.lock:
+        data = workout_manager.data
+        if paginated or from_date or to_date:
+            pairs, next_cursor = workout_manager.history_index().query(
+                before=cursor,
+                limit=max(1, min(limit or HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)) if paginated else None,
+                types=types, uid=uid, from_date=from_date, to_date=to_date
+            )
+            if not paginated:
+                pairs.reverse()  # Date range only: oldest first, like the full log
+        else:
+            offset = data.get('change_log_offset', 0)
+            pairs = list(enumerate(data['change_log'], start=offset + 1))
+        change_log = inflate_change_log([entry for _, entry in pairs], data['workouts'])
+        for (seq, _), entry in zip(pairs, change_log):
+            entry['seq'] = seq
+        archived_entries = data.get('change_log_offset', 0)
+    
+    payload = {'change_log': change_log, 'archived_entries': archived_entries}
+    if paginated:
+        payload['next_cursor'] = next_cursor
+    return jsonify(payload)
 
 
 @app.route('/api/workout/<uid>', methods=['GET'])
 def get_workout_history(uid):
-    """Get full history for a specific workout."""
+    """Get full history for a specific workout (or one version with ?version=N)."""
     url = request.args.get('url', DEFAULT_ICAL_URL)
+    version = request.args.get('version', type=int)
     workouts_file = get_workouts_file(url)
-    workout_manager = WorkoutManager(workouts_file)
+    workout_manager = workout_managers.get(workouts_file)
     
-    workout_info = workout_manager.data['workouts'].get(uid)
+    with workout_manager.lock:
+        workout_info = workout_manager.data['workouts'].get(uid)
+        if workout_info:
+            history = workout_info.get('history', [])
+            if version is not None:
+                if not 0 <= version < len(history):
+                    return jsonify({'error': 'Version not found'}), 404
+                return jsonify({'uid': uid, 'version': version,
+                                'timestamp': history[version].get('timestamp'),
+                                'data': workout_version(history, version)})
+            workout_info = {**workout_info, 'history': inflate_history(history)}
     if workout_info:
         return jsonify(workout_info)
     return jsonify({'error': 'Workout not found'}), 404
 
 
 if __name__ == '__main__':
+    # Development server only: under gunicorn etc. run `python scheduler.py` once alongside.
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if SCHEDULER_ENABLED and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        feed_scheduler.start(SCHEDULER_FEEDS)
     app.run(debug=True, host='127.0.0.1', port=5001)
 
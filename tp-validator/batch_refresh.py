@@ -0,0 +1,71 @@
+"""Refresh many Training Peaks iCal feeds from the command line.
+
+Usage:
+    python batch_refresh.py URL [URL ...]
+    python batch_refresh.py --file feeds.txt --concurrency 16
+
+The feeds file is either plain text (one URL per line, `#` comments) or JSON
+(a list of URLs, or {"urls": [...]}).
+
+Exits with status 1 if any feed failed.
+"""
+import sys
+import json
+import argparse
+
+from app import refresh_feeds, BATCH_REFRESH_CONCURRENCY
+
+
+def read_feed_file(path):
+    """Read feed URLs from a text or JSON file."""
+    with open(path, 'r') as f:
+        content = f.read()
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        return [
+            line.strip() for line in content.splitlines()
+            if line.strip() and not line.strip().startswith('#')
+        ]
+    return data.get('urls', []) if isinstance(data, dict) else data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Refresh many Training Peaks feeds.')
+    parser.add_argument('urls', nargs='*', help='Training Peaks iCal URLs')
+    parser.add_argument('--file', help='Text or JSON file with feed URLs')
+    parser.add_argument('--concurrency', type=int, default=BATCH_REFRESH_CONCURRENCY,
+                        help=f'Feeds refreshed at once (default {BATCH_REFRESH_CONCURRENCY})')
+    parser.add_argument('--json', action='store_true', help='Print the raw result as JSON')
+    args = parser.parse_args(argv)
+
+    urls = list(args.urls)
+    if args.file:
+        urls.extend(read_feed_file(args.file))
+    if not urls:
+        parser.error('no feed URLs given')
+
+    result = refresh_feeds(urls, concurrency=args.concurrency)
+    failed = sum(1 for feed in result['feeds'] if not feed['success'])
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 1 if failed else 0
+
+    for feed in result['feeds']:
+        if feed['success']:
+            state = 'unchanged' if feed['noop'] else (
+                f"+{feed['additions']} ~{feed['modifications']} "
+                f"-{feed['deletions']} ↔{feed['movements']}"
+            )
+            print(f"✅ {feed['url']}: {feed['workouts']} workouts, {state} ({feed['seconds']}s)")
+        else:
+            print(f"❌ {feed['url']}: {feed['error']} ({feed['seconds']}s)")
+
+    print(f"{len(result['feeds'])} feeds in {result['seconds']}s "
+          f"(concurrency {result['concurrency']}, {failed} failed)")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
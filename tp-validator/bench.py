@@ -0,0 +1,818 @@
+"""
+Micro-benchmarks for the tp-validator refresh pipeline.
+
+Usage:
+    python bench.py merge [--tp 10000] [--strava 10000] [--legacy]
+    python bench.py description [--repeat 500]
+    python bench.py ical [--events 5000]
+    python bench.py events [--events 5000] [--changed 0.05]
+    python bench.py update [--workouts 10000]
+    python bench.py records [--workouts 10000]
+    python bench.py table [--workouts 10000]
+    python bench.py times [--workouts 10000]
+
+Each benchmark also checks that the optimized code path produces exactly the
+same output as the reference implementation it replaced.
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+from icalendar import Calendar
+
+import app
+import timeutil
+from records import WorkoutRecord, json_default
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+# ---------------------------------------------------------------------------
+# merge_workouts_by_source
+# ---------------------------------------------------------------------------
+
+def legacy_find_matching_tp_workout(strava_workout, tp_workouts, matched_tp_uids):
+    """Reference linear-scan matcher (the pre-index implementation)."""
+    workout_date = strava_workout['start_date']
+    workout_start_time = strava_workout.get('start_time')
+    workout_type = strava_workout.get('activity_type', '').lower()
+    workout_summary = strava_workout.get('summary', '').lower()
+
+    for tp_uid, tp_workout in tp_workouts.items():
+        if tp_uid in matched_tp_uids:
+            continue
+        tp_date = tp_workout.get('start_date') or tp_workout.get('start_time', '').split('T')[0]
+        tp_start_time = tp_workout.get('start_time')
+        tp_summary = tp_workout.get('summary', '').lower()
+        if tp_date != workout_date:
+            continue
+        if not app._activities_match(workout_type, workout_summary, tp_summary):
+            continue
+        try:
+            is_past = datetime.fromisoformat(workout_date).date() < datetime.now().date()
+        except Exception:
+            is_past = False
+        if is_past:
+            return tp_uid
+        if workout_start_time and tp_start_time:
+            try:
+                strava_dt = datetime.fromisoformat(workout_start_time.replace('Z', '+00:00'))
+                tp_dt = datetime.fromisoformat(tp_start_time.replace('Z', '+00:00'))
+                if abs((strava_dt - tp_dt).total_seconds()) <= 3600:
+                    return tp_uid
+            except Exception:
+                pass
+    return None
+
+
+def legacy_merge_workouts_by_source(tp_workouts, strava_workouts, enabled_sources):
+    """Reference merge using the linear-scan matcher."""
+    merged = {}
+    matched_tp_uids = set()
+    if 'strava' in enabled_sources:
+        for uid, workout in strava_workouts.items():
+            matched_tp_uid = None
+            if 'tp' in enabled_sources:
+                matched_tp_uid = legacy_find_matching_tp_workout(workout, tp_workouts, matched_tp_uids)
+                if matched_tp_uid:
+                    matched_tp_uids.add(matched_tp_uid)
+            if matched_tp_uid:
+                workout['replaced_tp_uid'] = matched_tp_uid
+            merged[uid] = workout
+    if 'tp' in enabled_sources:
+        for tp_uid, tp_workout in tp_workouts.items():
+            if tp_uid not in matched_tp_uids:
+                if app._is_past_planned_workout(tp_workout):
+                    continue
+                tp_workout['source'] = 'training_peaks'
+                merged[tp_uid] = tp_workout
+    return merged
+
+
+TP_SUMMARIES = ['Easy Run', 'Long Run', 'Tempo Run', 'Bike Intervals', 'Endurance Ride',
+                'Swim Drills', 'Open Water Swim', 'Strength', 'Yoga', 'Walk', 'Brick: Bike + Run']
+STRAVA_TYPES = [('Run', 'Morning Run'), ('TrailRun', 'Trail Run'), ('Ride', 'Lunch Ride'),
+                ('VirtualRide', 'Zwift - Watopia'), ('Swim', 'Pool Swim'),
+                ('WeightTraining', 'Gym'), ('Walk', 'Evening Walk'), ('Yoga', 'Yoga')]
+
+
+def make_merge_inputs(tp_count, strava_count, days=365, seed=42):
+    """Synthetic TP/Strava workouts spread over `days` around today."""
+    rng = random.Random(seed)
+    base = datetime.now(app.tz.UTC).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days // 2)
+
+    tp_workouts = {}
+    for i in range(tp_count):
+        start = base + timedelta(days=rng.randrange(days), minutes=rng.randrange(5 * 60, 20 * 60, 15))
+        all_day = rng.random() < 0.3
+        uid = f'tp_{i}'
+        tp_workouts[uid] = {
+            'uid': uid,
+            'summary': rng.choice(TP_SUMMARIES),
+            'start_time': start.date().isoformat() if all_day else start.isoformat(),
+            'start_date': start.date().isoformat(),
+            'parsed_execution_status': rng.choice(['planned', 'planned', 'completed', None]),
+        }
+
+    strava_workouts = {}
+    for i in range(strava_count):
+        start = base + timedelta(days=rng.randrange(days), minutes=rng.randrange(5 * 60, 20 * 60, 5))
+        sport, name = rng.choice(STRAVA_TYPES)
+        uid = f'strava_{i}'
+        strava_workouts[uid] = {
+            'uid': uid,
+            'summary': name,
+            'start_time': start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'start_date': start.date().isoformat(),
+            'activity_type': sport,
+            'source': 'strava',
+        }
+    return tp_workouts, strava_workouts
+
+
+def _copy_inputs(tp_workouts, strava_workouts):
+    return ({k: dict(v) for k, v in tp_workouts.items()},
+            {k: dict(v) for k, v in strava_workouts.items()})
+
+
+def bench_merge(args):
+    sources = ['tp', 'strava']
+
+    # Equivalence on several small random inputs (the legacy path is O(S x T))
+    for seed in range(5):
+        tp, strava = make_merge_inputs(600, 600, days=30, seed=seed)
+        expected = legacy_merge_workouts_by_source(*_copy_inputs(tp, strava), sources)
+        actual = app.merge_workouts_by_source(*_copy_inputs(tp, strava), sources)
+        if expected != actual or list(expected) != list(actual):
+            print(f'❌ merge output differs from reference (seed {seed})')
+            return 1
+    print('✅ merge output matches the linear-scan reference')
+
+    tp, strava = make_merge_inputs(args.tp, args.strava)
+    merged, elapsed = _timed(app.merge_workouts_by_source, *_copy_inputs(tp, strava), sources)
+    matched = sum(1 for w in merged.values() if 'replaced_tp_uid' in w)
+    print(f'indexed merge  {args.tp} TP x {args.strava} Strava: {elapsed * 1000:8.1f} ms '
+          f'({matched} matched)')
+
+    if args.legacy:
+        expected, legacy_elapsed = _timed(legacy_merge_workouts_by_source, *_copy_inputs(tp, strava), sources)
+        print(f'linear merge   {args.tp} TP x {args.strava} Strava: {legacy_elapsed * 1000:8.1f} ms '
+              f'(x{legacy_elapsed / elapsed:.0f})')
+        if expected != merged:
+            print('❌ merge output differs from reference')
+            return 1
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# ICalParser.parse_description
+# ---------------------------------------------------------------------------
+
+def legacy_parse_description(description):
+    """Reference per-pattern implementation (pre single-pass scanner)."""
+    if not description:
+        return {}
+
+    details = {}
+
+    try:
+        # Parse duration - PRIORITY ORDER:
+        # 1. Moving Time (most accurate - actual workout time)
+        # 2. Elapsed Time
+        # 3. Labeled durations (Duration:, Est. Time:, etc.)
+        # 4. Planned durations for planned workouts
+        # 5. Standalone time patterns
+
+        # Priority 1: Moving Time
+        moving_time_match = re.search(r'moving\s+time[:\s]*(\d+:\d+(?::\d+)?)', description, re.IGNORECASE)
+        if moving_time_match:
+            duration_str = moving_time_match.group(1)
+            details['duration'] = duration_str
+            details['duration_formatted'] = app.ICalParser.format_duration_string(duration_str)
+            details['duration_type'] = 'moving_time'
+        # Priority 2: Elapsed Time
+        elif re.search(r'elapsed\s+time[:\s]*(\d+:\d+(?::\d+)?)', description, re.IGNORECASE):
+            elapsed_match = re.search(r'elapsed\s+time[:\s]*(\d+:\d+(?::\d+)?)', description, re.IGNORECASE)
+            duration_str = elapsed_match.group(1)
+            details['duration'] = duration_str
+            details['duration_formatted'] = app.ICalParser.format_duration_string(duration_str)
+            details['duration_type'] = 'elapsed_time'
+        # Priority 3: Labeled durations
+        elif re.search(r'(?:duration|planned duration|est\.? time|estimated time)[:\s]+(\d+:[\d:]+)', description, re.IGNORECASE):
+            duration_labeled = re.search(r'(?:duration|planned duration|est\.? time|estimated time)[:\s]+(\d+:[\d:]+)', description, re.IGNORECASE)
+            duration_str = duration_labeled.group(1).strip()
+            details['duration'] = duration_str
+            details['duration_formatted'] = app.ICalParser.format_duration_string(duration_str)
+        # Priority 4: Planned durations for planned workouts (when no actual duration exists)
+        else:
+            # Look for planned duration patterns
+            planned_duration_match = re.search(r'(?:planned|target|goal)\s+(?:time|duration)[:\s]*(\d+:\d+(?::\d+)?)', description, re.IGNORECASE)
+            if planned_duration_match:
+                duration_str = planned_duration_match.group(1)
+                details['planned_duration'] = duration_str
+                details['planned_duration_formatted'] = app.ICalParser.format_duration_string(duration_str)
+                details['duration_type'] = 'planned'
+            else:
+                # Look for simple time patterns that might be planned durations
+                # Only if it looks like a reasonable workout duration (not pace)
+                time_patterns = re.findall(r'\b(\d{1,2}:\d{2}(?::\d{2})?)\b', description)
+                for time_pattern in time_patterns:
+                    # Check if it's likely a duration (not pace, splits, etc.)
+                    if not re.search(r'(?:pace|per|/|split)', description, re.IGNORECASE):
+                        # Only use if it's in a reasonable range (5 minutes to 8 hours)
+                        parts = time_pattern.split(':')
+                        if len(parts) == 2:  # MM:SS or HH:MM
+                            minutes = int(parts[0])
+                            if 5 <= minutes <= 480:  # 5 minutes to 8 hours
+                                details['planned_duration'] = time_pattern
+                                details['planned_duration_formatted'] = app.ICalParser.format_duration_string(time_pattern)
+                                details['duration_type'] = 'planned'
+                                break
+                        elif len(parts) == 3:  # HH:MM:SS
+                            hours = int(parts[0])
+                            if hours <= 8:  # Up to 8 hours
+                                details['planned_duration'] = time_pattern
+                                details['planned_duration_formatted'] = app.ICalParser.format_duration_string(time_pattern)
+                                details['duration_type'] = 'planned'
+                                break
+
+        # Parse distance (e.g., "10 km", "5.2 miles", "3000m")
+        distance_match = re.search(r'(\d+\.?\d*)\s*(km|mi|miles?|meters?|m)\b', description, re.IGNORECASE)
+        if distance_match:
+            details['distance'] = f"{distance_match.group(1)} {distance_match.group(2)}"
+
+        # Removed intensity/zone parsing - too unreliable
+
+        # Parse TSS (Training Stress Score)
+        tss_match = re.search(r'tss[:\s]*(\d+)', description, re.IGNORECASE)
+        if tss_match:
+            details['tss'] = tss_match.group(1)
+
+        # Parse pace (e.g., "8:30/mile", "5:00/km")
+        pace_match = re.search(r'(\d+:\d+)\s*/\s*(mile|km|mi)', description, re.IGNORECASE)
+        if pace_match:
+            details['pace'] = f"{pace_match.group(1)}/{pace_match.group(2)}"
+
+        # Parse power (e.g., "200W", "FTP", "95% FTP")
+        power_match = re.search(r'(\d+)\s*w\b|(\d+)%?\s*ftp', description, re.IGNORECASE)
+        if power_match:
+            details['power'] = power_match.group(0)
+
+        # Parse heart rate (e.g., "145 bpm", "HR 150")
+        hr_match = re.search(r'(\d+)\s*bpm|hr[:\s]*(\d+)', description, re.IGNORECASE)
+        if hr_match:
+            details['heart_rate'] = hr_match.group(0)
+
+        # Parse execution status
+        # Look for indicators that workout was completed vs planned
+        completed_indicators = [
+            r'\bcompleted\b',
+            r'\bfinished\b',
+            r'\bdone\b',
+            r'\bactual\b',
+            r'moving time',
+            r'elapsed time'
+        ]
+
+        planned_indicators = [
+            r'\bplanned\b',
+            r'\bscheduled\b',
+            r'\bestimated\b',
+            r'\best\.',
+            r'\bgoal\b',
+            r'\btarget\b'
+        ]
+
+        is_completed = any(re.search(pattern, description, re.IGNORECASE) for pattern in completed_indicators)
+        is_planned = any(re.search(pattern, description, re.IGNORECASE) for pattern in planned_indicators)
+
+        if is_completed:
+            details['execution_status'] = 'completed'
+        elif is_planned:
+            details['execution_status'] = 'planned'
+
+    except Exception as e:
+        print(f"Error parsing description: {e}")
+
+    return details
+
+
+# Representative TrainingPeaks DESCRIPTION texts (planned and completed)
+DESCRIPTION_CORPUS = [
+    "45 minutes easy pace, Zone 2 heart rate. Focus on form and breathing.",
+    "Warm up 15 min, then 5x3min @ FTP with 2min recovery, cool down 15min",
+    "Planned Duration: 1:15:00\nPlanned Distance: 12 km\nTSS: 68\n\nWU 15' Z1-Z2, 4x8' @ 95% FTP / 4' easy, CD 10'",
+    "Moving Time: 1:02:33\nElapsed Time: 1:05:10\nDistance: 10.02 km\nAvg HR: 148 bpm\nTSS: 72\nCompleted",
+    "Elapsed Time: 0:48:12\nDistance: 1500 m\nPace 1:52/100m\nActual TSS 41",
+    "Est. Time: 2:30:00 endurance ride, keep power under 210W, HR 135-145",
+    "Goal time 45:00 for the 10K, target pace 4:30/km",
+    "Long run 1:45 easy, last 20 min at marathon effort",
+    "Swim 3000m: 400 WU, 8x100 @ CSS, 4x200 pull, 200 CD",
+    "Rest day. Mobility and stretching. Done.",
+    "Scheduled: Brick - Bike 1:30 Z2 then Run 20 min off the bike at 5:15/km",
+    "Estimated time 1:10. Target TSS 60. 3 x 10 min @ 90-95% FTP, 5 min recovery.",
+    "Intervals 6x800m with 400m jog. Split goal 3:10 per 800.",
+    "Recovery spin 40:00 cadence 90+",
+    "Duration: 0:55:00\nIF: 0.72\nTSS: 48\nNotes: legs felt heavy, finished strong",
+    "Coach notes: this is an easy aerobic run, keep it conversational. 8 miles.",
+    "",
+    "Strength session (no cardio)",
+    "Hill repeats: 8 x 60s hard, jog down recovery. Total 1:10:00 incl WU/CD",
+    "Threshold ride 2:00:00 with 3x20' @ 250 w",
+]
+
+
+def bench_description(args):
+    rng = random.Random(7)
+    tokens = ' '.join(DESCRIPTION_CORPUS).replace('\n', ' ').split()
+    fuzz = [' '.join(rng.choice(tokens) for _ in range(rng.randrange(1, 40))) for _ in range(2000)]
+    for text in DESCRIPTION_CORPUS + fuzz:
+        expected = legacy_parse_description(text)
+        actual = app.ICalParser.parse_description_uncached(text)
+        cached = app.ICalParser.parse_description(text)
+        if expected != actual or list(expected) != list(actual) or cached != actual:
+            print(f'❌ parse_description differs for {text!r}:\n  {expected}\n  {actual}')
+            return 1
+    print(f'✅ parse_description matches the reference on {len(DESCRIPTION_CORPUS) + len(fuzz)} texts')
+
+    corpus = DESCRIPTION_CORPUS * args.repeat
+    app.description_cache.clear()
+    for label, fn in [('per-pattern', legacy_parse_description),
+                      ('single-pass', app.ICalParser.parse_description_uncached),
+                      ('memoized', app.ICalParser.parse_description)]:
+        _, elapsed = _timed(lambda: [fn(text) for text in corpus])
+        print(f'{label:12s} {len(corpus)} descriptions: {elapsed * 1000:8.1f} ms '
+              f'({elapsed / len(corpus) * 1e6:.1f} µs each)')
+    print(f'description cache: {app.description_cache.stats()}')
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# ICalParser.parse_ical vs parse_ical_stream
+# ---------------------------------------------------------------------------
+
+def _fold(line):
+    """Fold a content line at 75 octets like real feeds do."""
+    parts = [line[:75]]
+    line = line[75:]
+    while line:
+        parts.append(' ' + line[:74])
+        line = line[74:]
+    return '\r\n'.join(parts)
+
+
+def make_ical_feed(events, seed=3):
+    """Synthetic TrainingPeaks-style feed with `events` VEVENTs."""
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1, 6, 0)
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//TrainingPeaks//EN']
+    for i in range(events):
+        start = base + timedelta(days=i // 3, hours=rng.randrange(0, 12))
+        description = rng.choice(DESCRIPTION_CORPUS).replace('\n', '\\n').replace(',', '\\,')
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:{i:08d}-tp-{rng.randrange(10**9)}',
+            f'DTSTAMP:{base:%Y%m%dT%H%M%SZ}',
+            f'DTSTART:{start:%Y%m%dT%H%M%SZ}',
+            f'DTEND:{start + timedelta(minutes=rng.randrange(30, 180)):%Y%m%dT%H%M%SZ}',
+            f'SUMMARY:{rng.choice(TP_SUMMARIES)}',
+            _fold(f'DESCRIPTION:{description}'),
+            f'SEQUENCE:{rng.randrange(3)}',
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return ('\r\n'.join(lines) + '\r\n').encode()
+
+
+def make_tzid_feed():
+    """Small feed with feed-defined TZIDs, one VTIMEZONE before its events and one after."""
+    plus3 = ['BEGIN:VTIMEZONE', 'TZID:Bench/Plus3', 'BEGIN:STANDARD', 'DTSTART:19700101T000000',
+             'TZOFFSETFROM:+0300', 'TZOFFSETTO:+0300', 'TZNAME:P3', 'END:STANDARD', 'END:VTIMEZONE']
+    dst = ['BEGIN:VTIMEZONE', 'TZID:Bench/Minus5 DST',
+           'BEGIN:STANDARD', 'DTSTART:19701101T020000', 'RRULE:FREQ=YEARLY;BYMONTH=11;BYDAY=1SU',
+           'TZOFFSETFROM:-0400', 'TZOFFSETTO:-0500', 'TZNAME:B5S', 'END:STANDARD',
+           'BEGIN:DAYLIGHT', 'DTSTART:19700308T020000', 'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU',
+           'TZOFFSETFROM:-0500', 'TZOFFSETTO:-0400', 'TZNAME:B5D', 'END:DAYLIGHT', 'END:VTIMEZONE']
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//TrainingPeaks//EN'] + plus3
+    for i, (tzid, start) in enumerate([('Bench/Plus3', '20250110T063000'), ('"Bench/Minus5 DST"', '20250110T063000'),
+                                       ('"Bench/Minus5 DST"', '20250710T180000'), ('Bench/Plus3', '20250711T070000')]):
+        lines += ['BEGIN:VEVENT', f'UID:tz-{i}', 'DTSTAMP:20250101T000000Z', f'DTSTART;TZID={tzid}:{start}',
+                  f'DTEND;TZID={tzid}:{start[:9]}235900', f'SUMMARY:{TP_SUMMARIES[i]}', 'END:VEVENT']
+    lines += dst + ['END:VCALENDAR']
+    return ('\r\n'.join(lines) + '\r\n').encode()
+
+
+def _peak_memory(fn, *args):
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def legacy_parse_ical(ical_content):
+    """The original whole-calendar parse (Calendar.from_ical, then every VEVENT)."""
+    cal = Calendar.from_ical(ical_content)
+    workouts = {}
+    for component in cal.walk():
+        if component.name == "VEVENT":
+            workout = app.ICalParser.extract_event_data(component)
+            if workout is not None:
+                app.ICalParser.apply_execution_override(workout)
+            if workout and workout['uid']:
+                workouts[workout['uid']] = workout
+    return workouts
+
+
+def bench_ical(args):
+    feed = make_ical_feed(args.events)
+    chunk = 64 * 1024
+    chunks = lambda: (feed[i:i + chunk] for i in range(0, len(feed), chunk))
+    print(f'feed: {args.events} events, {len(feed) / 1e6:.1f} MB')
+
+    # Throughput without tracemalloc (it slows allocation-heavy code a lot)
+    expected, elapsed = _timed(legacy_parse_ical, feed)
+    print(f'Calendar.from_ical  {elapsed:6.2f} s  {len(feed) / 1e6 / elapsed:5.2f} MB/s')
+    (actual, _), elapsed = _timed(app.ICalParser.parse_ical_stream, chunks())
+    print(f'streaming           {elapsed:6.2f} s  {len(feed) / 1e6 / elapsed:5.2f} MB/s')
+
+    _, _, peak = _peak_memory(legacy_parse_ical, feed)
+    print(f'peak memory  Calendar.from_ical {peak / 1e6:6.1f} MB')
+    _, _, peak = _peak_memory(app.ICalParser.parse_ical_stream, chunks())
+    print(f'peak memory  streaming          {peak / 1e6:6.1f} MB')
+    # The streaming path itself, without the accumulated result dict
+    _, _, peak = _peak_memory(lambda: sum(1 for _ in app.ICalParser.iter_workouts(chunks())))
+    print(f'peak memory  streaming, no dict {peak / 1e6:6.1f} MB')
+
+    if expected != actual:
+        print('❌ streamed workouts differ from Calendar.from_ical')
+        return 1
+    print('✅ streamed workouts match Calendar.from_ical')
+
+    # Stream first: Calendar.from_ical caches the TZIDs for the whole process
+    tz_feed = make_tzid_feed()
+    actual, _ = app.ICalParser.parse_ical_stream(tz_feed[i:i + 100] for i in range(0, len(tz_feed), 100))
+    if actual != legacy_parse_ical(tz_feed):
+        print('❌ streamed workouts differ from Calendar.from_ical on feed-defined TZIDs')
+        return 1
+    print('✅ feed-defined TZIDs resolve like Calendar.from_ical '
+          f'({", ".join(sorted({w["start_time"][-6:] for w in actual.values()}))})')
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# EventCache: re-extract only changed VEVENTs
+# ---------------------------------------------------------------------------
+
+def edit_ical_feed(feed, fraction, seed=9):
+    """The same feed pulled again: new DTSTAMPs, `fraction` of events edited."""
+    rng = random.Random(seed)
+    events = feed.decode().split('BEGIN:VEVENT')
+    for i in range(1, len(events)):
+        events[i] = re.sub(r'DTSTAMP:\S+', 'DTSTAMP:20250601T000000Z', events[i])
+        if rng.random() < fraction:
+            events[i] = events[i].replace('SUMMARY:', 'SUMMARY:Edited ', 1)
+    return 'BEGIN:VEVENT'.join(events).encode()
+
+
+def bench_events(args):
+    feed = make_ical_feed(args.events)
+    edited = edit_ical_feed(feed, args.changed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = f'{tmp}/events.json'
+        print(f'feed: {args.events} events, {args.changed:.0%} edited between pulls')
+
+        _, elapsed = _timed(app.ICalParser.parse_ical_stream, [edited])
+        print(f'  no cache             {elapsed * 1000:8.1f} ms')
+        cache = app.EventCache(path)
+        _, elapsed = _timed(app.ICalParser.parse_ical_stream, [feed], cache)
+        cache.save()
+        print(f'  cold cache           {elapsed * 1000:8.1f} ms')
+        cache = app.EventCache(path)
+        (actual, _), elapsed = _timed(app.ICalParser.parse_ical_stream, [edited], cache)
+        stats = cache.stats()
+        print(f'  warm cache           {elapsed * 1000:8.1f} ms  (hit rate {stats["hit_rate"]:.0%}, '
+              f'~{stats["seconds_saved"] * 1000:.0f} ms of extraction skipped)')
+        _, elapsed = _timed(cache.save)
+        print(f'  save cache           {elapsed * 1000:8.1f} ms')
+
+    expected, _ = app.ICalParser.parse_ical_stream([edited])
+    if actual != expected:
+        print('❌ cached extraction differs from a full parse')
+        return 1
+    print('✅ cached extraction matches a full parse')
+
+    # Events on feed-defined TZIDs are reused until their VTIMEZONE changes
+    tz_feed = make_tzid_feed()
+    redefined = tz_feed.replace(b'TZNAME:P3', b'TZNAME:P3 (renamed)')
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = app.EventCache(f'{tmp}/events.json')
+        expected, _ = app.ICalParser.parse_ical_stream([tz_feed], cache)
+        cache.save()
+        hits = []
+        for feed in (tz_feed, redefined):
+            cache = app.EventCache(f'{tmp}/events.json')
+            actual, _ = app.ICalParser.parse_ical_stream([feed], cache)
+            cache.save()
+            hits.append(cache.hits)
+    if actual != expected or hits != [len(expected), len(expected) - 2]:
+        print(f'❌ cache reuse on feed-defined TZIDs is wrong (hits {hits})')
+        return 1
+    print('✅ feed-defined TZIDs: cached until their VTIMEZONE is redefined')
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# WorkoutManager.update_workouts
+# ---------------------------------------------------------------------------
+
+def make_refresh_workouts(count, seed=5):
+    """Synthetic parsed TP workouts carrying every field detect_changes compares."""
+    rng = random.Random(seed)
+    base = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    workouts = {}
+    for i in range(count):
+        start = base + timedelta(days=rng.randrange(-60, 60), hours=rng.randrange(5, 20))
+        duration = rng.randrange(1800, 3 * 3600, 300)
+        uid = f'tp_{i}'
+        workouts[uid] = {
+            'uid': uid,
+            'summary': rng.choice(TP_SUMMARIES),
+            'description': rng.choice(DESCRIPTION_CORPUS) * rng.randrange(1, 4),
+            'start_time': start.isoformat(),
+            'end_time': (start + timedelta(seconds=duration)).isoformat(),
+            'start_date': start.date().isoformat(),
+            'location': '',
+            'status': 'CONFIRMED',
+            'sequence': 0,
+            'is_all_day': False,
+            'duration': app.StravaAPI.seconds_to_time_string(duration),
+            'parsed_duration': app.StravaAPI.seconds_to_time_string(duration),
+            'parsed_planned_duration': None,
+            'parsed_distance': f'{rng.randrange(5, 80)} km',
+            'duration_type': 'actual',
+            'source': 'tp',
+            'activity_type': None,
+        }
+    return workouts
+
+
+def bench_update(args):
+    workouts = make_refresh_workouts(args.workouts)
+    fresh = lambda: json.loads(json.dumps(workouts))  # New objects, as after a re-parse
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = app.WorkoutManager(f'{tmp}/workouts_bench.json')
+        manager.save_data = lambda full=False: None  # Time the diff, not the JSON write
+        manager.update_workouts(fresh())
+        current = manager.get_current_workouts()
+
+        incoming = fresh()
+        _, legacy = _timed(lambda: [manager.detect_changes(current[uid], w) for uid, w in incoming.items()])
+        print(f'detect_changes on every workout  {legacy * 1000:8.1f} ms')
+        _, elapsed = _timed(manager.update_workouts, fresh())
+        print(f'update_workouts, all unchanged   {elapsed * 1000:8.1f} ms  {manager.last_update_stats}')
+
+        # Steady state: every event is an EventCache hit, whose record carries its fingerprint
+        # (the first such update also fingerprints the stored workouts, once)
+        cache = app.EventCache()
+        for uid, workout in fresh().items():
+            cache.store(uid, uid, app.WorkoutRecord(workout), 0.0)
+        cache.entries = cache.seen
+        manager.update_workouts({uid: cache.lookup(uid, uid) for uid in workouts})
+        hits = {uid: cache.lookup(uid, uid) for uid in workouts}
+        _, elapsed = _timed(manager.update_workouts, hits)
+        print(f'update_workouts, cache hits      {elapsed * 1000:8.1f} ms  {manager.last_update_stats}')
+
+        # Equivalence: fingerprint skips must never hide a real change, whether
+        # the edited workouts are plain dicts or cache hits edited in place
+        for seed, label in [(1, '1% modified'), (2, '1% modified hits')]:
+            incoming = fresh() if seed == 1 else {uid: cache.lookup(uid, uid) for uid in workouts}
+            rng = random.Random(seed)
+            for uid in rng.sample(sorted(incoming), max(1, len(incoming) // 100)):
+                field = rng.choice(app.WorkoutManager.COMPARED_FIELDS)
+                incoming[uid][field] = rng.choice([None, 'changed', 1, True, '1'])
+            current = manager.get_current_workouts()
+            expected = {uid for uid, w in incoming.items() if manager.detect_changes(current[uid], w)}
+            changes, elapsed = _timed(manager.update_workouts, incoming)
+            print(f'update_workouts, {label:16s}{elapsed * 1000:8.1f} ms  {manager.last_update_stats}')
+            if {mod['uid'] for mod in changes['modifications']} != expected:
+                print('❌ update missed or invented modifications')
+                return 1
+    print('✅ update finds exactly the detect_changes modifications')
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# WorkoutRecord vs dict
+# ---------------------------------------------------------------------------
+
+def make_strava_activities(count, seed=11):
+    """Synthetic Strava API activities (the fields parse_strava_activities reads)."""
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1, 6)
+    activities = []
+    for i in range(count):
+        start = base + timedelta(days=i // 3, hours=rng.randrange(0, 12))
+        moving = rng.randrange(1200, 4 * 3600)
+        activities.append({
+            'id': 10_000_000 + i,
+            'name': rng.choice(['Morning Run', 'Lunch Ride', 'Pool Swim', 'Tempo Run']),
+            'description': '',
+            'start_date': start.isoformat() + 'Z',
+            'start_date_local': start.isoformat(),
+            'sport_type': rng.choice(['Run', 'Ride', 'Swim']),
+            'location_city': 'Boulder',
+            'location_state': 'CO',
+            'moving_time': moving,
+            'elapsed_time': moving + rng.randrange(0, 600),
+            'distance': rng.uniform(1000, 80000),
+            'total_elevation_gain': rng.uniform(0, 900),
+            'average_speed': rng.uniform(1, 12),
+            'max_speed': rng.uniform(5, 20),
+            'average_heartrate': rng.uniform(110, 170),
+            'max_heartrate': rng.uniform(160, 195),
+            'average_watts': rng.uniform(120, 300),
+            'kilojoules': rng.uniform(200, 2000),
+            'calories': rng.uniform(200, 2000),
+        })
+    return activities
+
+
+def _retained_memory(build):
+    """Bytes still allocated by `build()` once it returns (and its result)."""
+    tracemalloc.start()
+    try:
+        result = build()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current
+
+
+def bench_records(args):
+    half = args.workouts // 2
+    workouts = list(app.StravaAPI.parse_strava_activities(make_strava_activities(half)).values())
+    workouts += [WorkoutRecord(w) for w in make_refresh_workouts(args.workouts - half).values()]
+    as_dicts = [w.to_dict() for w in workouts]  # Field values are shared by both layouts
+
+    dicts, dict_bytes = _retained_memory(lambda: [dict(w) for w in as_dicts])
+    records, record_bytes = _retained_memory(lambda: [WorkoutRecord(w) for w in as_dicts])
+    print(f'{len(workouts)} workouts ({half} Strava, {len(workouts) - half} TP), containers only:')
+    print(f'  dict           {dict_bytes / 1e6:7.2f} MB  ({dict_bytes / len(dicts):5.0f} B/workout)')
+    print(f'  WorkoutRecord  {record_bytes / 1e6:7.2f} MB  ({record_bytes / len(records):5.0f} B/workout)')
+
+    if records != dicts or json.dumps(records, default=json_default) != json.dumps(dicts):
+        print('❌ records differ from the dicts they were built from')
+        return 1
+    print('✅ records compare and serialize exactly like the dicts')
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# WorkoutTable batch checks
+# ---------------------------------------------------------------------------
+
+def bench_table(args):
+    tp_workouts, strava_workouts = make_merge_inputs(args.workouts // 2, args.workouts - args.workouts // 2)
+    workouts = {**tp_workouts, **strava_workouts}
+    rng = random.Random(7)
+    for workout in workouts.values():
+        workout['status'] = rng.choice(['CONFIRMED', 'COMPLETED', ''])
+        workout['has_time'] = 'T' in workout['start_time']
+    today = datetime.now().date()
+    timestamp = datetime.now(app.tz.UTC).isoformat()
+    manager = app.WorkoutManager.__new__(app.WorkoutManager)  # classify_deletion needs no state
+
+    def scalar():
+        return ([app._is_past_planned_workout(w) for w in workouts.values()],
+                [manager.classify_deletion(w, timestamp) for w in workouts.values()])
+
+    def batch():
+        table = app.WorkoutTable(workouts)
+        return table.past_planned(today), table.deletion_types(timestamp)
+
+    expected, scalar_time = _timed(scalar)
+    result, batch_time = _timed(batch)
+    backend = 'NumPy' if app.np is not None else 'lists (NumPy not installed)'
+    print(f'{len(workouts)} workouts, past/planned filter + deletion classification:')
+    print(f'  per workout          {scalar_time * 1000:8.1f} ms')
+    print(f'  WorkoutTable         {batch_time * 1000:8.1f} ms  ({backend})')
+
+    if result != expected:
+        print('❌ WorkoutTable disagrees with the per-workout functions')
+        return 1
+    print('✅ WorkoutTable matches _is_past_planned_workout and classify_deletion')
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# timeutil: normalized workout times
+# ---------------------------------------------------------------------------
+
+def legacy_workout_times(workout):
+    """The per-call parses the matcher, past/planned filter and deletion classifier used to do."""
+    def time_key(value):
+        try:
+            dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except (AttributeError, TypeError, ValueError):
+            return None
+        if dt.tzinfo is None:
+            return (False, (dt - timeutil.EPOCH_NAIVE) // timedelta(microseconds=1))
+        return (True, (dt - timeutil.EPOCH_AWARE) // timedelta(microseconds=1))
+
+    start = time_key(workout.get('start_time'))
+    try:
+        day = datetime.fromisoformat(
+            workout.get('start_date') or (workout.get('start_time') or '').split('T')[0]).toordinal()
+    except ValueError:
+        day = -1
+    reference = time_key(workout.get('start_date') or workout.get('start_time'))
+    return timeutil.WorkoutTimes(start, day, reference[1] if reference else None)
+
+
+def bench_times(args):
+    tp_workouts, strava_workouts = make_merge_inputs(args.workouts // 2, args.workouts - args.workouts // 2)
+    workouts = [WorkoutRecord(w) for w in [*tp_workouts.values(), *strava_workouts.values()]]
+
+    def normalize_cold():
+        for parse in (timeutil.parse_datetime, timeutil.time_key, timeutil.day_ordinal, timeutil._normalize):
+            parse.cache_clear()
+        return [timeutil.normalize(w) for w in workouts]
+
+    expected, legacy_time = _timed(lambda: [legacy_workout_times(w) for w in workouts])
+    result, cold_time = _timed(normalize_cold)
+    _, warm_time = _timed(lambda: [timeutil.normalize(w) for w in workouts])
+    [timeutil.workout_times(w) for w in workouts]
+    _, cached_time = _timed(lambda: [timeutil.workout_times(w) for w in workouts])
+    print(f'{len(workouts)} workouts, start time + date + deletion reference:')
+    for label, elapsed in [('fromisoformat per call', legacy_time), ('timeutil, cold caches', cold_time),
+                           ('timeutil, warm caches', warm_time), ('cached on the record', cached_time)]:
+        print(f'  {label:24s} {elapsed * 1000:7.1f} ms  ({elapsed / len(workouts) * 1e6:5.2f} µs per workout)')
+
+    if result != expected:
+        print('❌ timeutil.normalize disagrees with the per-call parses')
+        return 1
+    print('✅ timeutil.normalize matches the per-call parses')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='tp-validator micro-benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    merge = subparsers.add_parser('merge', help='merge_workouts_by_source at scale')
+    merge.add_argument('--tp', type=int, default=10000)
+    merge.add_argument('--strava', type=int, default=10000)
+    merge.add_argument('--legacy', action='store_true', help='also time the linear-scan reference (slow)')
+    merge.set_defaults(func=bench_merge)
+
+    description = subparsers.add_parser('description', help='ICalParser.parse_description over a TP corpus')
+    description.add_argument('--repeat', type=int, default=500)
+    description.set_defaults(func=bench_description)
+
+    ical = subparsers.add_parser('ical', help='Calendar.from_ical vs streaming VEVENT parser')
+    ical.add_argument('--events', type=int, default=5000)
+    ical.set_defaults(func=bench_ical)
+
+    events = subparsers.add_parser('events', help='VEVENT extraction with and without EventCache')
+    events.add_argument('--events', type=int, default=5000)
+    events.add_argument('--changed', type=float, default=0.05)
+    events.set_defaults(func=bench_events)
+
+    update = subparsers.add_parser('update', help='WorkoutManager.update_workouts with fingerprints')
+    update.add_argument('--workouts', type=int, default=10000)
+    update.set_defaults(func=bench_update)
+
+    records = subparsers.add_parser('records', help='memory of WorkoutRecord vs dict workouts')
+    records.add_argument('--workouts', type=int, default=10000)
+    records.set_defaults(func=bench_records)
+
+    table = subparsers.add_parser('table', help='WorkoutTable batch checks vs per-workout functions')
+    table.add_argument('--workouts', type=int, default=10000)
+    table.set_defaults(func=bench_table)
+
+    times = subparsers.add_parser('times', help='timeutil normalized times vs per-call fromisoformat')
+    times.add_argument('--workouts', type=int, default=10000)
+    times.set_defaults(func=bench_times)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
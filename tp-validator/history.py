@@ -0,0 +1,243 @@
+"""Delta-encoded workout history.
+
+Stored history entries only keep what changed:
+
+    {'action': 'added', 'data': WORKOUT}                       full version
+    {'action': 'modified', 'delta': {'set': {...}, 'unset': [...]}}
+    {'action': 'modified', 'data': WORKOUT}                    checkpoint
+    {'action': 'deleted', 'deletion_type': ...}                data = previous version
+
+A full checkpoint is written every HISTORY_CHECKPOINT_INTERVAL entries so a
+version never needs more than that many deltas applied. The `changes` of a
+modification are derived from the two versions on either side of it.
+
+Change-log entries point at history entries instead of copying workouts:
+additions, modifications and (rolling-window) deletions are stored as
+{'uid': UID, 'h': HISTORY_INDEX}. Entries written before this format (full
+`data`/`changes`, full objects in the change log) are read unchanged, so
+files can be compacted at any time with `python storage.py compact`.
+
+`inflate_history` and `inflate_change_log` rebuild the original shapes for
+the API.
+"""
+
+HISTORY_CHECKPOINT_INTERVAL = 10
+
+# Fields compared by WorkoutManager.detect_changes
+COMPARED_FIELDS = ('summary', 'description', 'start_time', 'end_time',
+                   'start_date', 'location', 'status', 'sequence', 'is_all_day',
+                   'duration', 'parsed_duration', 'parsed_planned_duration',
+                   'parsed_distance', 'duration_type', 'source', 'activity_type',
+                   'strava_average_heartrate', 'strava_average_watts', 'strava_calories')
+
+
+def diff_fields(old, new):
+    """Field changes between two versions, as detect_changes reports them."""
+    changes = {}
+    for field in COMPARED_FIELDS:
+        old_val = old.get(field)
+        new_val = new.get(field)
+        if old_val != new_val:
+            changes[field] = {'old': old_val, 'new': new_val}
+    return changes if changes else None
+
+
+def make_delta(old, new):
+    """Keys to set and unset to turn `old` into `new`."""
+    # Compare types too, so that e.g. 1 -> True is still recorded
+    delta = {'set': {k: v for k, v in new.items()
+                     if k not in old or type(old[k]) is not type(v) or old[k] != v}}
+    unset = [k for k in old if k not in new]
+    if unset:
+        delta['unset'] = unset
+    return delta
+
+
+def apply_delta(old, delta):
+    """Rebuild a version from its predecessor and delta."""
+    new = {k: v for k, v in old.items() if k not in delta.get('unset', ())}
+    new.update(delta['set'])
+    return new
+
+
+def needs_checkpoint(history):
+    """True if the next modification should be stored in full."""
+    for distance, entry in enumerate(reversed(history), start=1):
+        if 'data' in entry:
+            return distance >= HISTORY_CHECKPOINT_INTERVAL
+    return True
+
+
+def modified_entry(timestamp, history, old, new):
+    """Stored history entry for a modification of the latest version."""
+    if needs_checkpoint(history):
+        return {'timestamp': timestamp, 'action': 'modified', 'data': new}
+    return {'timestamp': timestamp, 'action': 'modified', 'delta': make_delta(old, new)}
+
+
+def replay(history):
+    """
+    Yield (full_entry, previous_version) for every history entry.
+
+    `full_entry` has the pre-delta shape: `data` (and `changes` for
+    modifications) filled in.
+    """
+    state = None
+    for entry in history:
+        previous = state
+        if 'delta' in entry:
+            state = apply_delta(state or {}, entry['delta'])
+            full = {k: v for k, v in entry.items() if k not in ('delta', 'changes')}
+            full['data'] = state
+            full['changes'] = entry['changes'] if 'changes' in entry else diff_fields(previous or {}, state)
+        elif 'data' in entry:
+            state = entry['data']
+            full = entry
+            if entry.get('action') == 'modified' and 'changes' not in entry:
+                full = {**entry, 'changes': diff_fields(previous or {}, state)}
+        elif entry.get('action') == 'deleted' and 'deletion_type' in entry:
+            full = {**entry, 'data': state}
+        else:
+            full = entry
+        yield full, previous
+
+
+def inflate_history(history):
+    """History entries in the original full-snapshot shape."""
+    return [full for full, _ in replay(history)]
+
+
+def workout_version(history, index):
+    """Workout data as of history entry `index` (None if it has none)."""
+    # Start from the latest full version at or before `index`
+    start = index
+    while start > 0 and 'data' not in history[start]:
+        start -= 1
+    state = None
+    for entry in history[start:index + 1]:
+        if 'delta' in entry:
+            state = apply_delta(state or {}, entry['delta'])
+        elif 'data' in entry:
+            state = entry['data']
+    return state
+
+
+def inflate_change_log(change_log, workouts):
+    """Change-log entries with history references replaced by full objects."""
+    replays = {}
+
+    def resolve(uid, index):
+        if uid not in replays:
+            replays[uid] = list(replay(workouts[uid]['history']))
+        return replays[uid][index]
+
+    inflated = []
+    for entry in change_log:
+        full = dict(entry)
+        full['additions'] = [
+            resolve(item['uid'], item['h'])[0]['data'] if 'h' in item else item
+            for item in entry.get('additions', [])
+        ]
+        modifications = []
+        for item in entry.get('modifications', []):
+            if 'h' in item:
+                history_entry, previous = resolve(item['uid'], item['h'])
+                item = {'uid': item['uid'], 'old': previous, 'new': history_entry['data'],
+                        'changes': history_entry['changes']}
+            modifications.append(item)
+        full['modifications'] = modifications
+        deletions = []
+        for item in entry.get('deletions', []):
+            if 'h' in item:
+                history_entry, _ = resolve(item['uid'], item['h'])
+                item = {**history_entry['data'], 'deletion_type': history_entry['deletion_type']}
+            deletions.append(item)
+        full['deletions'] = deletions
+        inflated.append(full)
+    return inflated
+
+
+def compact_history(history):
+    """
+    Rewrite full-snapshot history entries as deltas.
+
+    Stored `changes` are only dropped when deriving them gives the same
+    result (older versions of the app compared different fields).
+    """
+    compacted = []
+    for entry, (_, previous) in zip(history, replay(history)):
+        new_entry = entry
+        if entry.get('action') == 'modified' and 'data' in entry and previous is not None:
+            new_entry = modified_entry(entry.get('timestamp'), compacted, previous, entry['data'])
+            if 'delta' in new_entry and apply_delta(previous, new_entry['delta']) != entry['data']:
+                new_entry = {'timestamp': entry.get('timestamp'), 'action': 'modified', 'data': entry['data']}
+            for key, value in entry.items():
+                if key not in new_entry and key != 'data':
+                    new_entry[key] = value
+            if 'changes' in new_entry and new_entry['changes'] == diff_fields(previous, entry['data']):
+                del new_entry['changes']
+        elif entry.get('action') == 'deleted' and 'deletion_type' in entry and 'data' in entry:
+            if entry['data'] == previous:
+                new_entry = {k: v for k, v in entry.items() if k != 'data'}
+        compacted.append(new_entry)
+    return compacted
+
+
+def compact_change_log(change_log, workouts):
+    """Replace full objects in the change log with history references."""
+    replays = {uid: list(replay(info.get('history', []))) for uid, info in workouts.items()}
+
+    def find(uid, timestamp, action, matches):
+        for index, (full, previous) in enumerate(replays.get(uid, ())):
+            if full.get('timestamp') == timestamp and full.get('action') == action and matches(full, previous):
+                return {'uid': uid, 'h': index}
+        return None
+
+    compacted = []
+    for entry in change_log:
+        timestamp = entry.get('timestamp')
+        new_entry = dict(entry)
+        new_entry['additions'] = [
+            find(item.get('uid'), timestamp, 'added',
+                 lambda full, previous, item=item: full.get('data') == item) or item
+            for item in entry.get('additions', [])
+        ]
+        new_entry['modifications'] = [
+            find(item.get('uid'), timestamp, 'modified',
+                 lambda full, previous, item=item: (previous == item.get('old') and
+                                                    full.get('data') == item.get('new') and
+                                                    full.get('changes') == item.get('changes'))) or item
+            for item in entry.get('modifications', [])
+        ]
+        new_entry['deletions'] = [
+            (find(item.get('uid'), timestamp, 'deleted',
+                  lambda full, previous, item=item: (
+                      full.get('deletion_type') == item['deletion_type'] and
+                      {**(full.get('data') or {}), 'deletion_type': item['deletion_type']} == item))
+             if 'deletion_type' in item else None) or item
+            for item in entry.get('deletions', [])
+        ]
+        compacted.append(new_entry)
+    return compacted
+
+
+def compact_document(data):
+    """
+    Compacted copy of a workout document.
+
+    Raises ValueError if the compacted document does not inflate back to
+    exactly the original history and change log.
+    """
+    workouts = {
+        uid: {**info, 'history': compact_history(info.get('history', []))}
+        for uid, info in data.get('workouts', {}).items()
+    }
+    change_log = compact_change_log(data.get('change_log', []), workouts)
+
+    for uid, info in workouts.items():
+        if inflate_history(info['history']) != inflate_history(data['workouts'][uid].get('history', [])):
+            raise ValueError(f'History of {uid} does not round-trip')
+    if inflate_change_log(change_log, workouts) != inflate_change_log(data.get('change_log', []), data['workouts']):
+        raise ValueError('Change log does not round-trip')
+
+    return {**data, 'workouts': workouts, 'change_log': change_log}
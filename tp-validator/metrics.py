@@ -0,0 +1,126 @@
+"""Per-stage timing of the refresh pipeline.
+
+A refresh runs with a `Timings` collector active (`with timings.active():`).
+Code anywhere below it wraps a stage in `span(name)`, or reports a duration
+with `add(name, seconds)` where a context manager would cost too much (e.g.
+per description). Without an active collector both are no-ops. The collector
+lives in a ContextVar, so threads that should report into it have to run in
+a copied context (contextvars.copy_context().run).
+
+Stages nest: a stage's seconds include the stages timed inside it. Repeated
+stages are summed and counted.
+
+`StageMetrics` keeps the last `window` values of every stage across
+refreshes and reports rolling percentiles.
+"""
+import math
+import time
+import threading
+import contextlib
+import contextvars
+from collections import deque
+
+_current = contextvars.ContextVar('timings', default=None)
+
+
+class Timings:
+    """Stage durations of one request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # Sources are fetched concurrently
+        self.stages = {}  # name -> [seconds, count]
+
+    def add(self, name, seconds):
+        with self._lock:
+            entry = self.stages.get(name)
+            if entry is None:
+                self.stages[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    @contextlib.contextmanager
+    def active(self):
+        """Make this the collector `span` and `add` report to."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def as_dict(self):
+        with self._lock:
+            return {name: {'seconds': round(seconds, 4), 'count': count}
+                    for name, (seconds, count) in self.stages.items()}
+
+
+def current():
+    """The active Timings, or None."""
+    return _current.get()
+
+
+def add(name, seconds):
+    """Report a stage duration to the active collector, if any."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextlib.contextmanager
+def span(name):
+    """Time the enclosed block as stage `name`."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def _percentile(ordered, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class StageMetrics:
+    """Rolling per-stage durations over the last `window` requests."""
+
+    def __init__(self, window):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}  # name -> deque of seconds
+        self._totals = {}  # name -> requests that ran the stage
+        self.requests = 0
+
+    def observe(self, timings):
+        """Record one request's Timings."""
+        stages = timings.as_dict()
+        with self._lock:
+            self.requests += 1
+            for name, stage in stages.items():
+                samples = self._samples.get(name)
+                if samples is None:
+                    samples = self._samples[name] = deque(maxlen=self.window)
+                samples.append(stage['seconds'])
+                self._totals[name] = self._totals.get(name, 0) + 1
+
+    def summary(self):
+        """{stage: count, samples, mean, p50, p90, p99, max} in seconds."""
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._samples.items()}
+            totals = dict(self._totals)
+        return {
+            name: {
+                'count': totals[name],
+                'samples': len(ordered),
+                'mean': round(sum(ordered) / len(ordered), 4),
+                'p50': _percentile(ordered, 0.5),
+                'p90': _percentile(ordered, 0.9),
+                'p99': _percentile(ordered, 0.99),
+                'max': ordered[-1],
+            }
+            for name, ordered in snapshot.items()
+        }
@@ -0,0 +1,163 @@
+"""Compact in-memory workout records.
+
+A parsed workout used to be a plain dict with ~30-40 string keys. Held for
+many athletes at once, the per-workout hash tables were the largest
+allocation. `WorkoutRecord` keeps one `__slots__` slot per known field
+instead and still behaves like the dict it replaces (get, [], in, items,
+==, {**record}), so code that reads workouts does not care which one it
+gets.
+
+Records are converted back to dicts only at the JSON boundary: pass
+`json_default` to json.dump(s), or call `to_dict()`.
+"""
+from collections.abc import MutableMapping
+
+# Fields set by ICalParser.extract_event_data, StravaAPI.parse_strava_activities
+# and merge_workouts_by_source, in the order they are usually set
+WORKOUT_FIELDS = (
+    'uid', 'summary', 'description', 'start_time', 'start_date', 'end_time',
+    'end_date', 'is_all_day', 'has_time', 'duration', 'location', 'status',
+    'sequence', 'created', 'last_modified', 'categories', 'parsed_duration',
+    'parsed_duration_formatted', 'parsed_planned_duration',
+    'parsed_planned_duration_formatted', 'parsed_distance', 'parsed_tss',
+    'parsed_pace', 'parsed_power', 'parsed_heart_rate', 'parsed_execution_status',
+    'duration_type', 'source', 'activity_type', 'replaced_tp_uid',
+    'strava_distance', 'strava_moving_time', 'strava_elapsed_time',
+    'strava_total_elevation_gain', 'strava_average_speed', 'strava_max_speed',
+    'strava_average_heartrate', 'strava_max_heartrate', 'strava_average_watts',
+    'strava_kilojoules', 'strava_calories',
+)
+
+_FIELD_SET = frozenset(WORKOUT_FIELDS)
+_TIME_FIELDS = frozenset(('start_time', 'start_date'))  # Inputs of timeutil.normalize
+_MISSING = object()
+
+
+class WorkoutRecord(MutableMapping):
+    """
+    A workout stored in slots rather than a per-instance dict.
+
+    An unset slot is a missing key, so `'source' in record` and
+    `record.get('source')` behave as they did for dicts. Keys outside
+    WORKOUT_FIELDS go to a small overflow dict created on demand. `_times`
+    caches timeutil.workout_times and `_fingerprint` caches
+    WorkoutManager.fingerprint; neither is part of the mapping. The
+    fingerprint is dropped when any field changes value.
+    """
+
+    __slots__ = WORKOUT_FIELDS + ('_extra', '_times', '_fingerprint')
+
+    def __init__(self, fields=None):
+        self._extra = None
+        self._times = None
+        self._fingerprint = None
+        if fields:
+            for key, value in fields.items():
+                self[key] = value
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in _FIELD_SET:
+            return getattr(self, key, default)
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __contains__(self, key):
+        if key in _FIELD_SET:
+            return getattr(self, key, _MISSING) is not _MISSING
+        return self._extra is not None and key in self._extra
+
+    def __setitem__(self, key, value):
+        if self._fingerprint is not None and self.get(key, _MISSING) != value:
+            self._fingerprint = None
+        if key in _FIELD_SET:
+            if key in _TIME_FIELDS:
+                self._times = None
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        self._fingerprint = None
+        if key in _FIELD_SET:
+            if key in _TIME_FIELDS:
+                self._times = None
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for name in WORKOUT_FIELDS:
+            if getattr(self, name, _MISSING) is not _MISSING:
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'WorkoutRecord({self.to_dict()!r})'
+
+    def to_dict(self):
+        """Plain dict copy, for JSON and the API."""
+        result = {}
+        for name in WORKOUT_FIELDS:
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                result[name] = value
+        if self._extra:
+            result.update(self._extra)
+        return result
+
+    def copy(self):
+        return WorkoutRecord(self)
+
+
+def json_default(obj):
+    """`default=` hook for json.dump(s) that serializes WorkoutRecords."""
+    if isinstance(obj, WorkoutRecord):
+        return obj.to_dict()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def as_record(workout):
+    """`workout` as a WorkoutRecord (None and records pass through)."""
+    if workout is None or isinstance(workout, WorkoutRecord):
+        return workout
+    return WorkoutRecord(workout)
+
+
+def compact_workout_info(workout_info):
+    """
+    Turn the stored workouts of one {'current', 'history'} entry into records,
+    in place. The latest history version shares the current record, as it
+    does right after an update.
+    """
+    current = workout_info.get('current')
+    history = workout_info.get('history', [])
+    if current:
+        latest = history[-1].get('data') if history else None
+        current = workout_info['current'] = as_record(current)
+        if latest is not None and latest == current:
+            history[-1]['data'] = current
+    for entry in history:
+        if entry.get('data') and entry['data'] is not current:
+            entry['data'] = as_record(entry['data'])
+    return workout_info
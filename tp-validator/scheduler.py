@@ -0,0 +1,32 @@
+"""Run the background feed scheduler as its own process.
+
+Usage:
+    python scheduler.py [--feed URL ...]
+
+Under gunicorn or another WSGI server, run exactly one of these next to the
+web workers. They share data/scheduler_state.json, so feeds refreshed
+through the app join the schedule here, and every worker reports the
+scheduler's refreshes in `stale_seconds`. Feeds given with --feed (or
+TP_SCHEDULER_FEEDS) are always kept on the schedule.
+"""
+import argparse
+
+from app import feed_scheduler, SCHEDULER_FEEDS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Keep Training Peaks feeds refreshed in the background.')
+    parser.add_argument('--feed', action='append', default=[],
+                        help='Feed URL to always schedule (repeatable; adds to TP_SCHEDULER_FEEDS)')
+    args = parser.parse_args(argv)
+
+    feeds = SCHEDULER_FEEDS + args.feed
+    print(f"⏱️  Scheduler running every {feed_scheduler.interval:g}s ({len(feeds)} seeded feeds)")
+    try:
+        feed_scheduler.run(feeds)
+    except KeyboardInterrupt:
+        feed_scheduler.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,660 @@
+"""Storage backends for tp-validator workout data.
+
+The in-memory document shape is the same for every backend:
+
+    {
+        'last_updated': ISO_TIMESTAMP | None,
+        'workouts': {uid: {'current': WORKOUT | None, 'history': [...]}},
+        'change_log': [CHANGE_ENTRY, ...]
+    }
+
+`JsonWorkoutStore` keeps the original single-file format. `SqliteWorkoutStore`
+keeps the same document in WAL-mode SQLite tables so that a refresh only
+writes the rows that actually changed.
+
+Older change-log entries are moved out of the document into a
+`ChangeLogArchive`; `change_log_offset` counts how many were moved, so the
+entry at change_log[i] has sequence number change_log_offset + i + 1.
+
+Each store can also load the *current view* on its own, without deleted
+workouts or any history:
+
+    {
+        'last_updated': ISO_TIMESTAMP | None,
+        'version': N,
+        'workouts': {uid: WORKOUT},          # current workouts only
+        'recent_changes': [CHANGE_ENTRY, ...]  # newest few, inflated
+    }
+
+The JSON store keeps it in a workouts_<id>.current.json sidecar tagged with
+the store signature it was written for; SQLite reads it from the
+`is_current` index.
+
+Files are replaced atomically (`atomic_write`: temp file + os.replace), so
+readers in any process see either the old or the new version and never
+take a lock. Writers of one feed serialize on its `FeedLock`.
+"""
+import os
+import gzip
+import json
+import sqlite3
+import argparse
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: FeedLock only serializes threads of this process
+    fcntl = None
+
+from history import compact_document, inflate_change_log
+from records import json_default
+
+
+def atomic_write(path, write, fsync=True):
+    """
+    Replace `path` with what `write(file)` writes, atomically.
+
+    The content goes to a temp file in the same directory which then
+    replaces `path` (os.replace), so a reader opens either the old or the
+    new file, never a partial one.
+    """
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            write(f)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path, obj, fsync=True, **kwargs):
+    """atomic_write of json.dumps(obj) (dumps is much faster than dump)."""
+    text = json.dumps(obj, default=json_default, **kwargs)
+    atomic_write(path, lambda f: f.write(text), fsync=fsync)
+
+
+class FeedLock:
+    """
+    Exclusive lock for writing one feed's store, across threads and processes.
+
+    Uses an advisory flock on a workouts_<id>.lock file next to the store
+    (where fcntl exists) plus a thread lock, since concurrent threads of one
+    process may hold separate managers for the same file. Only writers take
+    it, and only around check → update → save.
+    """
+
+    _thread_locks = {}  # path -> threading.Lock, shared by every FeedLock of the file
+    _registry_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        with self._registry_lock:
+            self._thread_lock = self._thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+        self._file = None
+
+    @classmethod
+    def for_store(cls, path):
+        """The lock of the feed stored at `path` (workouts_<id>.json or .db)."""
+        return cls(os.path.splitext(path)[0] + '.lock')
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            try:
+                self._file = open(self.path, 'a')
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if self._file is not None:
+                self._file.close()  # Closing the file releases the flock
+                self._file = None
+        finally:
+            self._thread_lock.release()
+
+
+class JsonWorkoutStore:
+    """Stores the whole workout document in a single JSON file."""
+
+    backend = 'json'
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.current_path = os.path.splitext(filepath)[0] + '.current.json'
+
+    def load(self):
+        """
+        Load the workout document, or None if it does not exist.
+
+        An unreadable file raises (json.JSONDecodeError is a ValueError)
+        rather than passing for an empty store that the next save would
+        write over.
+        """
+        try:
+            with open(self.filepath, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, data, dirty_uids=None):
+        """Rewrite the whole document atomically (the JSON format has no partial writes)."""
+        atomic_write_json(self.filepath, data, indent=2)
+
+    def load_current(self, signature):
+        """
+        Load the current view from the sidecar, or None if it is missing or
+        was not written for the store as of `signature`.
+        """
+        if signature is None:
+            return None
+        try:
+            with open(self.current_path, 'r') as f:
+                view = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if view.pop('store_signature', None) != list(signature):
+            return None
+        return view
+
+    def save_current(self, view, signature):
+        """Write the current view sidecar for the store as of `signature`."""
+        # Not fsynced: a sidecar lost in a crash is just rebuilt
+        atomic_write_json(self.current_path, {**view, 'store_signature': list(signature)}, fsync=False)
+
+    def signature(self):
+        """(mtime_ns, size, inode) of the backing file, or None if it does not exist."""
+        return file_signature(self.filepath)
+
+    def footprint(self):
+        """Approximate size of the stored document in bytes."""
+        signature = self.signature()
+        return signature[1] if signature else 0
+
+
+class SqliteWorkoutStore:
+    """Stores the workout document in indexed SQLite tables (WAL mode)."""
+
+    backend = 'sqlite'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS workouts (
+            uid TEXT PRIMARY KEY,
+            info TEXT NOT NULL,
+            is_current INTEGER NOT NULL DEFAULT 0,
+            start_date TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_workouts_current
+            ON workouts (is_current, start_date);
+        CREATE TABLE IF NOT EXISTS history (
+            uid TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            timestamp TEXT,
+            action TEXT,
+            entry TEXT NOT NULL,
+            PRIMARY KEY (uid, seq)
+        );
+        CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history (timestamp);
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY,
+            timestamp TEXT,
+            entry TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_change_log_timestamp ON change_log (timestamp);
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._schema_ready = False
+
+    def _connect(self):
+        """Open a connection, creating the schema on first use."""
+        conn = sqlite3.connect(self.filepath, timeout=30)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if not self._schema_ready:
+            # journal_mode is persistent, so this only matters for new files
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(self.SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def load(self):
+        """Load the workout document, or None if the database does not exist."""
+        if not os.path.exists(self.filepath):
+            return None
+
+        conn = self._connect()
+        try:
+            data = {'last_updated': None, 'workouts': {}, 'change_log': []}
+            for key, value in conn.execute('SELECT key, value FROM meta'):
+                data[key] = json.loads(value)
+
+            workouts = data['workouts']
+            for uid, info in conn.execute('SELECT uid, info FROM workouts ORDER BY rowid'):
+                workout_info = json.loads(info)
+                workout_info['history'] = []
+                workouts[uid] = workout_info
+
+            for uid, entry in conn.execute('SELECT uid, entry FROM history ORDER BY uid, seq'):
+                if uid in workouts:
+                    workouts[uid]['history'].append(json.loads(entry))
+
+            data['change_log'] = [
+                json.loads(entry)
+                for (entry,) in conn.execute('SELECT entry FROM change_log ORDER BY seq')
+            ]
+            return data
+        finally:
+            conn.close()
+
+    def load_current(self, signature, recent=10):
+        """
+        Load the current view through the is_current index, or None if the
+        database does not exist. Only history of workouts referenced by the
+        newest `recent` change-log entries is read.
+        """
+        if signature is None or not os.path.exists(self.filepath):
+            return None
+
+        conn = self._connect()
+        try:
+            meta = {key: json.loads(value) for key, value in
+                    conn.execute("SELECT key, value FROM meta WHERE key IN ('last_updated', 'version')")}
+            workouts = {
+                uid: json.loads(info)['current']
+                for uid, info in conn.execute('SELECT uid, info FROM workouts WHERE is_current = 1 ORDER BY rowid')
+            }
+            change_log = [
+                json.loads(entry)
+                for (entry,) in conn.execute('SELECT entry FROM change_log ORDER BY seq DESC LIMIT ?', (recent,))
+            ][::-1]
+            referenced = sorted({
+                item['uid'] for entry in change_log
+                for key in ('additions', 'modifications', 'deletions')
+                for item in entry.get(key, []) if 'h' in item
+            })
+            histories = {uid: {'history': []} for uid in referenced}
+            for uid in referenced:
+                histories[uid]['history'] = [
+                    json.loads(entry)
+                    for (entry,) in conn.execute('SELECT entry FROM history WHERE uid = ? ORDER BY seq', (uid,))
+                ]
+            return {
+                'last_updated': meta.get('last_updated'),
+                'version': meta.get('version', 0),
+                'workouts': workouts,
+                'recent_changes': inflate_change_log(change_log, histories),
+            }
+        finally:
+            conn.close()
+
+    def save_current(self, view, signature):
+        """Nothing to do: save() keeps the is_current column up to date."""
+
+    def save(self, data, dirty_uids=None):
+        """
+        Persist the workout document in one transaction.
+
+        Only workouts listed in `dirty_uids` are upserted, and only history and
+        change-log entries that are not in the database yet are inserted.
+        Passing `dirty_uids=None` syncs every workout.
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                self._write(conn, data, dirty_uids)
+        finally:
+            conn.close()
+
+    def _write(self, conn, data, dirty_uids):
+        """The statements of save(), inside the caller's transaction."""
+        workouts = data.get('workouts', {})
+        uids = workouts.keys() if dirty_uids is None else dirty_uids
+        for key, value in data.items():
+            if key not in ('workouts', 'change_log'):
+                conn.execute(
+                    'INSERT INTO meta (key, value) VALUES (?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+                    (key, json.dumps(value, default=json_default))
+                )
+
+        for uid in uids:
+            workout_info = workouts.get(uid)
+            if workout_info is not None:
+                self._upsert_workout(conn, uid, workout_info)
+
+        # Entries up to the offset have been moved to the archive
+        offset = data.get('change_log_offset', 0)
+        conn.execute('DELETE FROM change_log WHERE seq <= ?', (offset,))
+        stored = max(conn.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0], offset)
+        change_log = data.get('change_log', [])
+        conn.executemany(
+            'INSERT INTO change_log (seq, timestamp, entry) VALUES (?, ?, ?)',
+            [
+                (seq, entry.get('timestamp'), json.dumps(entry, default=json_default))
+                for seq, entry in enumerate(change_log[stored - offset:], start=stored + 1)
+            ]
+        )
+
+        # Count the write in the database header; it commits or rolls back
+        # with the rest of the transaction (see signature())
+        write_count = conn.execute('PRAGMA user_version').fetchone()[0]
+        conn.execute(f'PRAGMA user_version = {write_count + 1}')
+
+    def replace(self, data):
+        """Rewrite the whole database with `data` and reclaim the freed space."""
+        conn = self._connect()
+        try:
+            with conn:  # One transaction: a failure leaves the old contents
+                for table in ('meta', 'workouts', 'history', 'change_log'):
+                    conn.execute(f'DELETE FROM {table}')
+                self._write(conn, data, None)
+        finally:
+            conn.close()
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+
+    def signature(self):
+        """
+        (inode, write count) of the database, or None if it does not exist.
+
+        SQLite writes in place, so the file's mtime and size can stay the same
+        across a commit; the count every save bumps (PRAGMA user_version)
+        cannot. The inode tells a recreated database apart.
+        """
+        db = file_signature(self.filepath)
+        if db is None:
+            return None
+        conn = sqlite3.connect(self.filepath, timeout=30)
+        try:
+            return (db[2], conn.execute('PRAGMA user_version').fetchone()[0])
+        finally:
+            conn.close()
+
+    def footprint(self):
+        """Approximate size of the stored document in bytes."""
+        return sum((file_signature(self.filepath + suffix) or (0, 0))[1] for suffix in ('', '-wal'))
+
+    def _upsert_workout(self, conn, uid, workout_info):
+        """Upsert one workout row and append its new history entries."""
+        info = {k: v for k, v in workout_info.items() if k != 'history'}
+        current = workout_info.get('current')
+        conn.execute(
+            'INSERT INTO workouts (uid, info, is_current, start_date) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(uid) DO UPDATE SET info = excluded.info, '
+            'is_current = excluded.is_current, start_date = excluded.start_date',
+            (uid, json.dumps(info, default=json_default), 1 if current else 0,
+             current.get('start_date') if current else None)
+        )
+
+        history = workout_info.get('history', [])
+        stored = conn.execute(
+            'SELECT COALESCE(MAX(seq) + 1, 0) FROM history WHERE uid = ?', (uid,)
+        ).fetchone()[0]
+        if len(history) < stored:
+            # History was replaced (e.g. a deleted workout re-added) - rewrite it
+            conn.execute('DELETE FROM history WHERE uid = ?', (uid,))
+            stored = 0
+        conn.executemany(
+            'INSERT INTO history (uid, seq, timestamp, action, entry) VALUES (?, ?, ?, ?, ?)',
+            [
+                (uid, seq, entry.get('timestamp'), entry.get('action'), json.dumps(entry, default=json_default))
+                for seq, entry in enumerate(history[stored:], start=stored)
+            ]
+        )
+
+
+class ChangeLogArchive:
+    """
+    Cold storage for change-log entries that fell out of the hot window.
+
+    Entries live in append-only, gzip-compressed monthly segments next to the
+    store: data/archive/workouts_<id>/change_log-YYYY-MM.jsonl.gz, one
+    {"seq": N, "entry": {...}} line per entry. Each append adds a new gzip
+    member, so existing bytes are never rewritten.
+    """
+
+    SEGMENT_PREFIX = 'change_log-'
+    SEGMENT_SUFFIX = '.jsonl.gz'
+
+    def __init__(self, store_filepath):
+        base = os.path.splitext(os.path.basename(store_filepath))[0]
+        self.directory = os.path.join(os.path.dirname(store_filepath), 'archive', base)
+
+    def segment_path(self, month):
+        return os.path.join(self.directory, f'{self.SEGMENT_PREFIX}{month}{self.SEGMENT_SUFFIX}')
+
+    def months(self):
+        """Months (YYYY-MM) that have a segment, oldest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            name[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)]
+            for name in names
+            if name.startswith(self.SEGMENT_PREFIX) and name.endswith(self.SEGMENT_SUFFIX)
+        )
+
+    @staticmethod
+    def entry_month(entry):
+        timestamp = entry.get('timestamp') or ''
+        return timestamp[:7] if len(timestamp) >= 7 else 'undated'
+
+    def append(self, entries, first_seq):
+        """Append entries (numbered from `first_seq`) to their monthly segments."""
+        by_month = {}
+        for seq, entry in enumerate(entries, start=first_seq):
+            by_month.setdefault(self.entry_month(entry), []).append({'seq': seq, 'entry': entry})
+
+        os.makedirs(self.directory, exist_ok=True)
+        for month, lines in by_month.items():
+            with gzip.open(self.segment_path(month), 'at', encoding='utf-8') as f:
+                for line in lines:
+                    f.write(json.dumps(line, default=json_default) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def read(self, from_month=None, to_month=None):
+        """
+        Archived (seq, entry) pairs from the given month range, in seq order.
+
+        Only the segments in range are opened. An entry archived twice (the
+        store save failed after the append) is returned once.
+        """
+        seen = {}
+        for month in self.months():
+            if (from_month and month < from_month) or (to_month and month > to_month):
+                continue
+            with gzip.open(self.segment_path(month), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        seen.setdefault(record['seq'], record['entry'])
+        return sorted(seen.items())
+
+    def footprint(self):
+        """Bytes used by all segments."""
+        return sum(os.path.getsize(self.segment_path(month)) for month in self.months())
+
+
+def detach_change_log(data, hot_entries):
+    """
+    Remove all but the newest `hot_entries` change-log entries from `data`.
+
+    Returns (first seq, entries) for ChangeLogArchive.append, or (None, []).
+    Nothing is written, so the caller can append outside its locks.
+    """
+    change_log = data.get('change_log', [])
+    excess = len(change_log) - hot_entries
+    if excess <= 0:
+        return None, []
+    offset = data.get('change_log_offset', 0)
+    data['change_log'] = change_log[excess:]
+    data['change_log_offset'] = offset + excess
+    return offset + 1, change_log[:excess]
+
+
+def archive_change_log(data, archive, hot_entries):
+    """
+    Move all but the newest `hot_entries` change-log entries into `archive`.
+
+    Updates `data` in place and returns the number of entries moved. The
+    archive is written before the store is saved, so a failed save only
+    leaves duplicates there.
+    """
+    first_seq, entries = detach_change_log(data, hot_entries)
+    if entries:
+        archive.append(entries, first_seq)
+    return len(entries)
+
+
+def file_signature(path):
+    """
+    Return (mtime_ns, size, inode) for `path`, or None if it does not exist.
+    Every atomic_write gets a new inode, so even same-size writes within one
+    mtime tick change it.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+STORE_BACKENDS = {
+    'json': JsonWorkoutStore,
+    'sqlite': SqliteWorkoutStore,
+}
+
+
+def store_path(filepath, backend):
+    """Map a workouts_<id>.json path to the file used by `backend`."""
+    if backend == 'sqlite':
+        return os.path.splitext(filepath)[0] + '.db'
+    return filepath
+
+
+def open_store(filepath, backend='json'):
+    """Create the storage backend for a workouts_<id>.json path."""
+    if backend not in STORE_BACKENDS:
+        raise ValueError(f'Unknown storage backend: {backend}')
+    return STORE_BACKENDS[backend](store_path(filepath, backend))
+
+
+def migrate_json_to_sqlite(json_path, overwrite=False):
+    """One-shot copy of a workouts JSON file into its SQLite database."""
+    db_path = store_path(json_path, 'sqlite')
+    if os.path.exists(db_path):
+        if not overwrite:
+            raise FileExistsError(f'{db_path} already exists (use --overwrite to replace it)')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    data = JsonWorkoutStore(json_path).load()
+    if data is None:
+        raise ValueError(f'Could not read workout data from {json_path}')
+
+    SqliteWorkoutStore(db_path).save(data)
+    return {
+        'source': json_path,
+        'target': db_path,
+        'workouts': len(data.get('workouts', {})),
+        'history_entries': sum(len(w.get('history', [])) for w in data.get('workouts', {}).values()),
+        'change_log_entries': len(data.get('change_log', [])),
+    }
+
+
+DEFAULT_HOT_CHANGE_LOG_ENTRIES = 200
+
+
+def compact_store(path, hot_entries=DEFAULT_HOT_CHANGE_LOG_ENTRIES):
+    """
+    Shrink an existing store in place.
+
+    Delta-encodes history and change log, then moves all but the newest
+    `hot_entries` change-log entries to the archive. `path` is a workouts
+    .json file or .db database. Returns sizes before and after (the archive
+    counted in `after`).
+    """
+    store = SqliteWorkoutStore(path) if path.endswith('.db') else JsonWorkoutStore(path)
+    # Refreshes save under the same lock, so none can land between load and rewrite and be lost
+    with FeedLock.for_store(path):
+        data = store.load()
+        if data is None:
+            raise ValueError(f'Could not read workout data from {path}')
+
+        archive = ChangeLogArchive(path)
+        before = store.footprint() + archive.footprint()
+        compacted = compact_document(data)
+        archived = archive_change_log(compacted, archive, hot_entries)
+        if store.backend == 'sqlite':
+            store.replace(compacted)
+        else:
+            store.save(compacted)
+    return {'path': path, 'before': before, 'after': store.footprint() + archive.footprint(),
+            'archived': archived}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage tp-validator workout stores.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate = subparsers.add_parser('migrate', help='Copy workouts JSON files into SQLite databases')
+    migrate.add_argument('paths', nargs='+', help='data/workouts_<id>.json files')
+    migrate.add_argument('--overwrite', action='store_true', help='Replace existing databases')
+
+    compact = subparsers.add_parser('compact', help='Delta-encode history in existing stores')
+    compact.add_argument('paths', nargs='+', help='data/workouts_<id>.json or .db files')
+    compact.add_argument('--hot', type=int, default=DEFAULT_HOT_CHANGE_LOG_ENTRIES,
+                         help='Change-log entries kept in the store; older ones are archived '
+                              f'(default {DEFAULT_HOT_CHANGE_LOG_ENTRIES})')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'migrate':
+        for path in args.paths:
+            try:
+                result = migrate_json_to_sqlite(path, overwrite=args.overwrite)
+                print(f"✅ {result['source']} → {result['target']}: "
+                      f"{result['workouts']} workouts, {result['history_entries']} history entries, "
+                      f"{result['change_log_entries']} change log entries")
+            except (OSError, ValueError) as e:
+                print(f"❌ {path}: {e}")
+
+    elif args.command == 'compact':
+        for path in args.paths:
+            try:
+                result = compact_store(path, hot_entries=args.hot)
+                saved = result['before'] - result['after']
+                print(f"✅ {path}: {result['before']:,} → {result['after']:,} bytes "
+                      f"({saved / result['before'] * 100 if result['before'] else 0:.0f}% smaller, "
+                      f"{result['archived']} change log entries archived)")
+            except (OSError, ValueError) as e:
+                print(f"❌ {path}: {e}")
+
+
+if __name__ == '__main__':
+    main()
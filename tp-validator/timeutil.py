@@ -0,0 +1,90 @@
+"""Shared timestamp normalization.
+
+The same ISO strings (feed dates, Strava start times, the refresh
+timestamp) are parsed many times per refresh and across refreshes. The
+parsers here are memoized on the string, and each workout's start times are
+normalized once into `WorkoutTimes`, which WorkoutRecords keep until
+start_time or start_date changes.
+
+Times are (is_aware, microseconds since the epoch): aware values count from
+1970-01-01 UTC, naive ones from naive 1970-01-01. The two are kept apart
+because they cannot be compared. Days are proleptic ordinals (-1 if none).
+"""
+import functools
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from dateutil import tz
+
+from records import WorkoutRecord
+
+UTC = tz.UTC
+EPOCH_AWARE = datetime(1970, 1, 1, tzinfo=UTC)
+EPOCH_NAIVE = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH_NAIVE.toordinal()
+DAY_MICROS = 86400 * 1000000
+_MICROSECOND = timedelta(microseconds=1)
+
+# start       time key of start_time (None if missing or invalid)
+# day         ordinal of start_date, or of start_time's date part
+# reference   microseconds of start_date (or start_time), the time a deletion is aged from
+WorkoutTimes = namedtuple('WorkoutTimes', ('start', 'day', 'reference'))
+
+
+@functools.lru_cache(maxsize=32768)
+def parse_datetime(value):
+    """datetime of an ISO date or timestamp ('Z' allowed), None if invalid."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+@functools.lru_cache(maxsize=32768)
+def time_key(value):
+    """(is_aware, microseconds since epoch) of an ISO timestamp, or None."""
+    dt = parse_datetime(value)
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        return (False, (dt - EPOCH_NAIVE) // _MICROSECOND)
+    return (True, (dt - EPOCH_AWARE) // _MICROSECOND)
+
+
+@functools.lru_cache(maxsize=8192)
+def day_ordinal(value):
+    """Date ordinal of an ISO date (or timestamp), -1 if missing or invalid."""
+    dt = parse_datetime(value)
+    return dt.toordinal() if dt is not None else -1
+
+
+def normalize(workout):
+    """WorkoutTimes of a workout, parsed from its fields."""
+    return _normalize(workout.get('start_time'), workout.get('start_date'))
+
+
+@functools.lru_cache(maxsize=32768)
+def _normalize(start_time, start_date):
+    start = time_key(start_time)
+    day = day_ordinal(start_date or (start_time or '').split('T')[0])
+
+    if not start_date:
+        reference = start
+    elif len(start_date) == 10 and day >= 0:
+        # A plain date is naive midnight
+        reference = (False, (day - EPOCH_ORDINAL) * DAY_MICROS)
+    else:
+        reference = time_key(start_date)
+    return WorkoutTimes(start, day, reference[1] if reference else None)
+
+
+def workout_times(workout):
+    """WorkoutTimes of a workout, cached on WorkoutRecords."""
+    if isinstance(workout, WorkoutRecord):
+        times = workout._times
+        if times is None:
+            times = workout._times = normalize(workout)
+        return times
+    return normalize(workout)